@@ -1,91 +1,185 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, abort, g, make_response, render_template, jsonify, request, send_file, stream_with_context
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
 import os
-import joblib
 import threading
 import time
 from snake_win_predictor import SnakeWinPredictor
+from real_time_predictor import RealTimeBaccaratPredictor
+from model_artifact import ModelHolder, load_model_bundle
+from model_watcher import ModelWatcher
+from request_profiler import RequestProfiler
+from round_tracing import ROUND_LATENCY
+from thread_sampler import ThreadSampler
+from time_index import TimeIndex, timestamp_ns
+from storage import open_storage
+from features import CSV_COLUMNS
+from compact_history import PAYLOAD_COLUMNS, PayloadSpool, compact_frame, concat_compact, memory_report, with_payloads
+from ingest_writer import RoundIngestWriter
+from inference_service import InferenceService
+from pattern_index import parse_pattern
+from history_export import EXPORT_FORMATS, select_columns, stream_history
+from metrics import (
+    CACHE_REQUESTS, CSV_RELOAD_SECONDS, FEATURE_EXTRACTION_SECONDS, HTTP_REQUEST_SECONDS,
+    INFERENCE_SECONDS, render_metrics
+)
+
+MODEL_PATH = os.environ.get('MODEL_PATH', 'models/baccarat_model.pkl')
+
+# Avec `python app.py`, les processus du pool d'inférence (forkserver/spawn) réimportent ce
+# script sous le nom __mp_main__: ils n'y construisent ni stockage, ni prédicteurs, ni services
+SERVING_PROCESS = __name__ != '__mp_main__'
+
+# Historique: taille de page maximale
+MAX_HISTORY_LIMIT = 500
 
 app = Flask(__name__)
 
-# Initialiser le prédicteur Snake_win
-snake_predictor = SnakeWinPredictor()
+# Profilage à la demande (PROFILE_TOKEN / PROFILE_SAMPLE_PERCENT), inactif par défaut
+request_profiler = RequestProfiler.from_env()
 
-class BaccaratPredictor:
-    def __init__(self, csv_path='data/twentyone_rounds.csv'):
+class BaccaratPredictor(ModelHolder):
+    def __init__(self, csv_path='data/twentyone_rounds.csv', model_path=MODEL_PATH, storage=None):
         self.csv_path = csv_path
+        self.storage = storage or open_storage(csv_path=csv_path)
+        self.model_path = model_path
         self.data = None
-        self.model = None
-        self.scaler = None
-        self.feature_columns = []
+        self.time_index = TimeIndex()
+        self.data_cursor = None
+        # Colonnes JSON brutes hors mémoire, alignées sur les lignes de self.data
+        self.payloads = {}
+        self.memory = {}
+        self._refresh_lock = threading.Lock()
         self.load_data()
         self.load_trained_model()
     
     def load_data(self):
+        """Charge l'historique en DataFrame typé compact (JSON bruts dans self.payloads)"""
+        self.payloads = {column: PayloadSpool() for column in PAYLOAD_COLUMNS}
         try:
-            self.data = pd.read_csv(self.csv_path, header=None, 
-                                  names=['id', 'event_id', 'collected_at', 'option_type', 'odd', 'round_state', 'raw_payload'])
-            print(f"Chargé {len(self.data)} enregistrements depuis {self.csv_path}")
+            with CSV_RELOAD_SECONDS.time(loader='baccarat'):
+                raw, self.data_cursor = self.storage.read_since(None)
+                self.data = compact_frame(raw, self.payloads)
+            self.memory = memory_report(raw, self.data, self.payloads)
+            del raw
+            print(f"Chargé {len(self.data)} enregistrements depuis {self.storage.describe()}: "
+                  f"{self.memory['raw_bytes'] / 1e6:.1f} Mo → {self.memory['compact_bytes'] / 1e6:.1f} Mo "
+                  f"(÷{self.memory['reduction']})")
         except Exception as e:
-            print(f"Erreur chargement CSV: {e}")
-            self.data = pd.DataFrame()
+            print(f"Erreur chargement données: {e}")
+            self.payloads = {column: PayloadSpool() for column in PAYLOAD_COLUMNS}
+            self.data = compact_frame(pd.DataFrame(columns=CSV_COLUMNS))
+            self.data_cursor = None
+        self.time_index = TimeIndex()
+        self._index_rows(self.data)
+    
+    def _index_rows(self, frame):
+        """Ajoute des lignes de self.data à l'index temporel (offset = position dans self.data)"""
+        if frame.empty:
+            return
+        ids = frame['id'].fillna(-1).to_numpy(dtype=np.int64)
+        self.time_index.append(frame['collected_at'].array.asi8, ids, np.asarray(frame.index, dtype=np.int64))
+    
+    def refresh_data(self):
+        """Charge les lignes ajoutées au stockage depuis le dernier chargement (rien si inchangé)"""
+        with self._refresh_lock:
+            try:
+                with CSV_RELOAD_SECONDS.time(loader='baccarat_append'):
+                    frame, cursor = self.storage.read_since(self.data_cursor)
+            except Exception as e:
+                print(f"Erreur lecture lignes ajoutées: {e}")
+                return 0
+            if frame.empty:
+                return 0
+            frame = compact_frame(frame, self.payloads, first_row=len(self.data))
+            self.data = concat_compact([self.data, frame])
+            self.data_cursor = cursor
+            self._index_rows(frame)
+            return len(frame)
+    
+    def rows_between(self, start=None, end=None):
+        """Lignes brutes de la plage [start, end] (ns UTC), en ordre chronologique"""
+        return self.data.iloc[self.time_index.range(start, end)]
+    
+    def get_history_page(self, limit=50, cursor=None, start=None, end=None, fields=None):
+        """Page d'historique par curseur, des plus récentes aux plus anciennes
+        
+        `cursor` est une clé (ns UTC, id, offset), `start` et `end` des ns UTC, `fields` une liste de
+        colonnes ou 'all'; seules les lignes de la page sont prétraitées.
+        Retourne (lignes en ordre chronologique, curseur de la page plus ancienne ou None).
+        """
+        offsets, next_key = self.time_index.page(limit, start, end, before=cursor)
+        if len(offsets) == 0:
+            return [], None
+        
+        page = self.preprocess_frame(self.attach_payloads(self.data.iloc[offsets], fields))
+        columns = select_columns(page, fields)
+        # L'offset départage les options d'une même sauvegarde (même collected_at et même id)
+        next_cursor = '_'.join(str(part) for part in next_key) if next_key else None
+        return page[columns].to_dict('records'), next_cursor
     
     def load_trained_model(self):
         try:
-            model_data = joblib.load('models/baccarat_model.pkl')
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
-            self.feature_columns = model_data['feature_columns']
+            self.swap_model(load_model_bundle(self.model_path))
             print("Modèle IA chargé avec succès")
         except Exception as e:
             print(f"Erreur chargement modèle: {e}")
     
+    def attach_payloads(self, frame, fields='all'):
+        """Copie de lignes de self.data avec les colonnes JSON brutes demandées ('all' = toutes)"""
+        columns = PAYLOAD_COLUMNS if fields == 'all' else [col for col in fields or [] if col in PAYLOAD_COLUMNS]
+        return with_payloads(frame, self.payloads, columns) if columns else frame.copy()
+    
+    def recent_rows(self, limit):
+        """Les `limit` dernières lignes prétraitées, avec leurs JSON bruts"""
+        if self.data.empty:
+            return pd.DataFrame()
+        return self.preprocess_frame(self.attach_payloads(self.data.tail(limit)))
+    
     def preprocess_data(self):
         if self.data.empty:
             return pd.DataFrame()
         
-        processed = self.data.copy()
-        
-        # Extraction des scores depuis round_state
-        def extract_scores(row):
-            try:
-                round_state_str = str(row['round_state']) if pd.notna(row['round_state']) else '{}'
-                round_state = json.loads(round_state_str) if round_state_str else {}
-                return {
-                    'player_score': round_state.get('playerScore', 0),
-                    'banker_score': round_state.get('bankerScore', 0),
-                    'round_number': round_state.get('roundNumber', 0),
-                    'is_live': round_state.get('isLive', False)
-                }
-            except:
-                return {'player_score': 0, 'banker_score': 0, 'round_number': 0, 'is_live': False}
-        
-        scores_df = processed.apply(extract_scores, axis=1, result_type='expand')
-        processed = pd.concat([processed, scores_df], axis=1)
+        return self.preprocess_frame(self.data.copy(), iso_dates=False)
+    
+    def preprocess_frame(self, processed, iso_dates=True):
+        """Résultat numérique et features temporelles d'un sous-ensemble de self.data
         
+        Les scores sont déjà extraits de round_state au chargement (compact_frame).
+        """
         # Conversion du résultat en numérique
         result_map = {'Player Win': 0, 'Banker Win': 1, 'Tie': 2, 'Player Pair': 3, 'Banker Pair': 4}
-        processed['result_numeric'] = processed['option_type'].map(result_map).fillna(-1)
+        # Entier quel que soit le sous-ensemble (sans .astype, float dès qu'un résultat est inconnu)
+        processed['result_numeric'] = processed['option_type'].astype(object).map(result_map).fillna(-1).astype(int)
         
         # Features temporelles
-        processed['timestamp'] = pd.to_datetime(processed['collected_at'], errors='coerce')
+        processed['timestamp'] = processed['collected_at']
         processed['hour'] = processed['timestamp'].dt.hour
         processed['day_of_week'] = processed['timestamp'].dt.dayofweek
+        if iso_dates:
+            # Sortie au format du collecteur
+            processed['collected_at'] = processed['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3] + 'Z'
         
         return processed
     
-    def get_statistics(self):
+    def get_statistics(self, start=None, end=None):
+        """Statistiques sur tout l'historique ou sur la plage [start, end] (ns UTC)"""
         if self.data.empty:
             return {}
         
-        processed = self.preprocess_data()
+        if start is None and end is None:
+            processed = self.preprocess_data()
+        else:
+            rows = self.rows_between(start, end)
+            if rows.empty:
+                return {'total_rounds': 0}
+            processed = self.preprocess_frame(rows.copy(), iso_dates=False)
         
         stats = {
             'total_rounds': len(processed),
-            'results_distribution': processed['option_type'].value_counts().to_dict(),
+            'results_distribution': {name: count for name, count in processed['option_type'].value_counts().items() if count},
             'avg_player_score': processed['player_score'].mean(),
             'avg_banker_score': processed['banker_score'].mean(),
             'hourly_distribution': processed.groupby('hour')['option_type'].count().to_dict(),
@@ -94,7 +188,8 @@ class BaccaratPredictor:
         
         return stats
     
-    def extract_features_for_prediction(self, row):
+    def extract_features_for_prediction(self, row, layout, features):
+        """Écrit les features d'une ligne de l'historique dans `features` aux positions de `layout`"""
         try:
             round_state_str = str(row['round_state']) if pd.notna(row['round_state']) else '{}'
             raw_payload_str = str(row['raw_payload']) if pd.notna(row['raw_payload']) else '{}'
@@ -102,77 +197,60 @@ class BaccaratPredictor:
             round_state = json.loads(round_state_str) if round_state_str else {}
             raw_payload = json.loads(raw_payload_str) if raw_payload_str else {}
             
-            features = {
-                'player_score': round_state.get('playerScore', 0),
-                'banker_score': round_state.get('bankerScore', 0),
-                'round_number': round_state.get('roundNumber', 0),
-                'is_live': 1 if round_state.get('isLive', False) else 0,
-                'odd_value': float(row['odd']) if pd.notna(row['odd']) and str(row['odd']) != 'null' else 1.0
-            }
+            features[layout.player_score] = round_state.get('playerScore', 0)
+            features[layout.banker_score] = round_state.get('bankerScore', 0)
+            features[layout.round_number] = round_state.get('roundNumber', 0)
+            features[layout.is_live] = 1 if round_state.get('isLive', False) else 0
+            features[layout.odd_value] = float(row['odd']) if pd.notna(row['odd']) and str(row['odd']) != 'null' else 1.0
             
+            # Heure, jour et minute restent à 0 sans horodatage valide
             timestamp = pd.to_datetime(row['collected_at'], errors='coerce')
             if pd.notna(timestamp):
-                features.update({
-                    'hour': timestamp.hour,
-                    'day_of_week': timestamp.dayofweek,
-                    'minute': timestamp.minute
-                })
-            else:
-                features.update({'hour': 0, 'day_of_week': 0, 'minute': 0})
+                features[layout.hour] = timestamp.hour
+                features[layout.day_of_week] = timestamp.dayofweek
+                features[layout.minute] = timestamp.minute
             
+            # Cotes par type d'option (la dernière option de chaque type l'emporte)
+            features[layout.player_win_odd] = features[layout.banker_win_odd] = features[layout.tie_odd] = 1.0
             betting_options = raw_payload.get('bettingOptions', [])
             if isinstance(betting_options, list):
-                odds_map = {}
                 for option in betting_options:
                     if isinstance(option, dict):
-                        odds_map[option.get('optionType', '')] = option.get('odd', 1.0)
-                
-                features.update({
-                    'player_win_odd': odds_map.get('Player Win', 1.0),
-                    'banker_win_odd': odds_map.get('Banker Win', 1.0),
-                    'tie_odd': odds_map.get('Tie', 1.0)
-                })
-            else:
-                features.update({
-                    'player_win_odd': 1.0,
-                    'banker_win_odd': 1.0,
-                    'tie_odd': 1.0
-                })
-            
-            # Ajouter les features séquentielles (simplifiées)
-            recent_data = self.data.tail(50)
-            features.update({
-                'Player_Win_ma_5': (recent_data['option_type'] == 'Player Win').tail(5).mean(),
-                'Banker_Win_ma_5': (recent_data['option_type'] == 'Banker Win').tail(5).mean(),
-                'Tie_ma_5': (recent_data['option_type'] == 'Tie').tail(5).mean(),
-                'consecutive_Player_Win': 0,
-                'consecutive_Banker_Win': 0,
-                'consecutive_Tie': 0
-            })
+                        option_type = option.get('optionType', '')
+                        if option_type == 'Player Win':
+                            features[layout.player_win_odd] = option.get('odd', 1.0)
+                        elif option_type == 'Banker Win':
+                            features[layout.banker_win_odd] = option.get('odd', 1.0)
+                        elif option_type == 'Tie':
+                            features[layout.tie_odd] = option.get('odd', 1.0)
             
-            return features
+            # Ajouter les features séquentielles (simplifiées; séries consécutives à 0)
+            recent_option_types = self.data['option_type'].iloc[-5:]
+            features[layout.Player_Win_ma_5] = (recent_option_types == 'Player Win').mean()
+            features[layout.Banker_Win_ma_5] = (recent_option_types == 'Banker Win').mean()
+            features[layout.Tie_ma_5] = (recent_option_types == 'Tie').mean()
             
         except Exception as e:
             print(f"Erreur extraction features: {e}")
-            return {col: 0 for col in self.feature_columns}
+            features.fill(0.0)
+        return features
     
     def predict_next(self, event_id=None):
-        if self.data.empty or self.model is None:
+        # Une seule lecture: la prédiction se termine sur ce modèle même en cas de rechargement
+        bundle = self.model_bundle
+        if self.data.empty or bundle.model is None:
             return {'error': 'Pas de données ou modèle disponible'}
         
         # Utiliser la dernière ligne comme base pour la prédiction
-        last_row = self.data.iloc[-1]
-        features = self.extract_features_for_prediction(last_row)
-        
-        # S'assurer que toutes les features requises sont présentes
-        feature_vector = []
-        for col in self.feature_columns:
-            feature_vector.append(features.get(col, 0))
+        last_row = self.attach_payloads(self.data.iloc[[-1]]).iloc[0]
+        with FEATURE_EXTRACTION_SECONDS.time(predictor='baccarat'):
+            # Vecteur écrit en place dans la ligne réutilisée du thread (features absentes: 0)
+            layout = bundle.layout
+            features = self.extract_features_for_prediction(last_row, layout, layout.row())
         
         # Normalisation et prédiction
-        feature_vector_scaled = self.scaler.transform([feature_vector])
-        prediction = self.model.predict(feature_vector_scaled)[0]
-        probabilities = self.model.predict_proba(feature_vector_scaled)[0]
+        with INFERENCE_SECONDS.time(predictor='baccarat'):
+            prediction, probabilities = self.infer(bundle, layout.vector(features))
         
         result_map = {0: 'Player Win', 1: 'Banker Win', 2: 'Tie', 3: 'Player Pair', 4: 'Banker Pair'}
         
@@ -186,16 +264,122 @@ class BaccaratPredictor:
             'event_id': event_id
         }
 
-predictor = BaccaratPredictor()
-
 # Démarrer le prédicteur Snake_win dans un thread séparé
 def start_snake_win_service():
     time.sleep(2)  # Attendre que Flask démarre
     snake_predictor.start_real_time_prediction(interval=5)
+    real_time_predictor.start_real_time_prediction(interval=3)
+
+if SERVING_PROCESS:
+    # Stockage des rounds partagé (ROUND_STORAGE, CSV du collecteur par défaut)
+    round_storage = open_storage()
+
+    # Initialiser le prédicteur Snake_win
+    snake_predictor = SnakeWinPredictor(model_path=MODEL_PATH, storage=round_storage)
+    predictor = BaccaratPredictor(storage=round_storage)
+    real_time_predictor = RealTimeBaccaratPredictor(model_path=MODEL_PATH, storage=round_storage)
+
+    snake_thread = threading.Thread(target=start_snake_win_service, name='snake-win-service')
+    snake_thread.daemon = True
+    snake_thread.start()
+
+    # Écriture Python du flux live dans le stockage (PYTHON_INGEST=1), à la place du collecteur Node
+    ingest_writer = None
+    if os.environ.get('PYTHON_INGEST') == '1':
+        ingest_writer = RoundIngestWriter(storage=round_storage)
+        ingest_writer.start()
+        real_time_predictor.ingest_writer = ingest_writer
 
-snake_thread = threading.Thread(target=start_snake_win_service)
-snake_thread.daemon = True
-snake_thread.start()
+    # Inférence dans un pool de processus (INFERENCE_WORKERS > 0), hors des threads de requête et de polling
+    inference_service = InferenceService.from_env(MODEL_PATH)
+    if inference_service is not None and snake_predictor.model is not None:
+        # Un seul modèle en mémoire pour les trois prédicteurs: celui que le service reconnaît
+        for holder in (predictor, snake_predictor, real_time_predictor):
+            holder.swap_model(snake_predictor.model_bundle)
+            holder.inference = inference_service
+        inference_service.start(snake_predictor.model_bundle)
+
+    # Rechargement à chaud du modèle dans tous les prédicteurs (et le service d'inférence)
+    model_watcher = ModelWatcher(MODEL_PATH, [predictor, snake_predictor, real_time_predictor],
+                                 interval=int(os.environ.get('MODEL_RELOAD_INTERVAL', 10)))
+    if inference_service is not None and inference_service.is_running:
+        model_watcher.register(inference_service)
+    model_watcher.start()
+
+    # Échantillonnage des piles des threads de fond (THREAD_SAMPLER_HZ=0 pour désactiver)
+    thread_sampler = ThreadSampler.from_env()
+    thread_sampler.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request_profiler.enabled and request_profiler.should_profile(request.headers):
+        g.profile_handle = request_profiler.start()
+
+@app.after_request
+def record_request_latency(response):
+    # Le gabarit de route (et non l'URL) évite une série par eventId
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    handle = g.pop('profile_handle', None)
+    if handle is not None:
+        try:
+            profile, duration = request_profiler.stop(handle)
+            profile_id = request_profiler.save(profile, duration, endpoint, request.method, response.status_code)
+            response.headers['X-Profile-Id'] = profile_id
+        except Exception as e:
+            app.logger.error(f"Erreur sauvegarde profil: {e}")
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint,
+                                     method=request.method, status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def release_request_profiler(exc):
+    # Requête interrompue avant after_request: libérer le profileur
+    handle = g.pop('profile_handle', None)
+    if handle is not None:
+        request_profiler.stop(handle)
+
+@app.route('/api/admin/thread-profile')
+def get_thread_profile():
+    """Piles repliées des threads de fond (?thread=préfixe, ?reset=1 pour repartir de zéro)"""
+    if not request_profiler.is_authorized(request.headers):
+        return jsonify({'error': 'Non autorisé'}), 403
+    if request.args.get('format') == 'status':
+        return jsonify(thread_sampler.get_status())
+    body = thread_sampler.collapsed(request.args.get('thread'))
+    if request.args.get('reset') == '1':
+        thread_sampler.reset()
+    return Response(body, content_type='text/plain; charset=utf-8')
+
+@app.route('/api/admin/profiles')
+def list_request_profiles():
+    if not request_profiler.is_authorized(request.headers):
+        return jsonify({'error': 'Non autorisé'}), 403
+    return jsonify(request_profiler.list_profiles())
+
+@app.route('/api/admin/profiles/<profile_id>')
+def get_request_profile(profile_id):
+    """Profil d'une requête: ?format=text (défaut), collapsed (flamegraph) ou pstats"""
+    if not request_profiler.is_authorized(request.headers):
+        return jsonify({'error': 'Non autorisé'}), 403
+    output_format = request.args.get('format', 'text')
+    if output_format == 'pstats':
+        path = request_profiler.profile_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profil introuvable'}), 404
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=f'{profile_id}.pstats')
+    body = request_profiler.render(profile_id, output_format)
+    if body is None:
+        return jsonify({'error': 'Profil introuvable'}), 404
+    return Response(body, content_type='text/plain; charset=utf-8')
+
+@app.route('/metrics')
+def metrics():
+    """Métriques au format texte Prometheus"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/')
 def index():
@@ -203,27 +387,86 @@ def index():
 
 @app.route('/api/stats')
 def get_stats():
-    return jsonify(predictor.get_statistics())
+    """Statistiques, optionnellement sur ?from=/?to= (ISO 8601) ou ?last=<secondes>"""
+    try:
+        start = timestamp_ns(request.args.get('from'))
+        end = timestamp_ns(request.args.get('to'))
+        if request.args.get('last'):
+            end = time.time_ns()
+            start = end - int(float(request.args['last']) * 1_000_000_000)
+    except ValueError as e:
+        return jsonify({'error': f'Paramètre invalide: {e}'}), 400
+    predictor.refresh_data()
+    return jsonify(predictor.get_statistics(start, end))
 
 @app.route('/api/predict')
 def predict():
     event_id = request.args.get('event_id')
     return jsonify(predictor.predict_next(event_id))
 
+def _parse_history_cursor(value):
+    if not value:
+        return None
+    parts = value.split('_')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Curseur invalide: {value}")
+    return tuple(int(part) for part in parts)
+
 @app.route('/api/history')
 def get_history():
-    limit = int(request.args.get('limit', 50))
-    processed = predictor.preprocess_data()
+    """Historique paginé par curseur (keyset sur collected_at, id, offset de la ligne)
     
-    if processed.empty:
-        return jsonify([])
+    ?limit= (max 500), ?cursor= (en-tête X-Next-Cursor de la page précédente),
+    ?from= / ?to= (ISO 8601), ?fields=col1,col2 ou all (sans raw_payload/round_state par défaut)
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_HISTORY_LIMIT)
+        cursor = _parse_history_cursor(request.args.get('cursor'))
+        start = timestamp_ns(request.args.get('from'))
+        end = timestamp_ns(request.args.get('to'))
+        fields = request.args.get('fields')
+        if fields and fields != 'all':
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+        predictor.refresh_data()
+        history, next_cursor = predictor.get_history_page(limit, cursor, start, end, fields)
+    except ValueError as e:
+        return jsonify({'error': f'Paramètre invalide: {e}'}), 400
     
-    history = processed.tail(limit).to_dict('records')
-    return jsonify(history)
+    response = jsonify(history)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/history/memory')
+def history_memory():
+    """Mémoire de l'historique: DataFrame brut au chargement vs représentation compacte actuelle"""
+    report = dict(predictor.memory)
+    report['current_rows'] = len(predictor.data)
+    report['current_compact_bytes'] = int(predictor.data.memory_usage(deep=True).sum())
+    return jsonify(report)
+
+@app.route('/api/history/export')
+def export_history():
+    """Export complet en flux (?format=ndjson|csv|arrow, ?from=, ?to=, ?fields=)"""
+    output_format = request.args.get('format', 'ndjson')
+    try:
+        start = timestamp_ns(request.args.get('from'))
+        end = timestamp_ns(request.args.get('to'))
+        fields = request.args.get('fields')
+        if fields and fields != 'all':
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+        predictor.refresh_data()
+        body = stream_history(predictor, output_format, start, end, fields)
+    except ValueError as e:
+        return jsonify({'error': f'Paramètre invalide: {e}'}), 400
+    
+    extension = 'arrows' if output_format == 'arrow' else output_format
+    return Response(stream_with_context(body), content_type=EXPORT_FORMATS[output_format],
+                    headers={'Content-Disposition': f'attachment; filename=history.{extension}'})
 
 @app.route('/api/events')
 def get_events():
-    processed = predictor.preprocess_data()
+    processed = predictor.recent_rows(100)
     
     if processed.empty:
         return jsonify([])
@@ -231,7 +474,7 @@ def get_events():
     # Extraire les events uniques depuis raw_payload
     events = []
     try:
-        for _, row in processed.tail(100).iterrows():
+        for _, row in processed.iterrows():
             raw_payload = json.loads(row['raw_payload'])
             event = raw_payload.get('event', {})
             if event and event.get('eventId') not in [e.get('eventId') for e in events]:
@@ -249,19 +492,23 @@ def get_events():
 # Nouveaux endpoints pour le temps réel
 @app.route('/api/realtime/events')
 def get_realtime_events():
-    """Retourne les événements actuels de l'API Baccarat"""
-    return jsonify(real_time_predictor.get_current_events())
+    """Retourne les événements actuels de l'API Baccarat (?table= pour une seule table)"""
+    return jsonify(real_time_predictor.get_current_events(_requested_table(real_time_predictor)))
 
 @app.route('/api/realtime/predictions')
 def get_realtime_predictions():
     """Retourne toutes les prédictions en temps réel"""
-    return jsonify(real_time_predictor.get_current_predictions())
+    predictions = real_time_predictor.get_current_predictions(_requested_table(real_time_predictor))
+    for event_id, prediction in list(predictions.items()):
+        ROUND_LATENCY.mark_served('realtime', event_id, prediction.get('trace'))
+    return jsonify(predictions)
 
 @app.route('/api/realtime/predict/<int:event_id>')
 def get_realtime_prediction(event_id):
     """Retourne la prédiction pour un événement spécifique"""
     prediction = real_time_predictor.get_prediction_for_event(event_id)
     if prediction:
+        ROUND_LATENCY.mark_served('realtime', event_id, prediction.get('trace'))
         return jsonify(prediction)
     else:
         return jsonify({'error': 'Prédiction non trouvée pour cet événement'}), 404
@@ -273,35 +520,57 @@ def get_realtime_status():
         'is_running': real_time_predictor.is_running,
         'current_events_count': len(real_time_predictor.get_current_events()),
         'predictions_count': len(real_time_predictor.get_current_predictions()),
+        'tables_count': len(real_time_predictor.tables),
+        'queue': real_time_predictor.event_queue.get_status(),
         'last_update': datetime.now().isoformat()
     })
 
-# Nouveaux endpoints Snake_win avec structure JSON exacte
+def _requested_table(predictor):
+    """Table demandée (?table=...): None pour la table par défaut, 404 si elle n'est pas suivie ici"""
+    table = request.args.get('table')
+    if table is not None and table not in predictor.tables:
+        abort(make_response(jsonify({'error': f'Table {table} non suivie par ce processus'}), 404))
+    return table
+
+# Nouveaux endpoints Snake_win avec structure JSON exacte (?table= pour une autre table que la principale)
 @app.route('/api/snake-win/complete')
 def get_snake_win_complete():
     """Retourne la structure JSON complète selon votre format"""
-    return jsonify(snake_predictor.get_complete_json_response())
+    return jsonify(snake_predictor.get_complete_json_response(_requested_table(snake_predictor)))
 
 @app.route('/api/snake-win/rounds')
 def get_snake_win_rounds():
     """Retourne les rounds actuels avec prédictions"""
+    state = snake_predictor.table_state(_requested_table(snake_predictor))
     return jsonify({
-        "current_rounds": list(snake_predictor.current_rounds.values()),
-        "predictions": snake_predictor.predictions
+        "current_rounds": list(state.current_rounds.values()),
+        "predictions": state.predictions
     })
 
 @app.route('/api/snake-win/history')
 def get_snake_win_history():
     """Retourne l'historique avec symboles ♠ ♦ ♣"""
+    state = snake_predictor.table_state(_requested_table(snake_predictor))
     return jsonify({
-        "history": list(snake_predictor.round_history),
-        "symbol_history": list(snake_predictor.symbol_history)
+        "history": list(state.history.records),
+        "symbol_history": list(state.history.symbols)
     })
 
+@app.route('/api/snake-win/patterns')
+def get_snake_win_patterns():
+    """Occurrences d'un motif (?pattern=♠♠♦♣ ou PPBT) dans le flux d'une table et distribution du symbole suivant"""
+    try:
+        codes = parse_pattern(request.args.get('pattern', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not codes:
+        return jsonify({'error': 'Paramètre pattern requis'}), 400
+    return jsonify(snake_predictor.table_state(_requested_table(snake_predictor)).patterns.query(codes))
+
 @app.route('/api/snake-win/prediction')
 def get_snake_win_prediction():
     """Retourne la dernière prédiction IA"""
-    return jsonify(snake_predictor.get_latest_ai_prediction())
+    return jsonify(snake_predictor.get_latest_ai_prediction(_requested_table(snake_predictor)))
 
 @app.route('/api/snake-win/status')
 def get_snake_win_status():
@@ -311,10 +580,44 @@ def get_snake_win_status():
         "current_rounds_count": len(snake_predictor.current_rounds),
         "predictions_count": len(snake_predictor.predictions),
         "symbol_history_length": len(snake_predictor.symbol_history),
+        "tables_count": len(snake_predictor.tables),
+        "queue": snake_predictor.round_queue.get_status(),
         "model_info": snake_predictor.ai_config["model"],
         "last_update": datetime.now().isoformat()
     })
 
+@app.route('/api/tables')
+def get_tables():
+    """Tables suivies par ce processus (shard TABLE_SHARD_INDEX parmi TABLE_SHARDS)"""
+    return jsonify({
+        'snake_win': snake_predictor.get_tables_summary(),
+        'realtime': real_time_predictor.get_tables_summary()
+    })
+
+@app.route('/api/ingest/status')
+def get_ingest_status():
+    """Retourne l'état de l'écriture Python du flux live"""
+    if ingest_writer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(ingest_writer.get_status(), enabled=True))
+
+@app.route('/api/inference/status')
+def get_inference_status():
+    """Retourne l'état du service d'inférence (pool de processus, lots, replis)"""
+    if inference_service is None or not inference_service.is_running:
+        return jsonify({'enabled': False})
+    return jsonify(dict(inference_service.get_status(), enabled=True))
+
+@app.route('/api/model/status')
+def get_model_status():
+    """Retourne la version du modèle servie et l'état du rechargement à chaud"""
+    return jsonify(model_watcher.get_status())
+
+@app.route('/api/latency/report')
+def get_latency_report():
+    """Percentiles de latence par étape (publication amont → prédiction → diffusion)"""
+    return jsonify(ROUND_LATENCY.report())
+
 def _build_event_for_prediction(match):
     """Construit un objet event pour predict_event à partir d'un match"""
     start_time = match.get('startTime')
@@ -381,15 +684,19 @@ def get_baccarat_matches():
             pred = real_time_predictor.get_prediction_for_event(event_id)
             match['prediction'] = pred if pred and 'error' not in pred else None
             if match['prediction'] is None:
+                CACHE_REQUESTS.inc(cache='realtime_prediction', result='miss')
                 _add_prediction_to_match(match)
+            else:
+                CACHE_REQUESTS.inc(cache='realtime_prediction', result='hit')
+                ROUND_LATENCY.mark_served('realtime', event_id, pred.get('trace'))
             matches.append(match)
     
     # 2. Matchs depuis la base de données (quand API down ou complément)
-    processed = predictor.preprocess_data()
+    processed = predictor.recent_rows(500)
     if not processed.empty:
         try:
             event_data = {}
-            for _, row in processed.tail(500).iloc[::-1].iterrows():
+            for _, row in processed.iloc[::-1].iterrows():
                 try:
                     raw_payload = json.loads(row['raw_payload']) if pd.notna(row['raw_payload']) else {}
                     event = raw_payload.get('event', {})
@@ -3,6 +3,8 @@ import json
 import time
 from datetime import datetime
 import logging
+from round_tracing import mark, new_trace
+from metrics import POLLER_LAG_SECONDS, POLLER_LAST_SUCCESS, UPSTREAM_FETCH_ERRORS, UPSTREAM_FETCH_SECONDS
 
 class BaccaratAPIClient:
     def __init__(self, base_url="https://api.1xbet.com", sport_id=146):
@@ -28,19 +30,27 @@ class BaccaratAPIClient:
                 'domain': 'com'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            with UPSTREAM_FETCH_SECONDS.time(client='v1', endpoint='Get1x2_Virtual'):
+                response = self.session.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
                 self._api_fail_count = 0
                 data = response.json()
-                return self.parse_events(data)
+                fetched = time.time()
+                POLLER_LAST_SUCCESS.set(fetched, client='v1')
+                events = self.parse_events(data)
+                for event in events:
+                    event['trace']['fetched'] = fetched
+                return events
             else:
+                UPSTREAM_FETCH_ERRORS.inc(client='v1', endpoint='Get1x2_Virtual', reason=f'http_{response.status_code}')
                 self._api_fail_count += 1
                 if self._api_fail_count <= 2 or self._api_fail_count % 12 == 0:
                     self.logger.warning(f"API 1xbet: erreur {response.status_code} (tentative {self._api_fail_count})")
                 return []
                 
         except Exception as e:
+            UPSTREAM_FETCH_ERRORS.inc(client='v1', endpoint='Get1x2_Virtual', reason=type(e).__name__)
             self._api_fail_count += 1
             if self._api_fail_count <= 2 or self._api_fail_count % 12 == 0:
                 self.logger.warning(f"API 1xbet indisponible - utilisation BDD (tentative {self._api_fail_count}): {type(e).__name__}")
@@ -64,7 +74,8 @@ class BaccaratAPIClient:
                             'playerScore': event_data.get('SC', {}).get('S1', 0),
                             'bankerScore': event_data.get('SC', {}).get('S2', 0),
                             'gamePhase': self.get_game_phase(event_data),
-                            'bettingOptions': self.parse_betting_options(event_data)
+                            'bettingOptions': self.parse_betting_options(event_data),
+                            'trace': new_trace(published=event_data.get('S'))
                         }
                         events.append(event)
                         
@@ -125,16 +136,19 @@ class BaccaratAPIClient:
                 'domain': 'com'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            with UPSTREAM_FETCH_SECONDS.time(client='v1', endpoint='GetGameZip'):
+                response = self.session.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
                 # Les données peuvent être compressées, nécessitant décompression
                 return response.json()
             else:
+                UPSTREAM_FETCH_ERRORS.inc(client='v1', endpoint='GetGameZip', reason=f'http_{response.status_code}')
                 self.logger.error(f"Erreur détails event {event_id}: {response.status_code}")
                 return None
                 
         except Exception as e:
+            UPSTREAM_FETCH_ERRORS.inc(client='v1', endpoint='GetGameZip', reason=type(e).__name__)
             self.logger.error(f"Erreur récupération détails event {event_id}: {e}")
             return None
     
@@ -142,14 +156,19 @@ class BaccaratAPIClient:
         """Démarre la surveillance en temps réel des événements"""
         self.logger.info(f"Démarrage monitoring temps réel (interval: {interval}s)")
         
+        scheduled = time.monotonic()
         while True:
             try:
+                # Retard du cycle: callbacks lents ou backoff dépassant l'intervalle prévu
+                cycle_start = time.monotonic()
+                POLLER_LAG_SECONDS.observe(max(0.0, cycle_start - scheduled), client='v1')
                 events = self.get_live_events()
                 
                 if events:
                     self.logger.info(f"Trouvé {len(events)} événements live")
                     if callback:
                         for event in events:
+                            mark(event.get('trace'), 'dispatched')
                             callback(event)
                 
                 # Backoff progressif si API down: 30s après 6 échecs, 60s après 12, max 120s
@@ -157,6 +176,7 @@ class BaccaratAPIClient:
                     sleep_time = min(30 + (self._api_fail_count // 6) * 15, 120)
                 else:
                     sleep_time = interval
+                scheduled = cycle_start + sleep_time
                 time.sleep(sleep_time)
                 
             except KeyboardInterrupt:
@@ -164,6 +184,7 @@ class BaccaratAPIClient:
                 break
             except Exception as e:
                 self.logger.warning(f"Erreur monitoring: {e}")
+                scheduled = time.monotonic() + 30
                 time.sleep(30)
 
 # Test du client API
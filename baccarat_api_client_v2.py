@@ -3,6 +3,8 @@ import json
 import time
 from datetime import datetime
 import logging
+from round_tracing import mark, new_trace
+from metrics import POLLER_LAG_SECONDS, POLLER_LAST_SUCCESS, UPSTREAM_FETCH_ERRORS, UPSTREAM_FETCH_SECONDS
 
 class BaccaratAPIClientV2:
     def __init__(self):
@@ -40,21 +42,24 @@ class BaccaratAPIClientV2:
     def get_sports(self):
         """Récupère la liste des sports/jeux"""
         try:
-            response = self.session.get(
-                self.api_config["meta"]["endpoint"],
-                params=self.api_config["meta"]["params"],
-                timeout=10
-            )
+            with UPSTREAM_FETCH_SECONDS.time(client='v2', endpoint='GetSportsShortZip'):
+                response = self.session.get(
+                    self.api_config["meta"]["endpoint"],
+                    params=self.api_config["meta"]["params"],
+                    timeout=10
+                )
             
             if response.status_code == 200:
                 data = response.json()
                 self.logger.info(f"Sports récupérés: {len(data.get('sports', []))}")
                 return data
             else:
+                UPSTREAM_FETCH_ERRORS.inc(client='v2', endpoint='GetSportsShortZip', reason=f'http_{response.status_code}')
                 self.logger.error(f"Erreur API sports: {response.status_code}")
                 return None
                 
         except Exception as e:
+            UPSTREAM_FETCH_ERRORS.inc(client='v2', endpoint='GetSportsShortZip', reason=type(e).__name__)
             self.logger.error(f"Erreur récupération sports: {e}")
             return None
     
@@ -94,18 +99,25 @@ class BaccaratAPIClientV2:
                 "count": 50
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            with UPSTREAM_FETCH_SECONDS.time(client='v2', endpoint='GetGamesZip'):
+                response = self.session.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
+                fetched = time.time()
+                POLLER_LAST_SUCCESS.set(fetched, client='v2')
                 rounds = self.parse_baccarat_rounds(data)
+                for round_info in rounds:
+                    round_info['trace']['fetched'] = fetched
                 self.logger.info(f"Rounds Baccarat trouvés: {len(rounds)}")
                 return rounds
             else:
+                UPSTREAM_FETCH_ERRORS.inc(client='v2', endpoint='GetGamesZip', reason=f'http_{response.status_code}')
                 self.logger.error(f"Erreur API rounds: {response.status_code}")
                 return []
                 
         except Exception as e:
+            UPSTREAM_FETCH_ERRORS.inc(client='v2', endpoint='GetGamesZip', reason=type(e).__name__)
             self.logger.error(f"Erreur récupération rounds: {e}")
             return []
     
@@ -128,7 +140,8 @@ class BaccaratAPIClientV2:
                             "winner": self.determine_winner(game_data)
                         },
                         "bet": self.extract_betting_info(game_data),
-                        "tracking": self.generate_tracking(game_data)
+                        "tracking": self.generate_tracking(game_data),
+                        "trace": new_trace(published=game_data.get('time'))
                     }
                     rounds.append(round_info)
                     
@@ -229,14 +242,20 @@ class BaccaratAPIClientV2:
         """Démarre la surveillance en temps réel"""
         self.logger.info(f"Démarrage monitoring temps réel (interval: {interval}s)")
         
+        scheduled = time.monotonic()
         while True:
             try:
+                # Retard du cycle: callbacks lents dépassant l'intervalle prévu
+                cycle_start = time.monotonic()
+                POLLER_LAG_SECONDS.observe(max(0.0, cycle_start - scheduled), client='v2')
                 rounds = self.get_live_baccarat_rounds()
                 
                 if rounds and callback:
                     for round_data in rounds:
+                        mark(round_data.get('trace'), 'dispatched')
                         callback(round_data)
                 
+                scheduled = cycle_start + interval
                 time.sleep(interval)
                 
             except KeyboardInterrupt:
@@ -244,6 +263,7 @@ class BaccaratAPIClientV2:
                 break
             except Exception as e:
                 self.logger.error(f"Erreur monitoring: {e}")
+                scheduled = time.monotonic() + interval
                 time.sleep(interval)
 
 # Test du client API
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from time_index import to_ns
+
+# Colonnes JSON brutes gardées hors mémoire (PayloadSpool)
+PAYLOAD_COLUMNS = ('round_state', 'raw_payload')
+
+CATEGORY_COLUMNS = ('option_type',)
+
+def _json_scores(text):
+    try:
+        round_state = json.loads(text) if isinstance(text, str) and text else {}
+        return (int(round_state.get('playerScore') or 0), int(round_state.get('bankerScore') or 0),
+                int(round_state.get('roundNumber') or 0), bool(round_state.get('isLive', False)))
+    except Exception:
+        return (0, 0, 0, False)
+
+class PayloadSpool:
+    """Textes JSON bruts dans un fichier temporaire en ajout seul, avec l'offset de chaque entrée
+
+    L'entrée i occupe les octets [offsets[i], offsets[i + 1]). Les lectures
+    utilisent os.pread (pas de position partagée): sûres entre threads et
+    après un fork des workers.
+    """
+
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(prefix='payloads-', dir=directory)
+        self._offsets = np.zeros(1024, dtype=np.int64)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, texts):
+        """Ajoute des textes (None/NaN → vide); retourne la position de la première entrée"""
+        encoded = [text.encode('utf-8') if isinstance(text, str) else b'' for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        with self._lock:
+            first = self._size
+            end = self._size + len(encoded)
+            if end + 1 > len(self._offsets):
+                grown = np.zeros(max(end + 1, 2 * len(self._offsets)), dtype=np.int64)
+                grown[:self._size + 1] = self._offsets[:self._size + 1]
+                self._offsets = grown
+            base = self._offsets[self._size]
+            self._offsets[self._size + 1:end + 1] = base + np.cumsum(lengths)
+            os.pwrite(self._file.fileno(), b''.join(encoded), int(base))
+            self._size = end
+        return first
+
+    def get(self, positions):
+        """Textes des entrées `positions` (None pour une entrée vide)"""
+        offsets = self._offsets
+        fd = self._file.fileno()
+        texts = []
+        for position in positions:
+            start, end = int(offsets[position]), int(offsets[position + 1])
+            texts.append(os.pread(fd, end - start, start).decode('utf-8') if end > start else None)
+        return texts
+
+    @property
+    def disk_bytes(self):
+        return int(self._offsets[self._size])
+
+    @property
+    def index_bytes(self):
+        return self._offsets.nbytes
+
+def compact_frame(frame, spools=None, first_row=0):
+    """Version typée d'un DataFrame CSV_COLUMNS
+
+    Catégories pour option_type, scores extraits de round_state en petits
+    entiers, cotes en float32, collected_at en datetime64[ns, UTC] (int64).
+    Avec `spools` ({colonne: PayloadSpool}), les colonnes JSON y sont écrites
+    dans l'ordre des lignes (la ligne d'index i est l'entrée i du spool, à
+    partir de `first_row`); sinon elles sont abandonnées. Les lignes sans
+    event_id numérique (en-tête du collecteur) sont ignorées.
+    """
+    event_ids = pd.to_numeric(frame['event_id'], errors='coerce')
+    frame = frame[event_ids.notna()]
+    event_ids = event_ids[event_ids.notna()]
+
+    scores = [_json_scores(text) for text in frame['round_state']]
+    player, banker, round_number, is_live = zip(*scores) if scores else ((), (), (), ())
+    compact = pd.DataFrame({
+        'id': pd.to_numeric(frame['id'], errors='coerce').to_numpy(dtype=np.float64),
+        'event_id': event_ids.to_numpy(dtype=np.int64),
+        'collected_at': pd.to_datetime(to_ns(frame['collected_at']), utc=True),
+        'option_type': pd.Categorical(frame['option_type']),
+        'odd': pd.to_numeric(frame['odd'], errors='coerce').to_numpy(dtype=np.float32),
+        'player_score': np.asarray(player, dtype=np.int16),
+        'banker_score': np.asarray(banker, dtype=np.int16),
+        'round_number': np.asarray(round_number, dtype=np.int32),
+        'is_live': np.asarray(is_live, dtype=bool)
+    }, index=pd.RangeIndex(first_row, first_row + len(frame)))
+    for column, spool in (spools or {}).items():
+        if len(spool) != first_row:
+            raise ValueError(f"Spool {column} désaligné: {len(spool)} entrées pour la ligne {first_row}")
+        spool.append(frame[column].tolist())
+    return compact
+
+def concat_compact(frames):
+    """pd.concat qui garde les colonnes catégorielles (catégories unifiées)"""
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    for column in CATEGORY_COLUMNS:
+        categories = pd.api.types.union_categoricals([frame[column] for frame in frames]).categories
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames)
+
+def with_payloads(frame, spools, columns=PAYLOAD_COLUMNS):
+    """Rattache les colonnes JSON brutes aux lignes de `frame` (index = position dans le spool)"""
+    positions = np.asarray(frame.index, dtype=np.int64)
+    return frame.assign(**{column: spools[column].get(positions) for column in columns if column in spools})
+
+def memory_report(before, after, spools=None):
+    """Mémoire (octets) du DataFrame brut et de sa version compacte"""
+    before_bytes = int(before.memory_usage(deep=True).sum())
+    after_bytes = int(after.memory_usage(deep=True).sum())
+    index_bytes = sum(spool.index_bytes for spool in (spools or {}).values())
+    return {
+        'rows': len(after),
+        'raw_bytes': before_bytes,
+        'compact_bytes': after_bytes + index_bytes,
+        'payload_disk_bytes': sum(spool.disk_bytes for spool in (spools or {}).values()),
+        'reduction': round(before_bytes / max(1, after_bytes + index_bytes), 1)
+    }
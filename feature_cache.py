@@ -0,0 +1,273 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import io
+import json
+import os
+import time
+from time_index import TimeIndex
+from features import (
+    BASE_FEATURE_COLUMNS, CSV_COLUMNS, FEATURE_VERSION, RESULT_MAP, RESULT_NAMES,
+    compute_sequential_features, extract_row_features
+)
+
+HASH_CHUNK_SIZE = 1 << 20
+SCAN_CHUNK_SIZE = 4096
+
+def read_appended_rows(csv_path, offset=0):
+    """Lit les lignes complètes ajoutées au CSV après `offset` (en octets)
+
+    Retourne (DataFrame, nouvel offset). La dernière ligne est ignorée tant
+    qu'elle n'est pas terminée par un saut de ligne (écriture en cours).
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b'\n') + 1
+    if end == 0:
+        return pd.DataFrame(columns=CSV_COLUMNS), offset
+    frame = pd.read_csv(io.BytesIO(chunk[:end]), header=None, names=CSV_COLUMNS)
+    return frame, offset + end
+
+class FeatureCache:
+    """Cache persistant des features de base, stocké en tableaux binaires mappables
+
+    Les features par ligne (parsing JSON, horodatage) ne sont calculées qu'une
+    fois par ligne CSV. Les features séquentielles sont recalculées de manière
+    vectorisée au chargement, ce qui garde le cache indépendant de la fenêtre.
+    """
+
+    def __init__(self, csv_path='data/twentyone_rounds.csv', cache_dir='data/feature_cache'):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.features_path = os.path.join(cache_dir, 'features.f64')
+        self.targets_path = os.path.join(cache_dir, 'targets.i1')
+        self.timestamps_path = os.path.join(cache_dir, 'timestamps.i8')
+        self.last_build = {}
+        self._time_index = TimeIndex()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('feature_version') != FEATURE_VERSION:
+            return None
+        if manifest.get('columns') != BASE_FEATURE_COLUMNS:
+            return None
+        if manifest.get('timestamp_unit') != 'ns':
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _hash_prefix(self, length):
+        """Hash SHA-256 des `length` premiers octets du CSV"""
+        digest = hashlib.sha256()
+        remaining = length
+        with open(self.csv_path, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest
+
+    def _encode(self, frame):
+        """Features de base, cibles et horodatages des lignes valides d'un bloc CSV"""
+        targets = frame['option_type'].map(RESULT_MAP)
+        frame = frame[targets.notna()]
+        targets = targets[targets.notna()]
+
+        if frame.empty:
+            return (np.empty((0, len(BASE_FEATURE_COLUMNS))),
+                    np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64))
+
+        features = frame.apply(extract_row_features, axis=1, result_type='expand')
+        features = features.reindex(columns=BASE_FEATURE_COLUMNS)
+        # NaT est codé par le plus petit int64; pandas 3 infère des µs: on fixe les ns
+        timestamps = pd.DatetimeIndex(
+            pd.to_datetime(frame['collected_at'], errors='coerce', utc=True, format='ISO8601')
+        ).as_unit('ns').asi8
+        return (features.to_numpy(dtype=np.float64),
+                targets.to_numpy(dtype=np.int8),
+                timestamps.astype(np.int64))
+
+    def _reset(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for path in (self.features_path, self.targets_path, self.timestamps_path):
+            open(path, 'wb').close()
+
+    def _append(self, rows, features, targets, timestamps):
+        """Ajoute des lignes aux fichiers binaires (tronqués d'abord à `rows` en cas d'écriture interrompue)"""
+        row_bytes = (
+            (self.features_path, features, rows * len(BASE_FEATURE_COLUMNS) * 8),
+            (self.targets_path, targets, rows),
+            (self.timestamps_path, timestamps, rows * 8)
+        )
+        for path, values, expected_size in row_bytes:
+            with open(path, 'r+b') as f:
+                f.truncate(expected_size)
+                f.seek(expected_size)
+                f.write(np.ascontiguousarray(values).tobytes())
+
+    def update(self):
+        """Met à jour le cache: rien si le CSV est inchangé, les seules lignes ajoutées sinon"""
+        start = time.perf_counter()
+        stat = os.stat(self.csv_path)
+        manifest = self._read_manifest()
+
+        if (manifest and manifest['source_path'] == os.path.abspath(self.csv_path)
+                and manifest['source_bytes'] == stat.st_size
+                and manifest['source_mtime'] == stat.st_mtime):
+            self.last_build = {'mode': 'hit', 'new_rows': 0, 'time': time.perf_counter() - start}
+            return manifest
+
+        digest = None
+        if (manifest and manifest['source_path'] == os.path.abspath(self.csv_path)
+                and stat.st_size >= manifest['source_bytes']):
+            digest = self._hash_prefix(manifest['source_bytes'])
+            if digest.hexdigest() != manifest['source_sha256']:
+                digest = None
+
+        if digest is None:
+            # Source réécrite, version des features changée ou premier build
+            self._reset()
+            manifest = {
+                'feature_version': FEATURE_VERSION,
+                'columns': BASE_FEATURE_COLUMNS,
+                'timestamp_unit': 'ns',
+                'source_path': os.path.abspath(self.csv_path),
+                'source_bytes': 0,
+                'rows': 0
+            }
+            digest = hashlib.sha256()
+            mode = 'rebuild'
+        else:
+            mode = 'append'
+
+        frame, new_offset = read_appended_rows(self.csv_path, manifest['source_bytes'])
+        features, targets, timestamps = self._encode(frame)
+        self._append(manifest['rows'], features, targets, timestamps)
+
+        with open(self.csv_path, 'rb') as f:
+            f.seek(manifest['source_bytes'])
+            digest.update(f.read(new_offset - manifest['source_bytes']))
+
+        manifest.update({
+            'source_bytes': new_offset,
+            # mtime seulement si tout le fichier est consommé (sinon ligne partielle à relire)
+            'source_mtime': stat.st_mtime if new_offset == stat.st_size else None,
+            'source_sha256': digest.hexdigest(),
+            'rows': manifest['rows'] + len(targets),
+            'updated_at': time.time()
+        })
+        self._write_manifest(manifest)
+
+        self.last_build = {'mode': mode, 'new_rows': len(targets), 'time': time.perf_counter() - start}
+        print(f"Cache features ({mode}): {len(targets)} nouvelles lignes, "
+              f"{manifest['rows']} au total en {self.last_build['time']:.2f}s")
+        return manifest
+
+    def load_arrays(self):
+        """Retourne (features, targets, timestamps) mappés en mémoire, dans l'ordre du CSV"""
+        manifest = self.update()
+        rows = manifest['rows']
+        if rows == 0:
+            return (np.empty((0, len(BASE_FEATURE_COLUMNS))),
+                    np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64))
+        features = np.memmap(self.features_path, dtype=np.float64, mode='r',
+                             shape=(rows, len(BASE_FEATURE_COLUMNS)))
+        targets = np.memmap(self.targets_path, dtype=np.int8, mode='r', shape=(rows,))
+        timestamps = np.memmap(self.timestamps_path, dtype=np.int64, mode='r', shape=(rows,))
+        return features, targets, timestamps
+
+    @staticmethod
+    def _last_index_where(targets, stop, predicate):
+        """Dernier indice < stop vérifiant predicate, en remontant par blocs (-1 si aucun)"""
+        end = stop
+        while end > 0:
+            begin = max(0, end - SCAN_CHUNK_SIZE)
+            matches = np.flatnonzero(predicate(np.asarray(targets[begin:end])))
+            if len(matches):
+                return begin + matches[-1]
+            end = begin
+        return -1
+
+    def last_row_of_class(self, target, stop):
+        """Indice de la dernière ligne de classe `target` avant `stop` (-1 si aucune)"""
+        _, targets, _ = self.load_arrays()
+        return self._last_index_where(targets, stop, lambda block: block == target)
+
+    def frame_for_rows(self, start, stop, window_size=5):
+        """Features complètes des lignes [start, stop) du CSV, dans l'ordre chronologique
+
+        Les features séquentielles sont celles de load_frame (même ordre par
+        horodatage, stable sur les ex aequo). Seul le contexte nécessaire est
+        reconstruit: la fenêtre de moyenne mobile et la série en cours juste
+        avant la première ligne demandée dans l'ordre chronologique.
+        """
+        features, targets, _ = self.load_arrays()
+        order = self.time_index().offsets
+        ordered_targets = np.asarray(targets)[order]
+        positions = np.flatnonzero((order >= start) & (order < stop))
+        first = positions[0] if len(positions) else 0
+        end = positions[-1] + 1 if len(positions) else 0
+
+        context_start = max(0, first - window_size + 1)
+        if first > 0:
+            last = ordered_targets[first - 1]
+            run_break = self._last_index_where(ordered_targets, first, lambda block: block != last)
+            context_start = min(context_start, run_break + 1)
+
+        result_names = np.array([RESULT_NAMES[code] for code in range(len(RESULT_NAMES))], dtype=object)
+        option_types = result_names[ordered_targets[context_start:end]]
+        frame = pd.DataFrame(np.asarray(features)[order[context_start:end]], columns=BASE_FEATURE_COLUMNS)
+        frame['option_type'] = option_types
+        frame['target'] = ordered_targets[context_start:end].astype(np.float64)
+        for col, values in compute_sequential_features(option_types, window_size).items():
+            frame[col] = values
+        return frame.iloc[positions - context_start].reset_index(drop=True)
+
+    def time_index(self):
+        """Index temporel des lignes du cache (offset = ligne du CSV), tenu à jour par ajout"""
+        _, _, timestamps = self.load_arrays()
+        if self.last_build.get('mode') == 'rebuild' or len(self._time_index) > len(timestamps):
+            self._time_index = TimeIndex()
+        indexed = len(self._time_index)
+        if indexed < len(timestamps):
+            self._time_index.append(np.asarray(timestamps[indexed:]),
+                                    offsets=np.arange(indexed, len(timestamps)))
+        return self._time_index
+
+    def load_frame(self, window_size=5, start=None, end=None):
+        """Construit le DataFrame d'entraînement (features de base + séquentielles + target)
+
+        `start` / `end` (ns UTC) restreignent les lignes retournées; les features
+        séquentielles restent calculées sur tout l'historique qui précède.
+        """
+        features, targets, timestamps = self.load_arrays()
+
+        # Même ordre chronologique que create_sequential_features (stable sur les ex aequo)
+        index = self.time_index()
+        order = index.offsets
+        result_names = np.array([RESULT_NAMES[code] for code in range(len(RESULT_NAMES))], dtype=object)
+        option_types = result_names[targets[order]]
+
+        frame = pd.DataFrame(np.asarray(features)[order], columns=BASE_FEATURE_COLUMNS)
+        frame['option_type'] = option_types
+        frame['collected_at'] = pd.to_datetime(np.asarray(timestamps)[order], utc=True)
+        frame['target'] = np.asarray(targets)[order].astype(np.float64)
+        for col, values in compute_sequential_features(option_types, window_size).items():
+            frame[col] = values
+        if start is not None or end is not None:
+            lo, hi = index.bounds(start, end)
+            frame = frame.iloc[lo:hi].reset_index(drop=True)
+        return frame
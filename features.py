@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+import json
+
+# Incrémenter à chaque changement de la définition des features
+# (invalide les caches de features persistés)
+FEATURE_VERSION = 1
+
+CSV_COLUMNS = ['id', 'event_id', 'collected_at', 'option_type', 'odd', 'round_state', 'raw_payload']
+
+RESULT_MAP = {'Player Win': 0, 'Banker Win': 1, 'Tie': 2, 'Player Pair': 3, 'Banker Pair': 4}
+RESULT_NAMES = {code: name for name, code in RESULT_MAP.items()}
+
+# Résultats suivis par les features séquentielles
+SEQUENTIAL_RESULT_TYPES = ['Player Win', 'Banker Win', 'Tie']
+
+BASE_FEATURE_COLUMNS = [
+    'player_score', 'banker_score', 'round_number', 'is_live', 'odd_value',
+    'hour', 'day_of_week', 'minute',
+    'player_win_odd', 'banker_win_odd', 'tie_odd'
+]
+
+DEFAULT_FEATURES = {
+    'player_score': 0, 'banker_score': 0, 'round_number': 0,
+    'is_live': 0, 'odd_value': 1.0, 'hour': 0,
+    'day_of_week': 0, 'minute': 0,
+    'player_win_odd': 1.0, 'banker_win_odd': 1.0, 'tie_odd': 1.0
+}
+
+def extract_row_features(row):
+    """Extrait les features de base d'une ligne CSV (round_state, raw_payload, cote, horodatage)"""
+    try:
+        # Gérer les différents types de données
+        round_state_str = str(row['round_state']) if pd.notna(row['round_state']) else '{}'
+        raw_payload_str = str(row['raw_payload']) if pd.notna(row['raw_payload']) else '{}'
+
+        round_state = json.loads(round_state_str) if round_state_str else {}
+        raw_payload = json.loads(raw_payload_str) if raw_payload_str else {}
+
+        features = {
+            'player_score': round_state.get('playerScore', 0),
+            'banker_score': round_state.get('bankerScore', 0),
+            'round_number': round_state.get('roundNumber', 0),
+            'is_live': 1 if round_state.get('isLive', False) else 0,
+            'odd_value': float(row['odd']) if pd.notna(row['odd']) and str(row['odd']) != 'null' else 1.0
+        }
+
+        # Features temporelles
+        timestamp = pd.to_datetime(row['collected_at'], errors='coerce')
+        if pd.notna(timestamp):
+            features.update({
+                'hour': timestamp.hour,
+                'day_of_week': timestamp.dayofweek,
+                'minute': timestamp.minute
+            })
+        else:
+            features.update({'hour': 0, 'day_of_week': 0, 'minute': 0})
+
+        # Extraire les cotes depuis bettingOptions
+        betting_options = raw_payload.get('bettingOptions', [])
+        if isinstance(betting_options, list):
+            odds_map = {}
+            for option in betting_options:
+                if isinstance(option, dict):
+                    odds_map[option.get('optionType', '')] = option.get('odd', 1.0)
+
+            features.update({
+                'player_win_odd': odds_map.get('Player Win', 1.0),
+                'banker_win_odd': odds_map.get('Banker Win', 1.0),
+                'tie_odd': odds_map.get('Tie', 1.0)
+            })
+        else:
+            features.update({
+                'player_win_odd': 1.0,
+                'banker_win_odd': 1.0,
+                'tie_odd': 1.0
+            })
+
+        return features
+
+    except Exception as e:
+        print(f"Erreur extraction features: {e}")
+        return dict(DEFAULT_FEATURES)
+
+def rolling_mean(values, window):
+    """Moyenne mobile (min_periods=1) vectorisée"""
+    cumsum = np.cumsum(values, dtype=np.float64)
+    sums = cumsum.copy()
+    sums[window:] -= cumsum[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+def consecutive_counts(flags):
+    """Longueur de la série courante de 1 à chaque position, vectorisée"""
+    flags = np.asarray(flags, dtype=np.int64)
+    cumsum = np.cumsum(flags)
+    # Valeur du cumul au dernier 0 rencontré: la série repart de là
+    resets = np.maximum.accumulate(np.where(flags == 0, cumsum, 0))
+    return cumsum - resets
+
+def sequential_feature_columns(window_size=5):
+    """Colonnes séquentielles dans l'ordre produit par compute_sequential_features"""
+    names = [result_type.replace(" ", "_") for result_type in SEQUENTIAL_RESULT_TYPES]
+    columns = []
+    for name in names:
+        columns.extend([f'is_{name}', f'{name}_ma_{window_size}'])
+    columns.extend(f'consecutive_{name}' for name in names)
+    return columns
+
+def compute_sequential_features(option_types, window_size=5):
+    """Calcule moyennes mobiles et séries consécutives sur une séquence de résultats ordonnée"""
+    option_types = np.asarray(option_types)
+    columns = {}
+    consecutive = {}
+    for result_type in SEQUENTIAL_RESULT_TYPES:
+        name = result_type.replace(" ", "_")
+        flags = (option_types == result_type).astype(int)
+        columns[f'is_{name}'] = flags
+        columns[f'{name}_ma_{window_size}'] = rolling_mean(flags, window_size)
+        consecutive[f'consecutive_{name}'] = consecutive_counts(flags)
+    columns.update(consecutive)
+    return columns
@@ -0,0 +1,103 @@
+import io
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # Export Arrow optionnel
+    pa = None
+
+# Colonnes JSON brutes exclues par défaut de l'historique et des exports
+HISTORY_HEAVY_COLUMNS = ('raw_payload', 'round_state')
+
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+def select_columns(frame, fields=None):
+    """Colonnes demandées (liste ou 'all'), sans les colonnes JSON brutes par défaut"""
+    if fields == 'all':
+        return list(frame.columns)
+    columns = fields or [col for col in frame.columns if col not in HISTORY_HEAVY_COLUMNS]
+    unknown = [col for col in columns if col not in frame.columns]
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(unknown)}")
+    return columns
+
+def history_template(predictor, fields=None):
+    """Bloc vide de l'export: colonnes et types, même si la plage ne contient aucune ligne"""
+    frame = predictor.preprocess_frame(predictor.attach_payloads(predictor.data.iloc[:0], fields))
+    return frame[select_columns(frame, fields)]
+
+def iter_history_chunks(predictor, start=None, end=None, fields=None, chunk_size=EXPORT_CHUNK_ROWS):
+    """Historique de la plage en DataFrames prétraités de `chunk_size` lignes, ordre chronologique
+
+    Seul le bloc courant est prétraité: la mémoire reste bornée par `chunk_size`.
+    """
+    keys, _, offsets = predictor.time_index.snapshot()
+    lo = 0 if start is None else int(np.searchsorted(keys, start, 'left'))
+    hi = len(keys) if end is None else int(np.searchsorted(keys, end, 'right'))
+    data = predictor.data
+    for begin in range(lo, hi, chunk_size):
+        rows = data.iloc[offsets[begin:min(begin + chunk_size, hi)]]
+        chunk = predictor.preprocess_frame(predictor.attach_payloads(rows, fields))
+        yield chunk[select_columns(chunk, fields)]
+
+def _ndjson(chunks, template):
+    for chunk in chunks:
+        text = chunk.to_json(orient='records', lines=True, date_format='iso', force_ascii=False)
+        yield text if not text or text.endswith('\n') else text + '\n'
+
+def _csv(chunks, template):
+    # En-tête toujours écrit, y compris pour une plage vide
+    yield template.to_csv(index=False)
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False)
+
+def _arrow_schema(template):
+    """Schéma de l'export; une colonne sans valeur (type null) est typée texte"""
+    schema = pa.Schema.from_pandas(template, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+def _arrow(chunks, template):
+    # Schéma fixé par les colonnes de l'export et non par le premier bloc: chaque bloc y est converti
+    sink = io.BytesIO()
+    schema = _arrow_schema(template)
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    for chunk in chunks:
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+def stream_history(predictor, output_format='ndjson', start=None, end=None, fields=None,
+                   chunk_size=EXPORT_CHUNK_ROWS):
+    """Générateur des octets/texte de l'export dans le format demandé"""
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format inconnu: {output_format} ({', '.join(EXPORT_FORMATS)})")
+    if output_format == 'arrow' and pa is None:
+        raise ValueError("Export Arrow indisponible: pyarrow n'est pas installé")
+
+    # Colonnes validées avant la réponse: une erreur de champs donne un 400, pas un flux tronqué
+    template = history_template(predictor, fields)
+    chunks = iter_history_chunks(predictor, start, end, fields, chunk_size)
+    first = next(chunks, None)
+
+    def all_chunks():
+        if first is not None:
+            yield first
+        yield from chunks
+
+    serializer = {'ndjson': _ndjson, 'csv': _csv, 'arrow': _arrow}[output_format]
+    return serializer(all_chunks(), template)
@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+import time
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+import numpy as np
+from model_artifact import bundle_identity, load_model_bundle, validate_model_bundle
+from metrics import INFERENCE_BATCH_ROWS, INFERENCE_FALLBACKS
+
+# État d'un processus du pool: modèle chargé depuis l'artefact, rechargé quand la génération change
+_worker = {'model_path': None, 'generation': None, 'bundle': None}
+
+def _init_worker(model_path):
+    _worker['model_path'] = model_path
+
+def _worker_bundle(generation):
+    if _worker['generation'] != generation:
+        # Même contrôle que le ModelWatcher: un artefact rejeté ne sert jamais
+        bundle = load_model_bundle(_worker['model_path'])
+        validate_model_bundle(bundle)
+        _worker['bundle'], _worker['generation'] = bundle, generation
+    return _worker['bundle']
+
+def _warm_up(generation):
+    _worker_bundle(generation)
+    return os.getpid()
+
+def _predict_batch(generation, identity, matrix):
+    """(classes prédites, probabilités) d'un lot, dans un processus du pool"""
+    bundle = _worker_bundle(generation)
+    if bundle_identity(bundle) != identity:
+        # Fichier remplacé depuis le contrôle du ModelWatcher: relu au prochain lot
+        _worker['generation'] = None
+        raise ValueError("Artefact du processus d'inférence différent du modèle servi")
+    scaled = bundle.scaler.transform(matrix)
+    return bundle.model.predict(scaled), bundle.model.predict_proba(scaled)
+
+class InferenceService:
+    """Inférence dans un pool de processus, par micro-lots, hors des threads de requête et de polling
+
+    Les appelants déposent leur vecteur de features dans une file et attendent
+    le résultat (attente sans le GIL). Un thread répartiteur regroupe les
+    demandes arrivées en `batch_wait` secondes (au plus `batch_max`) en une
+    seule matrice envoyée au pool. Chaque processus charge et valide l'artefact
+    depuis `model_path` quand le ModelWatcher change de version, et ne sert un
+    lot que si son identité (bundle_identity) est celle du modèle validé.
+    predict() retourne None (l'appelant calcule alors dans son thread) si le
+    modèle demandé n'est pas celui du service, si la file est pleine, si le
+    pool échoue ou si le résultat dépasse `timeout` secondes.
+    """
+
+    def __init__(self, model_path, workers=2, batch_max=32, batch_wait=0.002, timeout=0.5,
+                 max_pending=1024):
+        self.model_path = model_path
+        self.workers = workers
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.is_running = False
+        self._queue = queue.Queue()
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._bundle = None
+        self._generation = 0
+        self._identity = None
+        self.batches = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self.last_error = None
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, model_path):
+        """INFERENCE_WORKERS=0 (défaut): pas de service, inférence dans le thread appelant"""
+        workers = int(os.environ.get('INFERENCE_WORKERS', 0))
+        if workers <= 0:
+            return None
+        return cls(model_path, workers=workers,
+                   batch_max=int(os.environ.get('INFERENCE_BATCH_MAX', 32)),
+                   batch_wait=float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 2)) / 1000,
+                   timeout=float(os.environ.get('INFERENCE_TIMEOUT_MS', 500)) / 1000)
+
+    def swap_model(self, bundle):
+        """Nouveau modèle servi (appelé par le ModelWatcher comme pour les prédicteurs)"""
+        self._bundle = bundle
+        self._identity = bundle_identity(bundle)
+        self._generation += 1
+        pool = self._get_pool()
+        for _ in range(self.workers):
+            pool.submit(_warm_up, self._generation)
+
+    def _get_pool(self):
+        # Un pool hérité d'un fork (worker gunicorn) n'est pas utilisable: on en recrée un.
+        # Pas de fork: ce processus a déjà des threads (polling, watcher) dont les verrous seraient
+        # copiés dans l'état où ils sont. Le serveur forkserver part d'un interpréteur neuf qui ne
+        # précharge que ce module. Chaque processus réimporte le script principal sous le nom
+        # __mp_main__ (le script gunicorn, ou app.py qui n'y démarre alors aucun service de fond).
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(self.model_path,))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _fallback(self, reason):
+        self.fallbacks += 1
+        INFERENCE_FALLBACKS.inc(reason=reason)
+        return None
+
+    def predict(self, bundle, feature_vector):
+        """(classe prédite, probabilités) pour un vecteur, ou None pour calculer dans l'appelant"""
+        if not self.is_running or bundle is not self._bundle:
+            return self._fallback('model')
+        if self._queue.qsize() >= self.max_pending:
+            return self._fallback('queue_full')
+        future = Future()
+        self._queue.put((self._generation, self._identity, feature_vector, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Une demande encore en file est abandonnée par le répartiteur
+            future.cancel()
+            return self._fallback('timeout')
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            return self._fallback('error')
+
+    def _next_batch(self):
+        batch = [self._queue.get(timeout=0.5)]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _submit(self, generation, identity, requests):
+        # Les demandes abandonnées par leur appelant (timeout) ne partent pas au pool
+        live = [(vector, future) for vector, future in requests if future.set_running_or_notify_cancel()]
+        if not live:
+            return
+        vectors = [vector for vector, _ in live]
+        futures = [future for _, future in live]
+        pool = self._get_pool()
+        try:
+            batch_future = pool.submit(_predict_batch, generation, identity,
+                                       np.asarray(vectors, dtype=np.float64))
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._reset_pool(pool)
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(futures)
+        INFERENCE_BATCH_ROWS.observe(len(futures))
+
+        def deliver(done):
+            try:
+                predictions, probabilities = done.result()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if not isinstance(e, ValueError):
+                    self.logger.error(f"Erreur pool d'inférence: {self.last_error}")
+                    self._reset_pool(pool)
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for row, future in enumerate(futures):
+                future.set_result((predictions[row], probabilities[row]))
+
+        batch_future.add_done_callback(deliver)
+
+    def _run(self):
+        while self.is_running:
+            try:
+                batch = self._next_batch()
+            except queue.Empty:
+                continue
+            # Un lot ne mélange pas deux versions du modèle
+            groups = {}
+            for generation, identity, vector, future in batch:
+                groups.setdefault((generation, identity), []).append((vector, future))
+            for (generation, identity), requests in groups.items():
+                try:
+                    self._submit(generation, identity, requests)
+                except Exception as e:
+                    self.logger.error(f"Erreur répartition inférence: {e}")
+
+    def start(self, bundle):
+        """Démarre le pool (préchargé avec le modèle) et le thread répartiteur"""
+        if self.is_running:
+            return None
+        self.swap_model(bundle)
+        self.is_running = True
+        thread = threading.Thread(target=self._run, name='inference-dispatcher')
+        thread.daemon = True
+        thread.start()
+        self.logger.info(f"Service d'inférence: {self.workers} processus, lots de {self.batch_max} max")
+        return thread
+
+    def stop(self):
+        self.is_running = False
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_status(self):
+        return {
+            'is_running': self.is_running,
+            'workers': self.workers,
+            'model_generation': self._generation,
+            'batch_max': self.batch_max,
+            'batch_wait_ms': self.batch_wait * 1000,
+            'timeout_ms': self.timeout * 1000,
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_rows': round(self.requests / self.batches, 2) if self.batches else None,
+            'fallbacks': self.fallbacks,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,217 @@
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from storage import CsvRoundStorage
+
+# Même règle que CsvStorageService.isEventAlreadySaved: un event resauvé moins de 30s après est un doublon
+DEDUP_WINDOW_SECONDS = 30
+
+def _iso(moment):
+    """Horodatage au format Date.toISOString() du collecteur Node"""
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def is_game_finished(round_state, raw_payload):
+    """Portage de CsvStorageService.isGameFinished"""
+    try:
+        round_state = round_state or {}
+        raw_payload = raw_payload or {}
+        if round_state.get('gamePhase') == 'Result':
+            return True
+        player_score = int(round_state.get('playerScore') or 0)
+        banker_score = int(round_state.get('bankerScore') or 0)
+        if player_score >= 21 or banker_score >= 21:
+            return True
+        if player_score > 0 and banker_score > 0 and round_state.get('timeRemaining') == 0:
+            return True
+        if raw_payload.get('isMockData'):
+            return not round_state.get('isLive')
+        event_round_state = (raw_payload.get('event') or {}).get('roundState')
+        if event_round_state:
+            return event_round_state.get('gamePhase') == 'Result'
+        return False
+    except Exception:
+        # En cas de doute, sauvegarder pour ne pas perdre de données
+        return True
+
+class RoundIngestWriter:
+    """Écrit les rounds du flux live dans le stockage (CSV du collecteur par défaut), sans le relire
+
+    Les doublons sont détectés par un index mémoire (event_id, tranche de 30s)
+    amorcé une seule fois au démarrage. Les lignes sont mises en tampon et
+    ajoutées par lots (un seul append ou une transaction par lot), au plus
+    tard toutes les `flush_interval` secondes. Un lot dont l'écriture échoue
+    est remis en tête du tampon et réessayé au flush suivant.
+    """
+
+    def __init__(self, csv_path='data/twentyone_rounds.csv', dedup_window=DEDUP_WINDOW_SECONDS,
+                 flush_interval=1.0, flush_rows=500, storage=None):
+        self.storage = storage or CsvRoundStorage(csv_path)
+        self.dedup_window = dedup_window
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.is_running = False
+        self.rows_written = 0
+        self.duplicates_skipped = 0
+        self.unfinished_skipped = 0
+        self.flushes = 0
+        self.write_errors = 0
+
+        self._pending = []
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.storage.ensure_exists()
+        self._seed_index()
+
+    def _bucket(self, seconds):
+        return int(seconds // self.dedup_window)
+
+    def _seed_index(self):
+        """Amorce l'index avec la dernière sauvegarde récente de chaque event (lecture unique)"""
+        start = time.perf_counter()
+        latest = {}
+        since = time.time_ns() - 2 * self.dedup_window * 1_000_000_000
+        try:
+            latest = self.storage.last_saves(since)
+        except Exception as e:
+            self.logger.warning(f"Index de dédoublonnage non amorcé ({self.storage.describe()}): {e}")
+        for event_id, seconds in latest.items():
+            self._recent[(event_id, self._bucket(seconds))] = seconds
+        self.logger.info(f"Index de dédoublonnage: {len(self._recent)} events en "
+                         f"{time.perf_counter() - start:.2f}s")
+
+    def _is_duplicate(self, event_id, seconds):
+        bucket = self._bucket(seconds)
+        for key in ((event_id, bucket), (event_id, bucket - 1)):
+            saved = self._recent.get(key)
+            if saved is not None and seconds - saved < self.dedup_window:
+                return True
+        return False
+
+    def _prune_index(self, now):
+        """Oublie les sauvegardes trop anciennes pour encore produire un doublon"""
+        oldest_bucket = self._bucket(now) - 2
+        stale = [key for key in self._recent if key[1] < oldest_bucket]
+        for key in stale:
+            del self._recent[key]
+
+    def save_round(self, event_id, betting_options, round_state, raw_payload):
+        """Met en file les lignes d'un round terminé (une par option de pari); retourne leur nombre"""
+        if not is_game_finished(round_state, raw_payload):
+            self.unfinished_skipped += 1
+            return 0
+        if not betting_options:
+            return 0
+        now = datetime.now(timezone.utc)
+        timestamp = _iso(now)
+        seconds = now.timestamp()
+        event_key = str(event_id)
+
+        round_state_json = json.dumps(round_state, ensure_ascii=False)
+        raw_payload_json = json.dumps(raw_payload, ensure_ascii=False, default=str)
+        rows = [[
+            time.time() * 1000 + random.random(),  # ID unique simple, comme le collecteur Node
+            event_id,
+            timestamp,
+            option.get('optionType') or '',
+            option.get('odd') or '',
+            round_state_json,
+            raw_payload_json
+        ] for option in betting_options]
+
+        with self._lock:
+            if self._is_duplicate(event_key, seconds):
+                self.duplicates_skipped += 1
+                return 0
+            self._recent[(event_key, self._bucket(seconds))] = seconds
+            self._pending.extend(rows)
+            if len(self._pending) >= self.flush_rows:
+                self._wakeup.notify()
+        return len(betting_options)
+
+    def save_event(self, event):
+        """Adapte un événement de BaccaratAPIClient au format du collecteur"""
+        round_state = {
+            'playerScore': event.get('playerScore', 0),
+            'bankerScore': event.get('bankerScore', 0),
+            'roundNumber': event.get('roundNumber', 0),
+            'gamePhase': event.get('gamePhase'),
+            'isLive': event.get('isLive', False)
+        }
+        betting_options = event.get('bettingOptions', [])
+        raw_payload = {
+            'event': {key: value for key, value in event.items() if key != 'trace'},
+            'bettingOptions': betting_options,
+            'collectedAt': _iso(datetime.now(timezone.utc)),
+            'isMockData': False
+        }
+        return self.save_round(event.get('eventId'), betting_options, round_state, raw_payload)
+
+    def flush(self):
+        """Écrit les lignes en attente en un seul lot; retourne leur nombre"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._prune_index(time.time())
+        if not pending:
+            return 0
+        try:
+            written = self.storage.append_rows(pending)
+        except Exception:
+            # Lignes conservées (leur round reste marqué vu): réécrites au prochain flush
+            with self._lock:
+                self._pending[:0] = pending
+                self.write_errors += 1
+            raise
+        self.rows_written += written
+        self.flushes += 1
+        return written
+
+    def _run(self):
+        while self.is_running:
+            with self._lock:
+                if len(self._pending) < self.flush_rows:
+                    self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Erreur écriture ({self.storage.describe()}), nouvel essai dans "
+                                  f"{self.flush_interval}s: {e}")
+                # Tampon plein et stockage en erreur: pas de réessai en boucle serrée
+                time.sleep(self.flush_interval)
+
+    def start(self):
+        """Démarre le thread d'écriture groupée"""
+        self.is_running = True
+        thread = threading.Thread(target=self._run, name='ingest-writer')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.is_running = False
+        with self._lock:
+            self._wakeup.notify()
+        self.flush()
+
+    def get_status(self):
+        with self._lock:
+            pending = len(self._pending)
+            indexed = len(self._recent)
+        return {
+            'storage': self.storage.describe(),
+            'is_running': self.is_running,
+            'rows_written': self.rows_written,
+            'pending_rows': pending,
+            'duplicates_skipped': self.duplicates_skipped,
+            'unfinished_skipped': self.unfinished_skipped,
+            'flushes': self.flushes,
+            'write_errors': self.write_errors,
+            'dedup_index_size': indexed
+        }
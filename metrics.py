@@ -0,0 +1,210 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seuils (secondes) adaptés aux latences mesurées: de la prédiction (~100µs) au fetch HTTP (~10s)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Latences de bout en bout d'un round: jusqu'à plusieurs minutes
+ROUND_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels attendus {self.labelnames}, reçus {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: tuple(map(str, item[0])))
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, function, **labels):
+        """Valeur calculée au moment du scrape (profondeur de file, âge d'une donnée...)"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def render(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().render()
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class MetricsRegistry:
+    """Registre de métriques exposées au format texte Prometheus (par processus)"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'baccarat_http_request_duration_seconds', 'Latence des routes Flask',
+    ('endpoint', 'method', 'status'))
+UPSTREAM_FETCH_SECONDS = REGISTRY.histogram(
+    'baccarat_upstream_fetch_duration_seconds', "Latence des appels à l'API amont",
+    ('client', 'endpoint'))
+UPSTREAM_FETCH_ERRORS = REGISTRY.counter(
+    'baccarat_upstream_fetch_errors_total', "Erreurs des appels à l'API amont",
+    ('client', 'endpoint', 'reason'))
+FEATURE_EXTRACTION_SECONDS = REGISTRY.histogram(
+    'baccarat_feature_extraction_duration_seconds', 'Temps de construction des features',
+    ('predictor',))
+INFERENCE_SECONDS = REGISTRY.histogram(
+    'baccarat_inference_duration_seconds', "Temps d'inférence (normalisation + modèle)",
+    ('predictor',))
+INFERENCE_BATCH_ROWS = REGISTRY.histogram(
+    'baccarat_inference_batch_rows', "Demandes regroupées par lot du service d'inférence",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+INFERENCE_FALLBACKS = REGISTRY.counter(
+    'baccarat_inference_fallbacks_total', "Inférences calculées dans le thread appelant faute de service",
+    ('reason',))
+CSV_RELOAD_SECONDS = REGISTRY.histogram(
+    'baccarat_csv_reload_duration_seconds', "Temps de chargement de l'historique",
+    ('loader',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'baccarat_cache_requests_total', 'Accès aux caches (hit/miss)',
+    ('cache', 'result'))
+POLLER_LAG_SECONDS = REGISTRY.histogram(
+    'baccarat_poller_lag_seconds', "Retard d'un cycle de polling sur son horaire prévu",
+    ('client',))
+POLLER_LAST_SUCCESS = REGISTRY.gauge(
+    'baccarat_poller_last_success_timestamp_seconds', 'Horodatage du dernier fetch réussi',
+    ('client',))
+ROUND_QUEUE_DEPTH = REGISTRY.gauge(
+    'baccarat_round_queue_depth', 'Rounds en attente de prédiction entre poller et workers',
+    ('queue',))
+ROUND_QUEUE_ITEMS = REGISTRY.counter(
+    'baccarat_round_queue_items_total', 'Rounds de la file de prédiction par issue (enqueued/coalesced/dropped/processed/failed)',
+    ('queue', 'outcome'))
+ROUND_STAGE_SECONDS = REGISTRY.histogram(
+    'baccarat_round_stage_latency_seconds', "Latence d'un round entre deux étapes du pipeline",
+    ('pipeline', 'segment'), buckets=ROUND_BUCKETS)
+
+def render_metrics():
+    return REGISTRY.render()
@@ -0,0 +1,156 @@
+import numpy as np
+import joblib
+import os
+import threading
+from features import BASE_FEATURE_COLUMNS, RESULT_NAMES, sequential_feature_columns
+
+# Features que les prédicteurs savent construire en ligne
+KNOWN_FEATURE_COLUMNS = set(BASE_FEATURE_COLUMNS) | {
+    col for col in sequential_feature_columns(5) if not col.startswith('is_')
+}
+
+class FeatureLayout:
+    """Position de chaque feature connue dans le vecteur du modèle, calculée une fois par artefact
+
+    Les extracteurs écrivent `row[layout.player_score] = ...` dans une ligne
+    NumPy réutilisée par thread: ni dict ni liste par prédiction. Une feature
+    connue absente du modèle pointe vers une colonne supplémentaire ignorée
+    (index `size`); vector(row) est la vue des `size` premières colonnes,
+    dans l'ordre de feature_columns.
+    """
+
+    def __init__(self, feature_columns):
+        self.columns = list(feature_columns)
+        self.size = len(self.columns)
+        positions = {column: index for index, column in enumerate(self.columns)}
+        for column in KNOWN_FEATURE_COLUMNS:
+            setattr(self, column, positions.get(column, self.size))
+        self._local = threading.local()
+
+    def row(self):
+        """Ligne du thread courant remise à zéro (une feature non écrite vaut 0)"""
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.zeros(self.size + 1)
+        else:
+            row.fill(0.0)
+        return row
+
+    def vector(self, row):
+        """Vue (sans copie) des features du modèle; valable jusqu'à la prochaine row() du thread"""
+        return row[:self.size]
+
+class ModelBundle:
+    """Modèle, scaler et colonnes d'une même version, remplacés ensemble"""
+
+    def __init__(self, model=None, scaler=None, feature_columns=None, metadata=None):
+        self.model = model
+        self.scaler = scaler
+        self.feature_columns = list(feature_columns or [])
+        self.metadata = metadata or {}
+        self._layout = None
+
+    @property
+    def version(self):
+        return self.metadata.get('version')
+
+    @property
+    def layout(self):
+        """FeatureLayout de feature_columns (compilé au premier usage)"""
+        if getattr(self, '_layout', None) is None:
+            self._layout = FeatureLayout(self.feature_columns)
+        return self._layout
+
+def artifact_stamp_path(model_path):
+    """Fichier dont la modification signale une nouvelle version à servir"""
+    if os.path.isdir(model_path):
+        return os.path.join(model_path, 'CURRENT')
+    return model_path
+
+def load_model_bundle(model_path):
+    """Charge un artefact modèle
+
+    Un répertoire est lu comme un registre versionné (version courante, tableaux
+    mappés en mémoire); un fichier comme le dict joblib de BaccaratModelTrainer.save_model.
+    """
+    if os.path.isdir(model_path):
+        from model_registry import ModelRegistry
+        return ModelRegistry(model_path).load()
+    
+    model_data = joblib.load(model_path)
+    metadata = {key: value for key, value in model_data.items()
+                if key not in ('model', 'scaler', 'feature_columns')}
+    return ModelBundle(model_data['model'], model_data['scaler'],
+                       model_data['feature_columns'], metadata)
+
+def bundle_identity(bundle):
+    """Identité d'un artefact: (version, date d'entraînement, colonnes), partagée par deux chargements du même fichier"""
+    return (bundle.metadata.get('version'), bundle.metadata.get('training_date'), tuple(bundle.feature_columns))
+
+def validate_model_bundle(bundle):
+    """Vérifie la compatibilité des colonnes et fait une prédiction de contrôle
+
+    Lève ValueError si l'artefact ne peut pas servir les prédicteurs.
+    """
+    columns = bundle.feature_columns
+    if not columns:
+        raise ValueError("feature_columns vide")
+    unknown = set(columns) - KNOWN_FEATURE_COLUMNS
+    if unknown:
+        raise ValueError(f"Features inconnues des prédicteurs: {sorted(unknown)}")
+    for name, component in (('scaler', bundle.scaler), ('model', bundle.model)):
+        n_features = getattr(component, 'n_features_in_', None)
+        if n_features != len(columns):
+            raise ValueError(f"{name} attend {n_features} features, artefact en déclare {len(columns)}")
+    unknown_classes = {int(c) for c in bundle.model.classes_} - set(RESULT_NAMES)
+    if unknown_classes:
+        raise ValueError(f"Classes inconnues: {sorted(unknown_classes)}")
+
+    # Prédiction de contrôle sur une ligne neutre
+    probabilities = bundle.model.predict_proba(bundle.scaler.transform(np.zeros((1, len(columns)))))
+    if probabilities.shape != (1, len(bundle.model.classes_)):
+        raise ValueError(f"Forme de sortie inattendue: {probabilities.shape}")
+    if not np.all(np.isfinite(probabilities)) or abs(probabilities.sum() - 1.0) > 1e-6:
+        raise ValueError("Probabilités de contrôle invalides")
+    return True
+
+class ModelHolder:
+    """Mixin des prédicteurs: le modèle courant est un seul ModelBundle
+
+    Le remplacement est une affectation unique (atomique sous le GIL). Une
+    prédiction doit lire `self.model_bundle` une seule fois au début, pour
+    terminer sur la version avec laquelle elle a commencé.
+    """
+
+    model_bundle = ModelBundle()
+    # InferenceService partagé (app.py), None: inférence dans le thread appelant
+    inference = None
+
+    def swap_model(self, bundle):
+        """Remplace atomiquement le modèle courant"""
+        self.model_bundle = bundle
+
+    def infer(self, bundle, feature_vector):
+        """(classe prédite, probabilités) d'un vecteur de features avec `bundle`
+
+        Passe par le service d'inférence s'il est configuré; sinon, ou s'il ne
+        répond pas à temps, le calcul se fait dans le thread appelant.
+        """
+        if self.inference is not None:
+            result = self.inference.predict(bundle, feature_vector)
+            if result is not None:
+                return result
+        feature_vector_scaled = bundle.scaler.transform(np.reshape(feature_vector, (1, -1)))
+        return bundle.model.predict(feature_vector_scaled)[0], bundle.model.predict_proba(feature_vector_scaled)[0]
+
+    @property
+    def model(self):
+        return self.model_bundle.model
+
+    @property
+    def scaler(self):
+        return self.model_bundle.scaler
+
+    @property
+    def feature_columns(self):
+        return self.model_bundle.feature_columns
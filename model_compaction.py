@@ -0,0 +1,169 @@
+import numpy as np
+import time
+from model_registry import FlatForest
+
+# Probabilités de feuille quantifiées sur 8 bits
+VALUE_LEVELS = 255
+
+def _smallest_dtype(max_value, signed=False):
+    """Plus petit type entier pouvant représenter 0..max_value"""
+    candidates = (np.int8, np.int16, np.int32) if signed else (np.uint8, np.uint16, np.uint32)
+    for dtype in candidates:
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _float32_floor(values):
+    """Arrondit vers le bas en float32: pour x float32, x <= t64 équivaut à x <= floor32(t64)"""
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def _tree_slices(forest):
+    bounds = list(np.asarray(forest.roots)) + [forest.node_count]
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(forest.n_estimators)]
+
+def _compact_tree(forest, start, stop, leaf_tolerance):
+    """Fusionne les feuilles sœurs quasi identiques puis retire les nœuds inaccessibles
+
+    La valeur d'un nœud interne est déjà la moyenne pondérée de ses enfants:
+    le transformer en feuille revient à fusionner ces enfants.
+    Retourne les tableaux locaux de l'arbre (indices relatifs à sa racine).
+    """
+    feature = np.asarray(forest.feature[start:stop]).copy()
+    threshold = np.asarray(forest.threshold[start:stop], dtype=np.float64).copy()
+    left = np.asarray(forest.left[start:stop], dtype=np.int64) - start
+    right = np.asarray(forest.right[start:stop], dtype=np.int64) - start
+    value = np.asarray(forest.value[start:stop], dtype=np.float64)
+    node_ids = np.arange(stop - start)
+    is_leaf = left == node_ids
+
+    # Les enfants ont des indices supérieurs à leur parent: parcours inverse = post-ordre
+    for node in range(len(node_ids) - 1, -1, -1):
+        if is_leaf[node]:
+            continue
+        l, r = left[node], right[node]
+        if is_leaf[l] and is_leaf[r] and np.abs(value[l] - value[r]).max() <= leaf_tolerance:
+            is_leaf[node] = True
+            left[node] = right[node] = node
+
+    # Renumérotation des seuls nœuds accessibles depuis la racine
+    reachable = []
+    depth = {0: 0}
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        reachable.append(node)
+        if not is_leaf[node]:
+            for child in (right[node], left[node]):
+                depth[child] = depth[node] + 1
+                stack.append(child)
+    reachable.sort()
+    new_index = np.full(len(node_ids), -1, dtype=np.int64)
+    new_index[reachable] = np.arange(len(reachable))
+
+    kept = np.asarray(reachable)
+    kept_leaf = is_leaf[kept]
+    local_ids = np.arange(len(kept))
+    tree = {
+        'feature': np.where(kept_leaf, 0, feature[kept]),
+        'threshold': np.where(kept_leaf, 0.0, threshold[kept]),
+        'left': np.where(kept_leaf, local_ids, new_index[left[kept]]),
+        'right': np.where(kept_leaf, local_ids, new_index[right[kept]]),
+        # Seules les feuilles sont lues à l'inférence
+        'value': np.where(kept_leaf[:, None], value[kept], 0.0),
+        'max_depth': max(depth[node] for node in reachable)
+    }
+    return tree
+
+def _merge_duplicate_trees(trees, X_ref, duplicate_tolerance):
+    """Regroupe les arbres dont les sorties sur X_ref diffèrent de moins de la tolérance
+
+    Retourne [(arbre conservé, poids)], le poids comptant les arbres absorbés.
+    """
+    if X_ref is None or len(trees) < 2:
+        return [(tree, 1.0) for tree in trees]
+
+    outputs = []
+    for tree in trees:
+        single = FlatForest(tree['feature'], tree['threshold'], tree['left'], tree['right'],
+                            tree['value'], np.zeros(1, dtype=np.int64), np.arange(tree['value'].shape[1]),
+                            tree['max_depth'], X_ref.shape[1])
+        outputs.append(single.predict_proba(X_ref))
+
+    kept = []
+    for index, tree in enumerate(trees):
+        for entry in kept:
+            if np.abs(outputs[entry[0]] - outputs[index]).max() <= duplicate_tolerance:
+                entry[2] += 1.0
+                break
+        else:
+            kept.append([index, tree, 1.0])
+    return [(tree, weight) for _, tree, weight in kept]
+
+def compact_forest(forest, X_ref=None, leaf_tolerance=0.0, duplicate_tolerance=0.0):
+    """Produit une FlatForest compacte: arbres dédoublonnés, nœuds élagués, types réduits
+
+    - feuilles sœurs à moins de `leaf_tolerance` fusionnées dans leur parent;
+    - arbres dont les sorties sur `X_ref` diffèrent de moins de `duplicate_tolerance`
+      fusionnés (poids cumulé) — nécessite X_ref;
+    - seuils en float32 (arrondis vers le bas, comparaisons inchangées),
+      probabilités de feuille sur 8 bits, indices au plus petit type entier.
+    """
+    trees = [_compact_tree(forest, start, stop, leaf_tolerance) for start, stop in _tree_slices(forest)]
+    merged = _merge_duplicate_trees(trees, X_ref, duplicate_tolerance)
+
+    feature, threshold, left, right, value, roots, weights = [], [], [], [], [], [], []
+    offset = 0
+    for tree, weight in merged:
+        feature.append(tree['feature'])
+        threshold.append(tree['threshold'])
+        left.append(tree['left'] + offset)
+        right.append(tree['right'] + offset)
+        value.append(tree['value'])
+        roots.append(offset)
+        weights.append(weight)
+        offset += len(tree['feature'])
+
+    node_dtype = _smallest_dtype(offset - 1)
+    weights = np.asarray(weights, dtype=np.float32)
+    return FlatForest(
+        np.concatenate(feature).astype(_smallest_dtype(forest.n_features_in_ - 1)),
+        _float32_floor(np.concatenate(threshold)),
+        np.concatenate(left).astype(node_dtype),
+        np.concatenate(right).astype(node_dtype),
+        np.rint(np.concatenate(value) * VALUE_LEVELS).astype(np.uint8),
+        np.asarray(roots, dtype=node_dtype),
+        np.asarray(forest.classes_),
+        max(tree['max_depth'] for tree, _ in merged),
+        forest.n_features_in_,
+        weights=None if np.all(weights == 1.0) else weights,
+        value_scale=1.0 / VALUE_LEVELS
+    )
+
+def _single_row_latency(forest, X, repeats=200):
+    row = np.asarray(X[:1])
+    forest.predict_proba(row)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        forest.predict_proba(row)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+def compaction_report(original, compact, X_val, y_val):
+    """Compare taille, accuracy et latence avant/après compaction"""
+    original_pred = original.predict(X_val)
+    compact_pred = compact.predict(X_val)
+    original_accuracy = float(np.mean(original_pred == y_val))
+    compact_accuracy = float(np.mean(compact_pred == y_val))
+    return {
+        'trees': [original.n_estimators, compact.n_estimators],
+        'nodes': [original.node_count, compact.node_count],
+        'bytes': [original.nbytes, compact.nbytes],
+        'size_ratio': original.nbytes / max(compact.nbytes, 1),
+        'accuracy': [original_accuracy, compact_accuracy],
+        'accuracy_delta': compact_accuracy - original_accuracy,
+        'prediction_agreement': float(np.mean(original_pred == compact_pred)),
+        'max_probability_delta': float(np.abs(original.predict_proba(X_val) - compact.predict_proba(X_val)).max()),
+        'latency_us': [_single_row_latency(original, X_val), _single_row_latency(compact, X_val)]
+    }
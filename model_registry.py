@@ -0,0 +1,253 @@
+import numpy as np
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from model_artifact import ModelBundle
+
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+class FlatForest:
+    """Forêt aléatoire stockée en tableaux plats (tous les arbres concaténés)
+
+    Les feuilles pointent sur elles-mêmes, ce qui permet de descendre tous les
+    arbres en parallèle pendant `max_depth` itérations sans branchement.
+    Les tableaux peuvent être des np.memmap: plusieurs processus partagent
+    alors les mêmes pages. Une forêt compactée (voir model_compaction) a des
+    poids par arbre et des probabilités quantifiées (`value * value_scale`).
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes')
+    OPTIONAL_ARRAYS = ('weights',)
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features,
+                 weights=None, value_scale=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.weights = weights
+        self.value_scale = value_scale
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Aplatit un RandomForestClassifier entraîné"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32))
+
+            # Probabilités normalisées par feuille, comme DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(np.concatenate(features), np.concatenate(thresholds),
+                   np.concatenate(lefts), np.concatenate(rights),
+                   np.concatenate(values), np.asarray(roots, dtype=np.int32),
+                   np.asarray(model.classes_), max_depth, model.n_features_in_)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """Indices des feuilles atteintes, forme (n_lignes, n_arbres)"""
+        # Même comparaison que sklearn: X en float32, seuils en float64
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaf_values = np.asarray(self.value[self.apply(X)], dtype=np.float64)
+        if self.weights is None and self.value_scale is None:
+            return leaf_values.mean(axis=1)
+        if self.weights is None:
+            proba = leaf_values.sum(axis=1)
+        else:
+            proba = np.einsum('ntc,t->nc', leaf_values, np.asarray(self.weights, dtype=np.float64))
+        # Les probabilités quantifiées ne somment plus exactement à 1
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def to_arrays(self):
+        arrays = {name: np.asarray(getattr(self, 'classes_' if name == 'classes' else name))
+                  for name in self.ARRAYS}
+        for name in self.OPTIONAL_ARRAYS:
+            if getattr(self, name) is not None:
+                arrays[name] = np.asarray(getattr(self, name))
+        return arrays
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.to_arrays().values())
+
+class FlatScaler:
+    """Équivalent de StandardScaler.transform sur des tableaux mappables"""
+
+    ARRAYS = ('mean', 'scale')
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(mean)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        return cls(np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64))
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+    def to_arrays(self):
+        return {'mean': np.asarray(self.mean_), 'scale': np.asarray(self.scale_)}
+
+def profile_latency(bundle, repeats=200):
+    """Latence d'une prédiction unitaire (transform + predict_proba), en microsecondes"""
+    row = np.zeros((1, len(bundle.feature_columns)))
+    bundle.model.predict_proba(bundle.scaler.transform(row))
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        bundle.model.predict_proba(bundle.scaler.transform(row))
+        timings.append(time.perf_counter() - start)
+    return {
+        'p50_us': float(np.percentile(timings, 50) * 1e6),
+        'p95_us': float(np.percentile(timings, 95) * 1e6),
+        'p99_us': float(np.percentile(timings, 99) * 1e6)
+    }
+
+class ModelRegistry:
+    """Registre versionné de modèles sur disque
+
+    Chaque version est un répertoire `vNNNN/` contenant les tableaux du modèle
+    en .npy (chargés avec mmap_mode='r') et un meta.json. Le fichier CURRENT
+    désigne la version servie et est remplacé atomiquement.
+    """
+
+    def __init__(self, root='models/registry'):
+        self.root = root
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, f'v{version:04d}')
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name[1:]) for name in os.listdir(self.root)
+                      if name.startswith('v') and name[1:].isdigit())
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            versions = self.versions()
+            return versions[-1] if versions else None
+
+    def set_current(self, version):
+        """Fait pointer CURRENT sur `version` (publication ou rollback)"""
+        if version not in self.versions():
+            raise ValueError(f"Version inconnue: {version}")
+        tmp_path = os.path.join(self.root, CURRENT_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+
+    def publish(self, model, scaler, feature_columns, metadata=None, activate=True):
+        """Écrit une nouvelle version et (par défaut) la rend courante; retourne son numéro"""
+        os.makedirs(self.root, exist_ok=True)
+        forest = model if isinstance(model, FlatForest) else FlatForest.from_sklearn(model)
+        flat_scaler = scaler if isinstance(scaler, FlatScaler) else FlatScaler.from_sklearn(scaler)
+
+        versions = self.versions()
+        version = versions[-1] + 1 if versions else 1
+        tmp_dir = self._version_dir(version) + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        for name, array in forest.to_arrays().items():
+            np.save(os.path.join(tmp_dir, f'forest_{name}.npy'), array)
+        for name, array in flat_scaler.to_arrays().items():
+            np.save(os.path.join(tmp_dir, f'scaler_{name}.npy'), array)
+
+        bundle = ModelBundle(forest, flat_scaler, feature_columns)
+        meta = dict(metadata or {})
+        meta.update({
+            'version': version,
+            'feature_columns': list(feature_columns),
+            'published_at': datetime.now().isoformat(),
+            'n_estimators': forest.n_estimators,
+            'node_count': forest.node_count,
+            'max_depth': forest.max_depth,
+            'n_features': forest.n_features_in_,
+            'value_scale': forest.value_scale,
+            'nbytes': forest.nbytes,
+            'latency_profile': profile_latency(bundle)
+        })
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+
+        os.replace(tmp_dir, self._version_dir(version))
+        if activate:
+            self.set_current(version)
+        return version
+
+    def metadata(self, version=None):
+        version = version or self.current_version()
+        with open(os.path.join(self._version_dir(version), META_FILE)) as f:
+            return json.load(f)
+
+    def load(self, version=None):
+        """Charge une version (la courante par défaut) en mappant ses tableaux en mémoire"""
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"Aucune version dans le registre {self.root}")
+        directory = self._version_dir(version)
+        meta = self.metadata(version)
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+        forest_arrays = {name: load_array(f'forest_{name}') for name in FlatForest.ARRAYS}
+        for name in FlatForest.OPTIONAL_ARRAYS:
+            if os.path.exists(os.path.join(directory, f'forest_{name}.npy')):
+                forest_arrays[name] = load_array(f'forest_{name}')
+        forest = FlatForest(max_depth=meta['max_depth'], n_features=meta['n_features'],
+                            value_scale=meta.get('value_scale'), **forest_arrays)
+        scaler = FlatScaler(load_array('scaler_mean'), load_array('scaler_scale'))
+        return ModelBundle(forest, scaler, meta['feature_columns'], meta)
@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from model_artifact import artifact_stamp_path, load_model_bundle, validate_model_bundle
+
+class ModelWatcher:
+    """Surveille l'artefact modèle et le recharge à chaud dans tous les prédicteurs
+
+    Le chargement et la validation se font dans le thread du watcher, hors du
+    chemin des requêtes. Un artefact invalide est ignoré jusqu'à sa prochaine
+    modification; les prédicteurs gardent alors la version courante.
+    """
+
+    def __init__(self, model_path='models/baccarat_model.pkl', predictors=None, interval=10):
+        self.model_path = model_path
+        self.predictors = list(predictors or [])
+        self.interval = interval
+        self.is_running = False
+        self.last_signature = self._signature()
+        self.reload_count = 0
+        self.last_reload = None
+        self.last_error = None
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, predictor):
+        self.predictors.append(predictor)
+
+    def _signature(self):
+        try:
+            stat = os.stat(artifact_stamp_path(self.model_path))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def check_once(self):
+        """Recharge l'artefact s'il a changé; retourne True si un swap a eu lieu"""
+        signature = self._signature()
+        if signature is None or signature == self.last_signature:
+            return False
+        self.last_signature = signature
+
+        try:
+            start = time.perf_counter()
+            bundle = load_model_bundle(self.model_path)
+            validate_model_bundle(bundle)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.logger.error(f"Nouvel artefact modèle rejeté ({self.model_path}): {self.last_error}")
+            return False
+
+        for predictor in self.predictors:
+            predictor.swap_model(bundle)
+
+        self.reload_count += 1
+        self.last_error = None
+        self.last_reload = datetime.now().isoformat()
+        self.logger.info(f"Modèle rechargé à chaud (version {bundle.version}) en "
+                         f"{time.perf_counter() - start:.2f}s pour {len(self.predictors)} prédicteurs")
+        return True
+
+    def _run(self):
+        while self.is_running:
+            try:
+                self.check_once()
+            except Exception as e:
+                self.logger.error(f"Erreur surveillance modèle: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Démarre la surveillance dans un thread daemon"""
+        self.is_running = True
+        thread = threading.Thread(target=self._run, name='model-watcher')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.is_running = False
+
+    def get_status(self):
+        versions = [predictor.model_bundle.version for predictor in self.predictors]
+        return {
+            'model_path': self.model_path,
+            'is_running': self.is_running,
+            'reload_count': self.reload_count,
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+            'versions': versions
+        }
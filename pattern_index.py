@@ -0,0 +1,183 @@
+import os
+import tempfile
+import threading
+from array import array
+import numpy as np
+from round_ring import SYMBOLS, SYMBOL_CODES
+
+PATTERN_INDEX_VERSION = 2
+
+# Saisie des motifs dans une URL: P/B/T (Player, Banker, Tie) équivalent à ♠ ♦ ♣
+SYMBOL_ALIASES = {'P': '♠', 'B': '♦', 'T': '♣'}
+
+def parse_pattern(text):
+    """Motif en codes de symboles ('♠♠♦♣' ou 'PPBT'); ValueError si un caractère est inconnu"""
+    codes = []
+    for char in text.strip():
+        symbol = SYMBOL_ALIASES.get(char.upper(), char)
+        if symbol not in SYMBOL_CODES:
+            raise ValueError(f"Symbole inconnu dans le motif: {char!r} (♠ ♦ ♣ ou P B T)")
+        codes.append(SYMBOL_CODES[symbol])
+    return codes
+
+class SuffixAutomaton:
+    """Automate des suffixes du flux de symboles, construit en ligne (un ajout par round)
+
+    Chaque état a 3 transitions, un lien suffixe, la longueur de sa plus
+    longue chaîne et son compte propre (1 pour l'état créé par un ajout, 0
+    pour un clone), tenus dans des tableaux compacts (array). Un ajout est en
+    O(1) amorti, y compris sur un flux périodique. Les occurrences (|endpos|)
+    s'obtiennent en sommant les comptes le long des liens suffixes: elles sont
+    recalculées en une passe à la première requête qui suit des ajouts, puis
+    une requête lit le motif en O(longueur du motif).
+    """
+
+    def __init__(self):
+        self.alphabet = len(SYMBOLS)
+        self._next = array('i', [-1] * self.alphabet)
+        self._link = array('i', [-1])
+        self._length = array('i', [0])
+        self._count = array('q', [0])
+        self._occurrences = None
+        self._last = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def states(self):
+        return len(self._link)
+
+    def _new_state(self, length, link, transitions_from=None):
+        state = len(self._link)
+        if transitions_from is None:
+            self._next.extend([-1] * self.alphabet)
+        else:
+            base = transitions_from * self.alphabet
+            self._next.extend(self._next[base:base + self.alphabet])
+        self._link.append(link)
+        self._length.append(length)
+        self._count.append(0)
+        return state
+
+    def _extend(self, code):
+        nxt, link, length, alphabet = self._next, self._link, self._length, self.alphabet
+        current = self._new_state(length[self._last] + 1, -1)
+        self._count[current] = 1
+        state = self._last
+        while state != -1 and nxt[state * alphabet + code] == -1:
+            nxt[state * alphabet + code] = current
+            state = link[state]
+        if state == -1:
+            link[current] = 0
+        else:
+            target = nxt[state * alphabet + code]
+            if length[state] + 1 == length[target]:
+                link[current] = target
+            else:
+                clone = self._new_state(length[state] + 1, link[target], transitions_from=target)
+                while state != -1 and nxt[state * alphabet + code] == target:
+                    nxt[state * alphabet + code] = clone
+                    state = link[state]
+                link[target] = clone
+                link[current] = clone
+        self._last = current
+        self._size += 1
+        self._occurrences = None
+
+    def _occurrence_counts(self):
+        """|endpos| de chaque état (sous le verrou), recalculé après des ajouts"""
+        if self._occurrences is None:
+            occurrences = self._count.tolist()
+            link = self._link
+            # Un lien suffixe mène à un état plus court: longueurs décroissantes
+            order = np.argsort(np.array(self._length, dtype=np.int32), kind='stable')[::-1]
+            for state in order.tolist():
+                if link[state] != -1:
+                    occurrences[link[state]] += occurrences[state]
+            self._occurrences = occurrences
+        return self._occurrences
+
+    def append(self, symbol):
+        """Ajoute un symbole (♠ ♦ ♣ ou code 0..2)"""
+        code = symbol if isinstance(symbol, (int, np.integer)) else SYMBOL_CODES.get(symbol, 2)
+        with self._lock:
+            self._extend(int(code))
+
+    def extend(self, symbols):
+        with self._lock:
+            for symbol in symbols:
+                self._extend(int(symbol) if isinstance(symbol, (int, np.integer)) else SYMBOL_CODES.get(symbol, 2))
+
+    def _state_of(self, codes):
+        state = 0
+        for code in codes:
+            state = self._next[state * self.alphabet + code]
+            if state == -1:
+                return -1
+        return state
+
+    def query(self, codes):
+        """Occurrences du motif et distribution du symbole suivant (O(longueur du motif))"""
+        with self._lock:
+            state = self._state_of(codes)
+            if state == -1:
+                occurrences, following = 0, [0] * self.alphabet
+            else:
+                counts = self._occurrence_counts()
+                occurrences = counts[state]
+                following = []
+                for code in range(self.alphabet):
+                    target = self._next[state * self.alphabet + code]
+                    following.append(counts[target] if target != -1 else 0)
+            indexed = self._size
+        total = sum(following)
+        return {
+            'pattern': ''.join(SYMBOLS[code] for code in codes),
+            'occurrences': occurrences,
+            'next': {symbol: count for symbol, count in zip(SYMBOLS, following)},
+            'next_probabilities': {symbol: (count / total if total else None)
+                                   for symbol, count in zip(SYMBOLS, following)},
+            'indexed_symbols': indexed
+        }
+
+    def save(self, path):
+        """Point de contrôle atomique (.npz des tableaux)"""
+        with self._lock:
+            arrays = {name: np.frombuffer(getattr(self, f'_{name}'), dtype=dtype).copy()
+                      for name, dtype in (('next', np.int32), ('link', np.int32),
+                                          ('length', np.int32), ('count', np.int64))}
+            state = np.array([PATTERN_INDEX_VERSION, self._last, self._size], dtype=np.int64)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Fichier temporaire propre à cet appel: plusieurs workers gunicorn peuvent sauvegarder ensemble
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, state=state, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        automaton = cls()
+        with np.load(path) as checkpoint:
+            version, last, size = (int(value) for value in checkpoint['state'])
+            if version not in (1, PATTERN_INDEX_VERSION):
+                raise ValueError(f"Version d'index de motifs inconnue: {version}")
+            counts = checkpoint['count'].astype(np.int64)
+            links = checkpoint['link'].astype(np.int32)
+            if version == 1:
+                # Version 1: occurrences complètes; compte propre = occurrences - celles des états liés
+                np.subtract.at(counts, links[1:], checkpoint['count'][1:].astype(np.int64))
+            automaton._next = array('i', checkpoint['next'].astype(np.int32).tobytes())
+            automaton._link = array('i', links.tobytes())
+            automaton._length = array('i', checkpoint['length'].astype(np.int32).tobytes())
+            automaton._count = array('q', counts.tobytes())
+        automaton._last, automaton._size = last, size
+        return automaton
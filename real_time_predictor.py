@@ -6,24 +6,63 @@ from datetime import datetime
 import threading
 import logging
 from baccarat_api_client import BaccaratAPIClient
-import joblib
+from model_artifact import ModelHolder, load_model_bundle
+from round_tracing import ROUND_LATENCY, mark
+from storage import open_storage
+from compact_history import compact_frame
+from round_ring import SYMBOLS, RoundRing
+from table_state import ShardAssignment, TableStates, table_of_event
+from round_queue import CoalescingRoundQueue
+from metrics import CSV_RELOAD_SECONDS, FEATURE_EXTRACTION_SECONDS, INFERENCE_SECONDS
 
-class RealTimeBaccaratPredictor:
-    def __init__(self, csv_path='data/twentyone_rounds.csv', model_path='models/baccarat_model.pkl'):
+# Rounds récents chargés au démarrage (seuls les 50 derniers sont exploités)
+HISTORY_ROWS = 50
+
+class EventTableState:
+    """État temps réel d'une table: événements, prédictions et résultats des rounds terminés"""
+
+    __slots__ = ('table', 'events', 'predictions', 'outcomes', 'settled')
+
+    def __init__(self, table, capacity=HISTORY_ROWS):
+        self.table = table
+        self.events = {}
+        self.predictions = {}
+        # Vainqueur de chaque round terminé (♠ Player, ♦ Banker, ♣ Tie), compté une seule fois
+        self.outcomes = RoundRing(capacity=capacity, window=5)
+        self.settled = set()
+
+    def settle(self, event):
+        """Enregistre le résultat d'un événement arrivé en phase Result"""
+        event_id = event.get('eventId')
+        if event.get('gamePhase') != 'Result' or event_id in self.settled:
+            return
+        player, banker = event.get('playerScore', 0) or 0, event.get('bankerScore', 0) or 0
+        symbol = SYMBOLS[0] if player > banker else SYMBOLS[1] if banker > player else SYMBOLS[2]
+        self.outcomes.append(event_id, symbol, int(player != banker))
+        self.settled.add(event_id)
+        if len(self.settled) > 4 * self.outcomes.capacity:
+            # Les ids plus anciens que l'historique ne reviennent plus du polling
+            self.settled = {record['round_id'] for record in self.outcomes.records}
+
+class RealTimeBaccaratPredictor(ModelHolder):
+    def __init__(self, csv_path='data/twentyone_rounds.csv', model_path='models/baccarat_model.pkl', storage=None):
         self.csv_path = csv_path
+        self.storage = storage or open_storage(csv_path=csv_path)
         self.model_path = model_path
         self.api_client = BaccaratAPIClient()
         
         # Charger les données historiques et le modèle
         self.historical_data = None
-        self.model = None
-        self.scaler = None
-        self.feature_columns = []
         
-        # Variables pour le streaming
-        self.current_events = {}
-        self.predictions = {}
+        # Variables pour le streaming: un état par table (TABLE_SHARDS/TABLE_SHARD_INDEX: tables de ce processus)
+        self.tables = TableStates(EventTableState, ShardAssignment.from_env())
+        self._event_tables = {}
         self.is_running = False
+        # File entre le poller et les workers de prédiction
+        self.event_queue = CoalescingRoundQueue.from_env('realtime', self.process_api_event)
+        
+        # Écriture des rounds terminés dans le CSV (RoundIngestWriter), optionnelle
+        self.ingest_writer = None
         
         # Configuration logging
         logging.basicConfig(level=logging.INFO)
@@ -33,35 +72,34 @@ class RealTimeBaccaratPredictor:
         self.load_trained_model()
     
     def load_historical_data(self):
-        """Charge les données historiques du CSV"""
+        """Charge les derniers rounds historiques (lecture de la fin du stockage seulement)"""
         try:
-            self.historical_data = pd.read_csv(self.csv_path, header=None, 
-                                            names=['id', 'event_id', 'collected_at', 'option_type', 'odd', 'round_state', 'raw_payload'])
+            with CSV_RELOAD_SECONDS.time(loader='realtime'):
+                self.historical_data = compact_frame(self.storage.latest(HISTORY_ROWS))
             self.logger.info(f"Chargé {len(self.historical_data)} enregistrements historiques")
         except Exception as e:
             self.logger.error(f"Erreur chargement données historiques: {e}")
             self.historical_data = pd.DataFrame()
+        # L'historique chargé ne change plus: ses features séquentielles sont calculées une fois
+        self.historical_sequence = self.sequence_from_history()
     
     def load_trained_model(self):
         """Charge le modèle IA entraîné"""
         try:
-            model_data = joblib.load(self.model_path)
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
-            self.feature_columns = model_data['feature_columns']
+            self.swap_model(load_model_bundle(self.model_path))
             self.logger.info("Modèle IA chargé avec succès")
         except Exception as e:
             self.logger.error(f"Erreur chargement modèle: {e}")
     
-    def extract_features_from_api_event(self, event):
-        """Extrait les features depuis un événement de l'API pour la prédiction"""
+    def extract_features_from_api_event(self, event, layout, row, state=None):
+        """Écrit les features d'un événement de l'API dans `row` aux positions de `layout`"""
         try:
-            features = {
-                'player_score': event.get('playerScore', 0),
-                'banker_score': event.get('bankerScore', 0),
-                'round_number': event.get('roundNumber', 0),
-                'is_live': 1 if event.get('isLive', False) else 0,
-            }
+            if state is None:
+                state = self.tables.find(table_of_event(event))
+            row[layout.player_score] = event.get('playerScore', 0)
+            row[layout.banker_score] = event.get('bankerScore', 0)
+            row[layout.round_number] = event.get('roundNumber', 0)
+            row[layout.is_live] = 1 if event.get('isLive', False) else 0
             
             # Features temporelles
             try:
@@ -74,66 +112,66 @@ class RealTimeBaccaratPredictor:
                     timestamp = datetime.now()
             except (ValueError, TypeError, OSError):
                 timestamp = datetime.now()
-            features.update({
-                'hour': timestamp.hour,
-                'day_of_week': timestamp.weekday(),
-                'minute': timestamp.minute
-            })
+            row[layout.hour] = timestamp.hour
+            row[layout.day_of_week] = timestamp.weekday()
+            row[layout.minute] = timestamp.minute
             
-            # Extraire les cotes depuis bettingOptions
+            # Extraire les cotes depuis bettingOptions (la dernière option de chaque type l'emporte)
+            row[layout.player_win_odd] = row[layout.banker_win_odd] = row[layout.tie_odd] = 1.0
             betting_options = event.get('bettingOptions', [])
             if isinstance(betting_options, list):
-                odds_map = {}
                 for option in betting_options:
                     if isinstance(option, dict):
-                        odds_map[option.get('optionType', '')] = option.get('odd', 1.0)
-                
-                features.update({
-                    'player_win_odd': odds_map.get('Player Win', 1.0),
-                    'banker_win_odd': odds_map.get('Banker Win', 1.0),
-                    'tie_odd': odds_map.get('Tie', 1.0)
-                })
-            else:
-                features.update({
-                    'player_win_odd': 1.0,
-                    'banker_win_odd': 1.0,
-                    'tie_odd': 1.0
-                })
+                        option_type = option.get('optionType', '')
+                        if option_type == 'Player Win':
+                            row[layout.player_win_odd] = option.get('odd', 1.0)
+                        elif option_type == 'Banker Win':
+                            row[layout.banker_win_odd] = option.get('odd', 1.0)
+                        elif option_type == 'Tie':
+                            row[layout.tie_odd] = option.get('odd', 1.0)
             
             # Calculer la cote actuelle basée sur le type de pari
             current_odd = 1.0
             if betting_options:
                 # Prendre la cote la plus basse comme référence
-                current_odd = min([opt.get('odd', 1.0) for opt in betting_options])
-            features['odd_value'] = current_odd
+                current_odd = min(opt.get('odd', 1.0) for opt in betting_options)
+            row[layout.odd_value] = current_odd
             
-            # Features séquentielles basées sur les données historiques
-            if not self.historical_data.empty:
-                recent_data = self.historical_data.tail(50)
-                features.update({
-                    'Player_Win_ma_5': (recent_data['option_type'] == 'Player Win').tail(5).mean(),
-                    'Banker_Win_ma_5': (recent_data['option_type'] == 'Banker Win').tail(5).mean(),
-                    'Tie_ma_5': (recent_data['option_type'] == 'Tie').tail(5).mean(),
-                    'consecutive_Player_Win': self.get_consecutive_count(recent_data, 'Player Win'),
-                    'consecutive_Banker_Win': self.get_consecutive_count(recent_data, 'Banker Win'),
-                    'consecutive_Tie': self.get_consecutive_count(recent_data, 'Tie')
-                })
+            # Features séquentielles: résultats de la table, sinon derniers rounds stockés (calculés au chargement)
+            if state is not None and len(state.outcomes):
+                outcomes = state.outcomes
+                recent = min(5, len(outcomes))
+                counts = outcomes.symbol_counts(5)
+                consecutive = outcomes.consecutive_counts()
+                row[layout.Player_Win_ma_5] = counts[0] / recent
+                row[layout.Banker_Win_ma_5] = counts[1] / recent
+                row[layout.Tie_ma_5] = counts[2] / recent
+                row[layout.consecutive_Player_Win] = consecutive[0]
+                row[layout.consecutive_Banker_Win] = consecutive[1]
+                row[layout.consecutive_Tie] = consecutive[2]
             else:
-                # Valeurs par défaut si pas de données historiques
-                features.update({
-                    'Player_Win_ma_5': 0.33,
-                    'Banker_Win_ma_5': 0.33,
-                    'Tie_ma_5': 0.34,
-                    'consecutive_Player_Win': 0,
-                    'consecutive_Banker_Win': 0,
-                    'consecutive_Tie': 0
-                })
-            
-            return features
+                (row[layout.Player_Win_ma_5], row[layout.Banker_Win_ma_5], row[layout.Tie_ma_5],
+                 row[layout.consecutive_Player_Win], row[layout.consecutive_Banker_Win],
+                 row[layout.consecutive_Tie]) = self.historical_sequence
             
         except Exception as e:
             self.logger.error(f"Erreur extraction features: {e}")
-            return {col: 0 for col in self.feature_columns}
+            row.fill(0.0)
+        return row
+    
+    def sequence_from_history(self):
+        """Features séquentielles des derniers rounds stockés (valeurs par défaut sans historique)"""
+        if self.historical_data is None or self.historical_data.empty:
+            return (0.33, 0.33, 0.34, 0, 0, 0)
+        recent_data = self.historical_data.tail(50)
+        return (
+            (recent_data['option_type'] == 'Player Win').tail(5).mean(),
+            (recent_data['option_type'] == 'Banker Win').tail(5).mean(),
+            (recent_data['option_type'] == 'Tie').tail(5).mean(),
+            self.get_consecutive_count(recent_data, 'Player Win'),
+            self.get_consecutive_count(recent_data, 'Banker Win'),
+            self.get_consecutive_count(recent_data, 'Tie')
+        )
     
     def get_consecutive_count(self, data, result_type):
         """Compte les occurrences consécutives d'un type de résultat"""
@@ -145,30 +183,32 @@ class RealTimeBaccaratPredictor:
                 count = 0
         return count
     
-    def predict_event(self, event):
+    def predict_event(self, event, trace=None, state=None):
         """Fait une prédiction pour un événement spécifique"""
-        if self.model is None:
+        # Une seule lecture: la prédiction se termine sur ce modèle même en cas de rechargement
+        bundle = self.model_bundle
+        if bundle.model is None:
             return {'error': 'Modèle non disponible'}
         
         try:
             # Extraire les features
-            features = self.extract_features_from_api_event(event)
-            
-            # Préparer le vecteur de features dans le bon ordre
-            feature_vector = []
-            for col in self.feature_columns:
-                feature_vector.append(features.get(col, 0))
+            with FEATURE_EXTRACTION_SECONDS.time(predictor='realtime'):
+                # Vecteur écrit en place dans la ligne réutilisée du thread, dans l'ordre du modèle
+                layout = bundle.layout
+                row = self.extract_features_from_api_event(event, layout, layout.row(), state)
+            mark(trace, 'features_done')
             
             # Normalisation et prédiction
-            feature_vector_scaled = self.scaler.transform([feature_vector])
-            prediction = self.model.predict(feature_vector_scaled)[0]
-            probabilities = self.model.predict_proba(feature_vector_scaled)[0]
+            with INFERENCE_SECONDS.time(predictor='realtime'):
+                prediction, probabilities = self.infer(bundle, layout.vector(row))
+            mark(trace, 'predicted')
             
             result_map = {0: 'Player Win', 1: 'Banker Win', 2: 'Tie', 3: 'Player Pair', 4: 'Banker Pair'}
             
             result = {
                 'eventId': event.get('eventId'),
                 'eventName': event.get('eventName'),
+                'table': table_of_event(event),
                 'prediction': result_map[prediction],
                 'probabilities': {
                     result_map[i]: prob for i, prob in enumerate(probabilities)
@@ -180,8 +220,10 @@ class RealTimeBaccaratPredictor:
                     'banker': event.get('bankerScore', 0)
                 },
                 'timestamp': datetime.now().isoformat(),
-                'features_used': self.feature_columns
+                'features_used': bundle.feature_columns
             }
+            if trace is not None:
+                result['trace'] = trace
             
             return result
             
@@ -190,15 +232,33 @@ class RealTimeBaccaratPredictor:
             return {'error': f'Erreur prédiction: {str(e)}'}
     
     def process_api_event(self, event):
-        """Traite un événement reçu de l'API"""
+        """Traite un événement reçu de l'API (ignoré si sa table appartient à un autre shard)"""
         event_id = event.get('eventId')
+        table = table_of_event(event)
+        if not self.tables.assignment.owns(table):
+            return None
+        state = self.tables.get(table)
+        
+        # La trace de latence suit la prédiction, pas l'événement servi tel quel
+        trace = event.pop('trace', None)
         
         # Stocker l'événement courant
-        self.current_events[event_id] = event
+        state.events[event_id] = event
+        self._event_tables[event_id] = table
+        
+        if self.ingest_writer is not None:
+            try:
+                self.ingest_writer.save_event(event)
+            except Exception as e:
+                self.logger.error(f"Erreur ingestion event {event_id}: {e}")
         
         # Générer une prédiction
-        prediction = self.predict_event(event)
-        self.predictions[event_id] = prediction
+        prediction = self.predict_event(event, trace, state)
+        state.predictions[event_id] = prediction
+        # Le résultat ne compte dans les features de la table qu'après sa prédiction
+        state.settle(event)
+        if 'error' not in prediction:
+            ROUND_LATENCY.record_prediction('realtime', event_id, trace)
         
         # Logger
         self.logger.info(f"Event {event_id}: {prediction.get('prediction', 'N/A')} (confiance: {prediction.get('confidence', 0):.1f}%)")
@@ -210,13 +270,16 @@ class RealTimeBaccaratPredictor:
         self.is_running = True
         self.logger.info(f"Démarrage prédiction temps réel (interval: {interval}s)")
         
+        # Le poller ne fait que déposer: sa cadence ne dépend plus du temps de prédiction
+        self.event_queue.start()
+        
         def api_callback(event):
             if self.is_running:
-                self.process_api_event(event)
+                self.event_queue.put(event.get('eventId'), event, table_of_event(event))
         
         # Démarrer le monitoring API dans un thread séparé
         api_thread = threading.Thread(target=self.api_client.start_real_time_monitoring, 
-                                    args=(api_callback, interval))
+                                    args=(api_callback, interval), name='realtime-poller')
         api_thread.daemon = True
         api_thread.start()
         
@@ -225,19 +288,43 @@ class RealTimeBaccaratPredictor:
     def stop_real_time_prediction(self):
         """Arrête la prédiction en temps réel"""
         self.is_running = False
+        self.event_queue.stop()
         self.logger.info("Arrêt prédiction temps réel")
     
-    def get_current_predictions(self):
-        """Retourne toutes les prédictions actuelles"""
-        return self.predictions
+    def get_current_predictions(self, table=None):
+        """Retourne les prédictions actuelles (toutes les tables, ou une seule)"""
+        return {event_id: prediction for _, state in self._states(table)
+                for event_id, prediction in list(state.predictions.items())}
     
-    def get_current_events(self):
-        """Retourne tous les événements actuels"""
-        return self.current_events
+    def get_current_events(self, table=None):
+        """Retourne les événements actuels (toutes les tables, ou une seule)"""
+        return {event_id: event for _, state in self._states(table)
+                for event_id, event in list(state.events.items())}
     
     def get_prediction_for_event(self, event_id):
         """Retourne la prédiction pour un événement spécifique"""
-        return self.predictions.get(event_id)
+        state = self.tables.find(self._event_tables.get(event_id))
+        return state.predictions.get(event_id) if state is not None else None
+    
+    def _states(self, table=None):
+        if table is None:
+            return self.tables.items()
+        state = self.tables.find(table)
+        return [(table, state)] if state is not None else []
+    
+    def get_tables_summary(self):
+        """Tables suivies par ce processus: événements, prédictions et résultats enregistrés"""
+        return {
+            **self.tables.assignment.describe(),
+            'tables': {
+                table: {
+                    'events_count': len(state.events),
+                    'predictions_count': len(state.predictions),
+                    'settled_rounds': len(state.outcomes)
+                }
+                for table, state in self.tables.items()
+            }
+        }
 
 # Point d'entrée pour le test
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+import cProfile
+import glob
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})".replace(';', ',')
+
+def collapsed_stacks(stats, min_seconds=1e-5, max_depth=64):
+    """Convertit un pstats en piles repliées (format flamegraph.pl / speedscope)
+
+    cProfile ne garde que les arcs appelant → appelé: le temps d'une fonction
+    est réparti entre ses appelants au prorata du temps cumulé de chaque arc.
+    Les valeurs sont en microsecondes.
+    """
+    raw = stats.stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    totals = defaultdict(int)
+
+    def walk(func, path, on_stack, share):
+        _, _, self_time, cumulative, _ = raw[func]
+        path = path + [_label(func)]
+        micros = int(self_time * share * 1e6)
+        if micros:
+            totals[';'.join(path)] += micros
+        if len(path) >= max_depth:
+            return
+        for callee, edge in callees.get(func, {}).items():
+            callee_cumulative = raw[callee][3]
+            if callee in on_stack or callee_cumulative <= 0:
+                continue
+            callee_share = share * edge[3] / callee_cumulative
+            if callee_cumulative * callee_share >= min_seconds:
+                walk(callee, path, on_stack | {callee}, callee_share)
+
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(func, [], {func}, 1.0)
+    return '\n'.join(f'{stack} {value}' for stack, value in sorted(totals.items())) + '\n'
+
+class RequestProfiler:
+    """Profilage cProfile à la demande de requêtes Flask
+
+    Une requête est profilée si elle porte l'en-tête X-Profile-Token avec le
+    jeton attendu, ou tirée au sort selon `sample_percent`. Désactivé, le coût
+    se limite à un test de booléen par requête. Un seul profil à la fois
+    (cProfile ne supporte pas plusieurs profileurs actifs).
+    """
+
+    def __init__(self, output_dir=None, sample_percent=0.0, token=None, max_profiles=50):
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), 'baccarat_profiles')
+        self.sample_percent = float(sample_percent)
+        self.token = token or None
+        self.max_profiles = max_profiles
+        self.enabled = self.sample_percent > 0 or self.token is not None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(output_dir=os.environ.get('PROFILE_DIR'),
+                   sample_percent=os.environ.get('PROFILE_SAMPLE_PERCENT', 0),
+                   token=os.environ.get('PROFILE_TOKEN'),
+                   max_profiles=int(os.environ.get('PROFILE_MAX_FILES', 50)))
+
+    def is_authorized(self, headers):
+        # Comparaison en temps constant: la durée ne révèle pas le préfixe correct du jeton
+        supplied = headers.get(PROFILE_HEADER)
+        return (self.token is not None and supplied is not None
+                and hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8')))
+
+    def should_profile(self, headers):
+        if not self.enabled:
+            return False
+        if self.is_authorized(headers):
+            return True
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+    def start(self):
+        """Retourne un profileur actif, ou None si un autre profil est en cours"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except Exception:
+            self._lock.release()
+            return None
+        return (profile, time.perf_counter())
+
+    def stop(self, handle):
+        profile, start = handle
+        try:
+            profile.disable()
+        finally:
+            self._lock.release()
+        return profile, time.perf_counter() - start
+
+    def save(self, profile, duration, endpoint, method, status):
+        """Écrit <id>.pstats et <id>.json; retourne l'identifiant du profil"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') or 'root'
+        profile_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{slug}_{uuid.uuid4().hex[:8]}"
+        profile.dump_stats(os.path.join(self.output_dir, f'{profile_id}.pstats'))
+        with open(os.path.join(self.output_dir, f'{profile_id}.json'), 'w') as f:
+            json.dump({
+                'id': profile_id,
+                'endpoint': endpoint,
+                'method': method,
+                'status': status,
+                'duration_ms': round(duration * 1000, 3),
+                'created_at': datetime.now().isoformat()
+            }, f)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        profiles = self.list_profiles()
+        for meta in profiles[self.max_profiles:]:
+            for extension in ('pstats', 'json'):
+                try:
+                    os.remove(os.path.join(self.output_dir, f"{meta['id']}.{extension}"))
+                except OSError:
+                    pass
+
+    def list_profiles(self):
+        """Métadonnées des profils, du plus récent au plus ancien"""
+        profiles = []
+        for path in glob.glob(os.path.join(self.output_dir, '*.json')):
+            try:
+                with open(path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda meta: meta.get('created_at', ''), reverse=True)
+
+    def profile_path(self, profile_id):
+        if not re.fullmatch(r'[A-Za-z0-9_]+', profile_id):
+            return None
+        path = os.path.join(self.output_dir, f'{profile_id}.pstats')
+        return path if os.path.exists(path) else None
+
+    def render(self, profile_id, output_format='text', limit=40):
+        """Profil en texte (pstats trié par temps cumulé) ou en piles repliées"""
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+        if output_format == 'collapsed':
+            return collapsed_stacks(pstats.Stats(path))
+        buffer = io.StringIO()
+        stats = pstats.Stats(path, stream=buffer)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return buffer.getvalue()
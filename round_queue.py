@@ -0,0 +1,143 @@
+import os
+import threading
+import logging
+import hashlib
+from collections import OrderedDict
+from metrics import ROUND_QUEUE_DEPTH, ROUND_QUEUE_ITEMS
+
+class CoalescingRoundQueue:
+    """File bornée entre le polling et la prédiction, une seule entrée en attente par round
+
+    Le poller dépose chaque round/événement (put) sans attendre son
+    traitement; `workers` threads appellent `handler` sur les entrées. Une
+    nouvelle version d'un round encore en attente remplace l'ancienne à sa
+    place dans la file (seul l'état le plus récent est traité). File pleine:
+    l'entrée en attente la plus ancienne est abandonnée. Chaque table est
+    servie par un seul worker (partition par hachage blake2b de la table), ses rounds
+    sont donc traités dans l'ordre et jamais en parallèle.
+    """
+
+    # Hachage de partition indépendant de shard_of: avec le même crc32, toutes les
+    # tables d'un processus shardé (même crc32 % TABLE_SHARDS) iraient au même worker.
+    # Un préfixe ne suffit pas (crc32 est linéaire: bits de poids faible décalés d'une constante)
+    PARTITION_SALT = b'queue:'
+
+    def __init__(self, name, handler, workers=2, capacity=1000):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.capacity = max(self.workers, capacity)
+        self.is_running = False
+        self._partitions = [OrderedDict() for _ in range(self.workers)]
+        self._condition = threading.Condition()
+        self._threads = []
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+        ROUND_QUEUE_DEPTH.set_function(self.depth, queue=name)
+
+    @classmethod
+    def from_env(cls, name, handler):
+        return cls(name, handler, workers=int(os.environ.get('ROUND_QUEUE_WORKERS', 2)),
+                   capacity=int(os.environ.get('ROUND_QUEUE_CAPACITY', 1000)))
+
+    def depth(self):
+        return sum(len(pending) for pending in self._partitions)
+
+    def partition_of(self, table):
+        digest = hashlib.blake2b(str(table).encode('utf-8'), digest_size=4, key=self.PARTITION_SALT).digest()
+        return int.from_bytes(digest, 'little') % self.workers
+
+    def put(self, key, item, table=None):
+        """Dépose l'état courant du round `key` (table: partition de traitement)"""
+        pending = self._partitions[self.partition_of(table if table is not None else key)]
+        with self._condition:
+            if key in pending:
+                pending[key] = item
+                self.coalesced += 1
+                ROUND_QUEUE_ITEMS.inc(queue=self.name, outcome='coalesced')
+                return
+            if len(pending) >= self.capacity // self.workers:
+                pending.popitem(last=False)
+                self.dropped += 1
+                ROUND_QUEUE_ITEMS.inc(queue=self.name, outcome='dropped')
+            pending[key] = item
+            self.enqueued += 1
+            ROUND_QUEUE_ITEMS.inc(queue=self.name, outcome='enqueued')
+            self._condition.notify_all()
+
+    def _next(self, pending):
+        with self._condition:
+            while self.is_running and not pending:
+                self._condition.wait(timeout=1.0)
+            if not pending:
+                return None
+            return pending.popitem(last=False)[1]
+
+    def _run(self, partition):
+        pending = self._partitions[partition]
+        while self.is_running:
+            item = self._next(pending)
+            if item is None:
+                continue
+            try:
+                self.handler(item)
+            except Exception as e:
+                with self._condition:
+                    self.failed += 1
+                ROUND_QUEUE_ITEMS.inc(queue=self.name, outcome='failed')
+                self.logger.error(f"Erreur traitement file {self.name}: {e}")
+                continue
+            with self._condition:
+                self.processed += 1
+            ROUND_QUEUE_ITEMS.inc(queue=self.name, outcome='processed')
+
+    def start(self):
+        """Démarre les workers (threads daemon `{name}-worker-{i}`)"""
+        if self.is_running:
+            return self._threads
+        if self._threads:
+            # Workers d'un arrêt précédent encore dans le handler: pas deux workers par partition
+            self.stop()
+            if self._threads:
+                raise RuntimeError(f"File {self.name}: workers précédents toujours actifs")
+        self.is_running = True
+        self._threads = []
+        for partition in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(partition,), name=f'{self.name}-worker-{partition}')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self._threads
+
+    def stop(self, timeout=5.0):
+        """Arrête les workers (attend la fin du round en cours); les entrées en attente sont abandonnées"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        if self._threads:
+            self.logger.warning(f"File {self.name}: {len(self._threads)} worker(s) encore actif(s) après l'arrêt")
+
+    def get_status(self):
+        # Compteurs lus ensemble sous le verrou qui protège leurs mises à jour
+        with self._condition:
+            return {
+                'is_running': self.is_running,
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'depth': self.depth(),
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'failed': self.failed
+            }
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Symboles du tracking Snake_win, dans l'ordre des codes 0, 1, 2
+SYMBOLS = ('♠', '♦', '♣')
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(SYMBOLS)}
+
+class RoundRecord:
+    """Vue d'un round de l'historique (format JSON de `history` via to_dict)"""
+
+    __slots__ = ('round_id', 'symbol', 'bet', 'result_code')
+
+    def __init__(self, round_id, symbol, bet, result_code):
+        self.round_id = round_id
+        self.symbol = symbol
+        self.bet = bet
+        self.result_code = result_code
+
+    def to_dict(self):
+        return {
+            "round_id": self.round_id,
+            "symbol": self.symbol,
+            "bet": self.bet,
+            "result_code": self.result_code
+        }
+
+class _RingView:
+    """Séquence en lecture seule sur le ring (len, itération, list())"""
+
+    __slots__ = ('_ring', '_render')
+
+    def __init__(self, ring, render):
+        self._ring = ring
+        self._render = render
+
+    def __len__(self):
+        return len(self._ring)
+
+    def __iter__(self):
+        return (self._render(position) for position in self._ring._positions())
+
+    def __bool__(self):
+        return len(self._ring) > 0
+
+class RoundRing:
+    """Historique circulaire de capacité fixe: symboles codés et codes résultat en tableaux int8
+
+    Un ajout écrit à la position courante sans allocation et met à jour en
+    O(1) les occurrences de chaque symbole dans la fenêtre des `window`
+    derniers rounds et la série en cours. Les autres fenêtres sont calculées
+    sur les tableaux (bincount). Les ids de round et les paris restent dans
+    des tableaux d'objets de même capacité (références, pas de copie).
+    """
+
+    def __init__(self, capacity=100, window=20):
+        self.capacity = capacity
+        self.window_size = min(window, capacity)
+        self._window_counts = [0] * len(SYMBOLS)
+        self._streak_symbol = 0
+        self._streak_length = 0
+        self._symbols = np.zeros(capacity, dtype=np.int8)
+        self._results = np.zeros(capacity, dtype=np.int8)
+        self._round_ids = np.empty(capacity, dtype=object)
+        self._bets = np.empty(capacity, dtype=object)
+        self._next = 0
+        self._size = 0
+        # Vues compatibles avec les anciens deques symbol_history / round_history
+        self.symbols = _RingView(self, lambda position: SYMBOLS[self._symbols[position]])
+        self.records = _RingView(self, lambda position: self.record_at(position).to_dict())
+
+    def __len__(self):
+        return self._size
+
+    def append(self, round_id, symbol, result_code, bet='PLAYER+2'):
+        """Ajoute un round (symbole inconnu → ♣, comme les résultats "autres")"""
+        position = self._next
+        code = SYMBOL_CODES.get(symbol, 2)
+        if self._size >= self.window_size:
+            # Le symbole qui sort de la fenêtre (lu avant d'être écrasé si window == capacity)
+            self._window_counts[self._symbols[(position - self.window_size) % self.capacity]] -= 1
+        self._window_counts[code] += 1
+        if self._streak_length and code == self._streak_symbol:
+            self._streak_length = min(self._streak_length + 1, self.capacity)
+        else:
+            self._streak_symbol, self._streak_length = code, 1
+        self._symbols[position] = code
+        self._results[position] = result_code
+        self._round_ids[position] = round_id
+        self._bets[position] = bet
+        self._next = (position + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _positions(self):
+        start = (self._next - self._size) % self.capacity
+        return [(start + offset) % self.capacity for offset in range(self._size)]
+
+    def window(self, size=None):
+        """Codes des `size` derniers symboles, du plus ancien au plus récent (vue si contigus)"""
+        size = self._size if size is None else min(size, self._size)
+        start = self._next - size
+        if start >= 0:
+            return self._symbols[start:self._next]
+        return np.concatenate([self._symbols[start:], self._symbols[:self._next]])
+
+    def symbol_counts(self, size=None):
+        """Occurrences de chaque symbole (♠, ♦, ♣) parmi les `size` derniers rounds (défaut: `window_size`)"""
+        if size is None or size == self.window_size:
+            return list(self._window_counts)
+        return np.bincount(self.window(size), minlength=len(SYMBOLS)).tolist()
+
+    def consecutive_counts(self):
+        """Longueur de la série en cours pour chaque symbole (0 sauf pour le dernier)"""
+        counts = [0] * len(SYMBOLS)
+        if self._size:
+            counts[self._streak_symbol] = self._streak_length
+        return counts
+
+    def record_at(self, position):
+        return RoundRecord(self._round_ids[position], SYMBOLS[self._symbols[position]],
+                           self._bets[position], int(self._results[position]))
+
+    def record(self, index):
+        """Vue du round `index` (ordre chronologique, négatif depuis la fin)"""
+        if not -self._size <= index < self._size:
+            raise IndexError(index)
+        index %= self._size
+        return self.record_at((self._next - self._size + index) % self.capacity)
+
+    def to_list(self):
+        """Historique au format JSON existant (liste de dicts)"""
+        return list(self.records)
@@ -0,0 +1,101 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict, defaultdict, deque
+from metrics import ROUND_STAGE_SECONDS
+
+# Étapes d'un round, dans l'ordre du pipeline (horodatages epoch en secondes)
+STAGES = ('published', 'fetched', 'dispatched', 'features_done', 'predicted', 'served')
+
+# Segments rapportés; published → predicted est le SLO "résultat → prédiction"
+SEGMENTS = (
+    ('published', 'fetched'),
+    ('fetched', 'dispatched'),
+    ('dispatched', 'features_done'),
+    ('features_done', 'predicted'),
+    ('predicted', 'served'),
+    ('published', 'predicted'),
+    ('published', 'served'),
+)
+
+def new_trace(published=None, fetched=None):
+    """Trace d'un round: `published` vient de l'API amont (champ S ou time)"""
+    trace = {'published': float(published) if published else None}
+    if fetched is not None:
+        trace['fetched'] = fetched
+    return trace
+
+def mark(trace, stage):
+    if trace is not None:
+        trace[stage] = time.time()
+
+def _segment_name(start, end):
+    return f'{start}_to_{end}'
+
+class RoundLatencyTracker:
+    """Agrège les latences par étape des rounds, une fois par round
+
+    Un même round est revu à chaque polling: seule sa première prédiction et
+    sa première diffusion à un client sont comptées.
+    """
+
+    def __init__(self, max_samples=2000, max_rounds=5000):
+        self.max_rounds = max_rounds
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._first_traces = OrderedDict()
+        self._served = set()
+        self._lock = threading.Lock()
+
+    def _add(self, pipeline, trace, segments):
+        for start, end in segments:
+            if trace.get(start) is None or trace.get(end) is None:
+                continue
+            seconds = trace[end] - trace[start]
+            self._samples[(pipeline, _segment_name(start, end))].append(seconds)
+            ROUND_STAGE_SECONDS.observe(max(0.0, seconds), pipeline=pipeline,
+                                        segment=_segment_name(start, end))
+
+    def record_prediction(self, pipeline, round_id, trace):
+        if trace is None:
+            return
+        key = (pipeline, round_id)
+        with self._lock:
+            if key in self._first_traces:
+                return
+            self._first_traces[key] = trace
+            while len(self._first_traces) > self.max_rounds:
+                old_key, _ = self._first_traces.popitem(last=False)
+                self._served.discard(old_key)
+            self._add(pipeline, trace, [segment for segment in SEGMENTS if 'served' not in segment])
+
+    def mark_served(self, pipeline, round_id, trace=None):
+        """Horodate la diffusion d'une prédiction; mesurée à partir de la première prédiction du round"""
+        now = time.time()
+        if trace is not None and 'served' not in trace:
+            trace['served'] = now
+        key = (pipeline, round_id)
+        with self._lock:
+            first = self._first_traces.get(key)
+            if first is None or key in self._served:
+                return
+            self._served.add(key)
+            first.setdefault('served', now)
+            self._add(pipeline, first, [segment for segment in SEGMENTS if 'served' in segment])
+
+    def report(self):
+        """Percentiles (ms) par pipeline et segment"""
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        report = defaultdict(dict)
+        for (pipeline, segment), values in sorted(samples.items()):
+            values = np.asarray(values) * 1000
+            report[pipeline][segment] = {
+                'count': len(values),
+                'p50_ms': float(np.percentile(values, 50)),
+                'p90_ms': float(np.percentile(values, 90)),
+                'p99_ms': float(np.percentile(values, 99)),
+                'max_ms': float(values.max())
+            }
+        return dict(report)
+
+ROUND_LATENCY = RoundLatencyTracker()
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import numpy as np
 import json
@@ -6,12 +7,62 @@ from datetime import datetime
 import threading
 import logging
 from baccarat_api_client_v2 import BaccaratAPIClientV2
-import joblib
-from collections import deque
+from model_artifact import ModelHolder, load_model_bundle
+from round_tracing import ROUND_LATENCY, mark
+from storage import open_storage
+from compact_history import compact_frame
+from round_ring import SYMBOL_CODES, RoundRing
+from symbol_ngrams import SymbolNGramModel
+from pattern_index import SuffixAutomaton
+from table_state import DEFAULT_TABLE, ShardAssignment, TableStates, table_of_payload, table_of_round
+from round_queue import CoalescingRoundQueue
+from metrics import CSV_RELOAD_SECONDS, FEATURE_EXTRACTION_SECONDS, INFERENCE_SECONDS
 
-class SnakeWinPredictor:
-    def __init__(self, csv_path='data/twentyone_rounds.csv', model_path='models/baccarat_model.pkl'):
+# Rounds récents chargés au démarrage (seuls les 50 derniers sont exploités)
+HISTORY_ROWS = 50
+
+# Modèle n-grammes et index de motifs du flux des vainqueurs: point de contrôle tous les N nouveaux rounds
+# (noms distincts des anciens points de contrôle, construits sur les symboles cycliques du tracking)
+NGRAM_PATH = os.environ.get('SNAKE_NGRAM_PATH', 'data/snake_winner_ngrams.npz')
+NGRAM_ORDER = int(os.environ.get('SNAKE_NGRAM_ORDER', 6))
+NGRAM_CHECKPOINT_ROUNDS = 50
+PATTERN_INDEX_PATH = os.environ.get('SNAKE_PATTERN_INDEX_PATH', 'data/snake_winner_patterns.npz')
+PATTERN_CHECKPOINT_ROUNDS = 1000
+
+def winner_codes(player, banker):
+    """Symbole du flux des n-grammes et des motifs d'après les scores: ♠ (0) Player,
+    ♦ (1) Banker, ♣ (2) égalité; scalaires ou tableaux"""
+    return np.where(player > banker, 0, np.where(banker > player, 1, 2))
+
+def table_index_path(path, table):
+    """Point de contrôle d'un index de symboles pour une table (chemin d'origine pour la table par défaut)"""
+    if table == DEFAULT_TABLE:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{table}{ext}"
+
+class SnakeTableState:
+    """État Snake_win d'une table: historique ♠ ♦ ♣, rounds courants, prédictions,
+    n-grammes et index de motifs du flux de symboles de la table"""
+
+    __slots__ = ('table', 'history', 'current_rounds', 'predictions', 'ngrams', 'patterns', 'symbol_updates',
+                 'open_round')
+
+    def __init__(self, table, capacity=100, ngrams=None, patterns=None):
+        self.table = table
+        self.history = RoundRing(capacity=capacity)
+        self.current_rounds = {}
+        self.predictions = {}
+        self.ngrams = ngrams if ngrams is not None else SymbolNGramModel(max_order=NGRAM_ORDER)
+        self.patterns = patterns if patterns is not None else SuffixAutomaton()
+        self.symbol_updates = 0
+        # Dernier round apparu: son vainqueur entre dans le flux quand le round suivant arrive
+        self.open_round = None
+
+class SnakeWinPredictor(ModelHolder):
+    def __init__(self, csv_path='data/twentyone_rounds.csv', model_path='models/baccarat_model.pkl', storage=None):
         self.csv_path = csv_path
+        self.storage = storage or open_storage(csv_path=csv_path)
         self.model_path = model_path
         self.api_client = BaccaratAPIClientV2()
         
@@ -31,18 +82,17 @@ class SnakeWinPredictor:
         
         # Données historiques et tracking
         self.historical_data = None
-        self.model = None
-        self.scaler = None
-        self.feature_columns = []
         
-        # Système de tracking ♠ ♦ ♣
-        self.symbol_history = deque(maxlen=100)
-        self.round_history = deque(maxlen=100)
-        self.current_rounds = {}
-        self.predictions = {}
+        # Système de tracking ♠ ♦ ♣, un état par table (TABLE_SHARDS/TABLE_SHARD_INDEX: tables de ce processus)
+        self.tables = TableStates(self.new_table_state, ShardAssignment.from_env())
+        # Symboles de l'historique stocké par table, lus une fois à la première table à amorcer
+        self._seed_symbols = None
+        # Réponse des lectures pour une table qui n'a encore rien reçu ici (jamais modifié)
+        self._empty_state = SnakeTableState(DEFAULT_TABLE, self.ai_config["input"]["history_depth"])
         
-        # Variables pour le streaming
+        # Variables pour le streaming: file entre le poller et les workers de prédiction
         self.is_running = False
+        self.round_queue = CoalescingRoundQueue.from_env('snake-win', self.process_api_round)
         
         # Configuration logging
         logging.basicConfig(level=logging.INFO)
@@ -52,11 +102,50 @@ class SnakeWinPredictor:
         self.load_trained_model()
         self.initialize_symbol_tracking()
     
+    def new_table_state(self, table):
+        """État d'une nouvelle table, avec ses n-grammes et son index de motifs"""
+        ngrams, patterns = self.load_symbol_indexes(table)
+        return SnakeTableState(table, self.ai_config["input"]["history_depth"], ngrams, patterns)
+    
+    def table_state(self, table=None):
+        """État d'une table en lecture (table par défaut si None), sans le créer:
+        état vide si la table n'a encore reçu aucun round dans ce processus"""
+        return self.tables.find(table or DEFAULT_TABLE) or self._empty_state
+    
+    # Anciens attributs: état de la table par défaut
+    @property
+    def history(self):
+        return self.table_state().history
+    
+    @property
+    def symbol_history(self):
+        return self.table_state().history.symbols
+    
+    @property
+    def round_history(self):
+        return self.table_state().history.records
+    
+    @property
+    def current_rounds(self):
+        return self.table_state().current_rounds
+    
+    @property
+    def predictions(self):
+        return self.table_state().predictions
+    
+    @property
+    def ngrams(self):
+        return self.table_state().ngrams
+    
+    @property
+    def patterns(self):
+        return self.table_state().patterns
+    
     def load_historical_data(self):
-        """Charge les données historiques du CSV"""
+        """Charge les derniers rounds historiques (lecture de la fin du stockage seulement)"""
         try:
-            self.historical_data = pd.read_csv(self.csv_path, header=None, 
-                                            names=['id', 'event_id', 'collected_at', 'option_type', 'odd', 'round_state', 'raw_payload'])
+            with CSV_RELOAD_SECONDS.time(loader='snake_win'):
+                self.historical_data = compact_frame(self.storage.latest(HISTORY_ROWS))
             self.logger.info(f"Chargé {len(self.historical_data)} enregistrements historiques")
         except Exception as e:
             self.logger.error(f"Erreur chargement données historiques: {e}")
@@ -65,32 +154,96 @@ class SnakeWinPredictor:
     def load_trained_model(self):
         """Charge le modèle IA entraîné"""
         try:
-            model_data = joblib.load(self.model_path)
-            self.model = model_data['model']
-            self.scaler = model_data['scaler']
-            self.feature_columns = model_data['feature_columns']
+            self.swap_model(load_model_bundle(self.model_path))
             self.logger.info("Modèle IA Snake_win chargé avec succès")
         except Exception as e:
             self.logger.error(f"Erreur chargement modèle: {e}")
     
     def initialize_symbol_tracking(self):
         """Initialise le système de tracking avec symboles ♠ ♦ ♣"""
+        # Le stockage ne distingue pas les tables: l'historique amorce la table par défaut,
+        # seulement si elle appartient au shard de ce processus
+        if not self.tables.assignment.owns(DEFAULT_TABLE):
+            return
+        history = self.tables.get(DEFAULT_TABLE).history
         if not self.historical_data.empty:
             # Convertir les résultats historiques en symboles
             for _, row in self.historical_data.tail(50).iterrows():
                 symbol = self.convert_result_to_symbol(row['option_type'])
-                self.symbol_history.append(symbol)
-                
-                round_info = {
-                    "round_id": row['id'],
-                    "symbol": symbol,
-                    "bet": "PLAYER+2",
-                    "result_code": self.get_result_code_from_history(row)
-                }
-                self.round_history.append(round_info)
+                history.append(row['id'], symbol, self.get_result_code_from_history(row))
         
         self.logger.info(f"Tracking initialisé avec {len(self.symbol_history)} symboles")
     
+    def historical_symbols(self):
+        """{table: symboles}: un symbole par round stocké (winner_codes des scores finaux), en
+        ordre chronologique, par table (table_of_payload du raw_payload du round)
+        
+        Les lignes d'une même sauvegarde (une par option de pari) forment un seul round.
+        """
+        raw = self.storage.read_all()
+        payloads = pd.Series(raw['raw_payload'].to_numpy(), index=pd.to_numeric(raw['event_id'], errors='coerce'))
+        rounds = compact_frame(raw)
+        # compact_frame ignore les lignes sans event_id numérique: mêmes lignes, même ordre
+        rounds['raw_payload'] = payloads[payloads.index.notna()].to_numpy()
+        rounds = rounds.drop_duplicates(['event_id', 'collected_at'], keep='last')
+        rounds = rounds.sort_values('collected_at', kind='stable')
+        codes = winner_codes(rounds['player_score'].to_numpy(), rounds['banker_score'].to_numpy())
+        tables = rounds['raw_payload'].map(table_of_payload).to_numpy()
+        return {table: codes[tables == table] for table in pd.unique(tables)}
+    
+    def seed_symbols(self, table):
+        """Symboles stockés d'une table (rendus une seule fois: l'amorçage suit les points de contrôle)"""
+        if self._seed_symbols is None:
+            try:
+                self._seed_symbols = self.historical_symbols()
+            except Exception as e:
+                self.logger.error(f"Erreur lecture historique des symboles: {e}")
+                self._seed_symbols = {}
+        return self._seed_symbols.pop(table, [])
+    
+    def _load_checkpoint(self, load, path, label):
+        try:
+            index = load(path)
+            self.logger.info(f"{label} chargé: {len(index)} symboles")
+            return index
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Point de contrôle {label} ignoré ({path}): {e}")
+            return None
+    
+    def _save_checkpoint(self, index, path, label):
+        try:
+            index.save(path)
+        except Exception as e:
+            self.logger.error(f"Erreur sauvegarde {label}: {e}")
+    
+    def load_symbol_indexes(self, table):
+        """(n-grammes, index de motifs) d'une table: points de contrôle de la table, sinon
+        amorcés sur les rounds stockés de cette table"""
+        # Un point de contrôle d'un autre ordre (SNAKE_NGRAM_ORDER modifié) est ignoré et réamorcé
+        ngrams = self._load_checkpoint(lambda path: SymbolNGramModel.load(path, max_order=NGRAM_ORDER),
+                                       table_index_path(NGRAM_PATH, table), "n-grammes")
+        patterns = self._load_checkpoint(SuffixAutomaton.load, table_index_path(PATTERN_INDEX_PATH, table),
+                                         "index de motifs")
+        if ngrams is not None and patterns is not None:
+            return ngrams, patterns
+        symbols = self.seed_symbols(table)
+        if ngrams is None:
+            ngrams = SymbolNGramModel(max_order=NGRAM_ORDER)
+            ngrams.update_many(symbols)
+        if patterns is None:
+            patterns = SuffixAutomaton()
+            patterns.extend(symbols)
+        if len(symbols):
+            self._save_checkpoints(table, ngrams, patterns)
+            self.logger.info(f"Index de symboles de la table {table} amorcés sur {len(symbols)} rounds historiques")
+        return ngrams, patterns
+    
+    def _save_checkpoints(self, table, ngrams, patterns):
+        self._save_checkpoint(ngrams, table_index_path(NGRAM_PATH, table), "n-grammes")
+        self._save_checkpoint(patterns, table_index_path(PATTERN_INDEX_PATH, table), "index de motifs")
+    
     def convert_result_to_symbol(self, result):
         """Convertit un résultat en symbole ♠ ♦ ♣"""
         symbols = ["♠", "♦", "♣"]
@@ -106,10 +259,9 @@ class SnakeWinPredictor:
         """Extrait le code résultat depuis les données historiques"""
         # Logique basée sur les cotes et scores
         try:
-            round_state = json.loads(row['round_state'])
-            player_score = round_state.get('playerScore', 0)
-            banker_score = round_state.get('bankerScore', 0)
-            odd = float(row['odd']) if row['odd'] != 'null' else 1.0
+            # Scores déjà extraits de round_state par compact_frame
+            player_score = int(row['player_score'])
+            banker_score = int(row['banker_score'])
             
             if abs(player_score - banker_score) >= 3:
                 return 2  # strong_win
@@ -121,84 +273,70 @@ class SnakeWinPredictor:
         except:
             return 1  # win par défaut
     
-    def extract_features_from_round(self, round_data):
-        """Extrait les features depuis un round pour la prédiction IA"""
+    def extract_features_from_round(self, round_data, layout, row, state=None):
+        """Écrit les features d'un round dans `row` aux positions de `layout` (historique de sa table)"""
         try:
+            history = (state or self.table_state(table_of_round(round_data))).history
             round_info = round_data.get('round', {})
-            tracking_info = round_data.get('tracking', {})
+            score = round_info.get('score', {})
             
-            features = {
-                'player_score': round_info.get('score', {}).get('player', 0),
-                'banker_score': round_info.get('score', {}).get('banker', 0),
-                'round_number': round_info.get('round_id', 0),
-                'is_live': 1,  # Toujours live pour les données API
-            }
+            row[layout.player_score] = score.get('player', 0)
+            row[layout.banker_score] = score.get('banker', 0)
+            row[layout.round_number] = round_info.get('round_id', 0)
+            row[layout.is_live] = 1  # Toujours live pour les données API
             
             # Features temporelles
             timestamp = datetime.fromisoformat(round_info.get('timestamp', datetime.now().isoformat()))
-            features.update({
-                'hour': timestamp.hour,
-                'day_of_week': timestamp.weekday(),
-                'minute': timestamp.minute
-            })
+            row[layout.hour] = timestamp.hour
+            row[layout.day_of_week] = timestamp.weekday()
+            row[layout.minute] = timestamp.minute
             
             # Cotes depuis betting info
-            bet_info = round_data.get('bet', {})
-            features.update({
-                'player_win_odd': bet_info.get('odds', 1.85),
-                'banker_win_odd': 1.95,  # Simulation
-                'tie_odd': 8.5,  # Simulation
-                'odd_value': bet_info.get('odds', 1.85)
-            })
+            odds = round_data.get('bet', {}).get('odds', 1.85)
+            row[layout.player_win_odd] = odds
+            row[layout.banker_win_odd] = 1.95  # Simulation
+            row[layout.tie_odd] = 8.5  # Simulation
+            row[layout.odd_value] = odds
             
             # Features séquentielles basées sur l'historique des symboles
-            recent_symbols = list(self.symbol_history)[-20:]
-            features.update({
-                'Player_Win_ma_5': recent_symbols.count('♠') / min(5, len(recent_symbols)) if recent_symbols else 0.33,
-                'Banker_Win_ma_5': recent_symbols.count('♦') / min(5, len(recent_symbols)) if recent_symbols else 0.33,
-                'Tie_ma_5': recent_symbols.count('♣') / min(5, len(recent_symbols)) if recent_symbols else 0.34,
-                'consecutive_Player_Win': self.count_consecutive_symbols('♠'),
-                'consecutive_Banker_Win': self.count_consecutive_symbols('♦'),
-                'consecutive_Tie': self.count_consecutive_symbols('♣')
-            })
-            
-            return features
+            recent = min(20, len(history))
+            counts = history.symbol_counts(20)
+            consecutive = history.consecutive_counts()
+            row[layout.Player_Win_ma_5] = counts[0] / min(5, recent) if recent else 0.33
+            row[layout.Banker_Win_ma_5] = counts[1] / min(5, recent) if recent else 0.33
+            row[layout.Tie_ma_5] = counts[2] / min(5, recent) if recent else 0.34
+            row[layout.consecutive_Player_Win] = consecutive[0]
+            row[layout.consecutive_Banker_Win] = consecutive[1]
+            row[layout.consecutive_Tie] = consecutive[2]
             
         except Exception as e:
             self.logger.error(f"Erreur extraction features: {e}")
-            return {col: 0 for col in self.feature_columns}
+            row.fill(0.0)
+        return row
     
-    def count_consecutive_symbols(self, symbol):
+    def count_consecutive_symbols(self, symbol, table=None):
         """Compte les symboles consécutifs"""
-        if not self.symbol_history:
-            return 0
-        
-        count = 0
-        for s in reversed(self.symbol_history):
-            if s == symbol:
-                count += 1
-            else:
-                break
-        return count
+        return self.table_state(table).history.consecutive_counts()[SYMBOL_CODES.get(symbol, 2)]
     
-    def predict_round(self, round_data):
+    def predict_round(self, round_data, trace=None, state=None):
         """Fait une prédiction Snake_win pour un round"""
-        if self.model is None:
+        # Une seule lecture: la prédiction se termine sur ce modèle même en cas de rechargement
+        bundle = self.model_bundle
+        if bundle.model is None:
             return {'error': 'Modèle Snake_win non disponible'}
         
         try:
             # Extraire les features
-            features = self.extract_features_from_round(round_data)
-            
-            # Préparer le vecteur de features
-            feature_vector = []
-            for col in self.feature_columns:
-                feature_vector.append(features.get(col, 0))
+            with FEATURE_EXTRACTION_SECONDS.time(predictor='snake_win'):
+                # Vecteur écrit en place dans la ligne réutilisée du thread
+                layout = bundle.layout
+                row = self.extract_features_from_round(round_data, layout, layout.row(), state)
+            mark(trace, 'features_done')
             
             # Prédiction avec le modèle
-            feature_vector_scaled = self.scaler.transform([feature_vector])
-            prediction = self.model.predict(feature_vector_scaled)[0]
-            probabilities = self.model.predict_proba(feature_vector_scaled)[0]
+            with INFERENCE_SECONDS.time(predictor='snake_win'):
+                prediction, probabilities = self.infer(bundle, layout.vector(row))
+            mark(trace, 'predicted')
             
             result_map = {0: 'Player Win', 1: 'Banker Win', 2: 'Tie', 3: 'Player Pair', 4: 'Banker Pair'}
             
@@ -226,7 +364,9 @@ class SnakeWinPredictor:
                     "probabilities": {
                         result_map[i]: prob for i, prob in enumerate(probabilities)
                     }
-                }
+                },
+                # Prochain symbole selon les n-grammes du flux de la table
+                "pattern": (state or self.table_state(table_of_round(round_data))).ngrams.predict()
             }
             
             return ai_prediction
@@ -236,41 +376,67 @@ class SnakeWinPredictor:
             return {'error': f'Erreur prédiction: {str(e)}'}
     
     def process_api_round(self, round_data):
-        """Traite un round reçu de l'API"""
+        """Traite un round reçu de l'API (ignoré si sa table appartient à un autre shard)"""
+        table = table_of_round(round_data)
+        if not self.tables.assignment.owns(table):
+            return None
+        state = self.tables.get(table)
         round_id = round_data['round']['round_id']
+        trace = round_data.pop('trace', None)
+        # Un même round revient à chaque polling: le flux de symboles ne le compte qu'une fois
+        is_new_round = round_id not in state.current_rounds
         
         # Stocker le round courant
-        self.current_rounds[round_id] = round_data
+        state.current_rounds[round_id] = round_data
         
         # Générer une prédiction Snake_win
-        prediction = self.predict_round(round_data)
+        prediction = self.predict_round(round_data, trace, state)
+        if 'error' not in prediction:
+            ROUND_LATENCY.record_prediction('snake_win', round_id, trace)
         
         # Mettre à jour l'historique des symboles
         symbol = round_data.get('tracking', {}).get('symbol', '♠')
-        self.symbol_history.append(symbol)
-        
-        round_info = {
-            "round_id": round_id,
-            "symbol": symbol,
-            "bet": "PLAYER+2",
-            "result_code": round_data.get('tracking', {}).get('result_code', 1)
-        }
-        self.round_history.append(round_info)
+        state.history.append(round_id, symbol, round_data.get('tracking', {}).get('result_code', 1))
+        if is_new_round:
+            self.close_open_round(state)
+            state.open_round = round_id
         
         # Stocker la prédiction
-        self.predictions[round_id] = {
+        state.predictions[round_id] = {
             "round_data": round_data,
             "ai_prediction": prediction,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "trace": trace
         }
         
         # Logger
-        self.logger.info(f"Round {round_id}: {symbol} -> {prediction.get('prediction', {}).get('predicted_winner', 'N/A')}")
+        self.logger.info(f"Table {table} round {round_id}: {symbol} -> {prediction.get('prediction', {}).get('predicted_winner', 'N/A')}")
         
         return prediction
     
-    def get_complete_json_response(self):
-        """Retourne la structure JSON complète selon votre format"""
+    def close_open_round(self, state):
+        """Le round ouvert de la table est terminé: son vainqueur (derniers scores reçus) entre
+        dans le flux, avec la même définition que l'amorçage sur l'historique stocké"""
+        round_data = state.current_rounds.get(state.open_round)
+        if round_data is None:
+            return
+        score = round_data.get('round', {}).get('score', {})
+        self.record_symbol(state, int(winner_codes(score.get('player', 0), score.get('banker', 0))))
+    
+    def record_symbol(self, state, symbol):
+        """Ajoute le symbole d'un round terminé aux n-grammes et à l'index de motifs de sa table"""
+        state.ngrams.update(symbol)
+        state.patterns.append(symbol)
+        state.symbol_updates += 1
+        if state.symbol_updates % NGRAM_CHECKPOINT_ROUNDS == 0:
+            self._save_checkpoint(state.ngrams, table_index_path(NGRAM_PATH, state.table), "n-grammes")
+        if state.symbol_updates % PATTERN_CHECKPOINT_ROUNDS == 0:
+            self._save_checkpoint(state.patterns, table_index_path(PATTERN_INDEX_PATH, state.table),
+                                  "index de motifs")
+    
+    def get_complete_json_response(self, table=None):
+        """Retourne la structure JSON complète selon votre format (une table, par défaut la principale)"""
+        state = self.table_state(table)
         return {
             "meta": {
                 "provider": "1xBet",
@@ -301,15 +467,19 @@ class SnakeWinPredictor:
                     "active": True
                 }
             ],
-            "current_rounds": list(self.current_rounds.values()),
-            "history": list(self.round_history),
-            "ai": self.get_latest_ai_prediction()
+            "table": state.table,
+            "current_rounds": list(state.current_rounds.values()),
+            "history": state.history.to_list(),
+            "ai": self.get_latest_ai_prediction(table)
         }
     
-    def get_latest_ai_prediction(self):
-        """Retourne la dernière prédiction IA"""
-        if self.predictions:
-            latest_prediction = max(self.predictions.values(), key=lambda x: x['timestamp'])
+    def get_latest_ai_prediction(self, table=None):
+        """Retourne la dernière prédiction IA d'une table"""
+        predictions = self.table_state(table).predictions
+        if predictions:
+            round_id, latest_prediction = max(predictions.items(), key=lambda item: item[1]['timestamp'])
+            # Appelée par les routes: première diffusion de la prédiction au client
+            ROUND_LATENCY.mark_served('snake_win', round_id, latest_prediction.get('trace'))
             return latest_prediction['ai_prediction']
         else:
             return {
@@ -322,18 +492,35 @@ class SnakeWinPredictor:
                 }
             }
     
+    def get_tables_summary(self):
+        """Tables suivies par ce processus: taille d'historique, rounds et prédictions"""
+        return {
+            **self.tables.assignment.describe(),
+            'tables': {
+                table: {
+                    'symbol_history_length': len(state.history),
+                    'current_rounds_count': len(state.current_rounds),
+                    'predictions_count': len(state.predictions)
+                }
+                for table, state in self.tables.items()
+            }
+        }
+    
     def start_real_time_prediction(self, interval=5):
         """Démarre la prédiction en temps réel"""
         self.is_running = True
         self.logger.info(f"Démarrage prédiction Snake_win temps réel (interval: {interval}s)")
         
+        # Le poller ne fait que déposer: sa cadence ne dépend plus du temps de prédiction
+        self.round_queue.start()
+        
         def api_callback(round_data):
             if self.is_running:
-                self.process_api_round(round_data)
+                self.round_queue.put(round_data['round']['round_id'], round_data, table_of_round(round_data))
         
         # Démarrer le monitoring API
         api_thread = threading.Thread(target=self.api_client.start_real_time_monitoring, 
-                                    args=(api_callback, interval))
+                                    args=(api_callback, interval), name='snake-win-poller')
         api_thread.daemon = True
         api_thread.start()
         
@@ -342,6 +529,9 @@ class SnakeWinPredictor:
     def stop_real_time_prediction(self):
         """Arrête la prédiction en temps réel"""
         self.is_running = False
+        self.round_queue.stop()
+        for table, state in self.tables.items():
+            self._save_checkpoints(table, state.ngrams, state.patterns)
         self.logger.info("Arrêt prédiction Snake_win temps réel")
 
 # Test du prédicteur Snake_win
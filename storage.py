@@ -0,0 +1,551 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from features import CSV_COLUMNS
+from feature_cache import read_appended_rows
+from time_index import NAT, to_ns
+
+SCAN_CHUNK_ROWS = 100000
+INSERT_BATCH_ROWS = 1000
+
+# Schéma de scripts/setup.sql adapté à SQLite: JSONB → TEXT, TIMESTAMPTZ → texte ISO 8601 UTC
+# à largeur fixe (l'ordre lexicographique est l'ordre chronologique), pas d'index GIN
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS twentyone_rounds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL,
+    collected_at TEXT,
+    option_type TEXT,
+    odd REAL,
+    round_state TEXT,
+    raw_payload TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_twentyone_rounds_event_collected
+    ON twentyone_rounds(event_id, collected_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_twentyone_rounds_collected_at
+    ON twentyone_rounds(collected_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_twentyone_rounds_option_type
+    ON twentyone_rounds(option_type);
+
+CREATE TABLE IF NOT EXISTS collection_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection_time TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    events_found INTEGER DEFAULT 0,
+    events_processed INTEGER DEFAULT 0,
+    options_saved INTEGER DEFAULT 0,
+    errors_count INTEGER DEFAULT 0,
+    collection_duration_ms INTEGER,
+    metadata TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_collection_stats_time
+    ON collection_stats(collection_time DESC);
+"""
+
+def _iso_ms(nanoseconds):
+    """ns UTC → texte ISO 8601 à la milliseconde, format du collecteur Node"""
+    return pd.Timestamp(int(nanoseconds), tz='UTC').strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _normalize_timestamps(values):
+    """Horodatages → texte ISO UTC à largeur fixe (None si illisible)"""
+    return [None if ns == NAT else _iso_ms(ns) for ns in to_ns(values)]
+
+def _clean_odd(value):
+    try:
+        odd = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(odd) else odd
+
+class RoundStorage:
+    """Accès aux rounds collectés, commun aux prédicteurs, à l'API et à l'entraînement
+
+    Les lignes sont des DataFrames aux colonnes CSV_COLUMNS. `read_since` sert
+    aux rechargements incrémentaux: le curseur est opaque pour l'appelant
+    (None = depuis le début).
+    """
+
+    kind = None
+
+    def read_since(self, cursor=None):
+        """Retourne (lignes ajoutées depuis `cursor`, nouveau curseur)"""
+        raise NotImplementedError
+
+    def read_all(self):
+        return self.read_since(None)[0]
+
+    def latest(self, limit):
+        """Les `limit` lignes les plus récentes, en ordre chronologique"""
+        raise NotImplementedError
+
+    def by_event(self, event_id):
+        raise NotImplementedError
+
+    def between(self, start=None, end=None):
+        """Lignes avec start <= collected_at <= end (ns UTC, bornes optionnelles), ordre chronologique"""
+        raise NotImplementedError
+
+    def append_rows(self, rows):
+        """Ajoute des lignes (listes dans l'ordre CSV_COLUMNS); retourne leur nombre"""
+        raise NotImplementedError
+
+    def last_saves(self, since=None):
+        """Dernière sauvegarde (epoch s) de chaque event_id (clé texte), depuis `since` (ns) si donné"""
+        raise NotImplementedError
+
+    def describe(self):
+        return {'kind': self.kind}
+
+    def count(self):
+        return len(self.read_all())
+
+    def import_csv(self, csv_path, chunk_rows=SCAN_CHUNK_ROWS):
+        """Importe un CSV du collecteur (en-tête ignoré) par blocs; retourne le nombre de lignes"""
+        total = 0
+        for chunk in pd.read_csv(csv_path, header=None, names=CSV_COLUMNS, dtype=str,
+                                 keep_default_na=False, chunksize=chunk_rows):
+            chunk = chunk[chunk['event_id'] != 'event_id']
+            chunk = chunk[pd.to_numeric(chunk['event_id'], errors='coerce').notna()]
+            total += self.append_rows(chunk.values.tolist())
+        return total
+
+class CsvRoundStorage(RoundStorage):
+    """Le CSV du collecteur Node; le curseur est un offset en octets"""
+
+    kind = 'csv'
+
+    def __init__(self, csv_path='data/twentyone_rounds.csv'):
+        self.csv_path = csv_path
+
+    def ensure_exists(self):
+        directory = os.path.dirname(self.csv_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.csv_path):
+            with open(self.csv_path, 'w', encoding='utf-8') as f:
+                f.write(','.join(CSV_COLUMNS) + '\n')
+
+    def read_since(self, cursor=None):
+        cursor = cursor or 0
+        try:
+            if os.path.getsize(self.csv_path) <= cursor:
+                return pd.DataFrame(columns=CSV_COLUMNS), cursor
+        except OSError:
+            return pd.DataFrame(columns=CSV_COLUMNS), cursor
+        return read_appended_rows(self.csv_path, cursor)
+
+    def _chunks(self, usecols=None):
+        for chunk in pd.read_csv(self.csv_path, header=None, names=CSV_COLUMNS, usecols=usecols,
+                                 dtype=str, chunksize=SCAN_CHUNK_ROWS):
+            # L'en-tête écrit par le collecteur Node est lu comme une ligne
+            yield chunk[chunk['event_id'] != 'event_id']
+
+    def latest(self, limit):
+        """Lit la fin du fichier par blocs, sans parcourir le début"""
+        if limit <= 0:
+            return pd.DataFrame(columns=CSV_COLUMNS)
+        block = 64 * 1024
+        with open(self.csv_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            position = end
+            data = b''
+            while position > 0 and data.count(b'\n') <= limit + 1:
+                position = max(0, position - block)
+                f.seek(position)
+                data = f.read(end - position)
+        if position > 0:
+            data = data[data.index(b'\n') + 1:]
+        # Dernière ligne ignorée tant qu'elle n'est pas terminée (écriture en cours)
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return pd.DataFrame(columns=CSV_COLUMNS)
+        frame = pd.read_csv(io.BytesIO(data), header=None, names=CSV_COLUMNS)
+        frame = frame[frame['event_id'].astype(str) != 'event_id']
+        frame = frame.iloc[-limit:]
+        order = np.argsort(to_ns(frame['collected_at']), kind='stable')
+        return frame.iloc[order].reset_index(drop=True)
+
+    def by_event(self, event_id):
+        matches = [chunk[chunk['event_id'] == str(event_id)] for chunk in self._chunks()]
+        frame = pd.concat(matches, ignore_index=True) if matches else pd.DataFrame(columns=CSV_COLUMNS)
+        return frame.iloc[np.argsort(to_ns(frame['collected_at']), kind='stable')].reset_index(drop=True)
+
+    def between(self, start=None, end=None):
+        start = NAT + 1 if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+        matches = []
+        for chunk in self._chunks():
+            nanoseconds = to_ns(chunk['collected_at'])
+            matches.append(chunk[(nanoseconds >= start) & (nanoseconds <= end)])
+        frame = pd.concat(matches, ignore_index=True) if matches else pd.DataFrame(columns=CSV_COLUMNS)
+        return frame.iloc[np.argsort(to_ns(frame['collected_at']), kind='stable')].reset_index(drop=True)
+
+    def append_rows(self, rows):
+        """Un seul write en mode append pour tout le lot"""
+        if not rows:
+            return 0
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        data = buffer.getvalue().encode('utf-8')
+        fd = os.open(self.csv_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        return len(rows)
+
+    def last_saves(self, since=None):
+        latest = {}
+        for chunk in self._chunks(usecols=['event_id', 'collected_at']):
+            nanoseconds = to_ns(chunk['collected_at'])
+            keep = nanoseconds != NAT if since is None else nanoseconds >= since
+            chunk = chunk.assign(seconds=nanoseconds / 1e9)[keep]
+            for event_id, seconds in chunk.groupby('event_id')['seconds'].max().items():
+                latest[event_id] = max(seconds, latest.get(event_id, seconds))
+        return latest
+
+    def describe(self):
+        return {'kind': self.kind, 'path': self.csv_path}
+
+class SqliteRoundStorage(RoundStorage):
+    """Base SQLite embarquée (mode WAL) au schéma de scripts/setup.sql
+
+    Les écritures passent par une connexion unique protégée par un verrou, en
+    transactions de `batch_size` lignes. Chaque thread lecteur a sa propre
+    connexion en lecture seule (recréée après un fork des workers gunicorn):
+    en WAL, les lectures ne bloquent pas l'écriture. Le curseur de
+    `read_since` est le dernier id lu.
+    """
+
+    kind = 'sqlite'
+
+    def __init__(self, db_path='data/rounds.db', batch_size=INSERT_BATCH_ROWS, timeout=30.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        self._local = threading.local()
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.ensure_exists()
+
+    def ensure_exists(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._write_lock:
+            conn = self._write_connection()
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _write_connection(self):
+        if self._writer is None or self._writer_pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # En WAL, NORMAL ne synchronise qu'aux checkpoints: pas de corruption, au pire les
+            # dernières transactions perdues sur coupure de courant
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._writer, self._writer_pid = conn, os.getpid()
+        return self._writer
+
+    def _read_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=self.timeout,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA query_only=ON')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _query(self, sql, params=()):
+        frame = pd.read_sql_query(sql, self._read_connection(), params=params)
+        return frame if not frame.empty else pd.DataFrame(columns=CSV_COLUMNS)
+
+    _SELECT = f"SELECT {', '.join(CSV_COLUMNS)} FROM twentyone_rounds"
+
+    def read_since(self, cursor=None):
+        cursor = cursor or 0
+        frame = self._query(f"{self._SELECT} WHERE id > ? ORDER BY id", (cursor,))
+        if frame.empty:
+            return frame, cursor
+        return frame, int(frame['id'].iloc[-1])
+
+    def latest(self, limit):
+        frame = self._query(f"{self._SELECT} ORDER BY collected_at DESC, id DESC LIMIT ?", (int(limit),))
+        return frame.iloc[::-1].reset_index(drop=True)
+
+    def by_event(self, event_id):
+        return self._query(f"{self._SELECT} WHERE event_id = ? ORDER BY collected_at, id", (int(event_id),))
+
+    @staticmethod
+    def _bound(nanoseconds, round_up):
+        # Valeurs stockées à la milliseconde: arrondi des bornes vers l'intérieur de la plage
+        milliseconds = -(-nanoseconds // 1_000_000) if round_up else nanoseconds // 1_000_000
+        return _iso_ms(milliseconds * 1_000_000)
+
+    def between(self, start=None, end=None):
+        clauses, params = ['collected_at IS NOT NULL'], []
+        if start is not None:
+            clauses.append('collected_at >= ?')
+            params.append(self._bound(start, True))
+        if end is not None:
+            clauses.append('collected_at <= ?')
+            params.append(self._bound(end, False))
+        return self._query(f"{self._SELECT} WHERE {' AND '.join(clauses)} ORDER BY collected_at, id", params)
+
+    def append_rows(self, rows):
+        """Insère par transactions de `batch_size` lignes (l'id CSV est remplacé par l'id auto)"""
+        if not rows:
+            return 0
+        timestamps = _normalize_timestamps([row[2] for row in rows])
+        values = [(row[1], collected_at, row[3] or None, _clean_odd(row[4]), row[5], row[6])
+                  for row, collected_at in zip(rows, timestamps)]
+        with self._write_lock:
+            conn = self._write_connection()
+            for begin in range(0, len(values), self.batch_size):
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO twentyone_rounds "
+                        "(event_id, collected_at, option_type, odd, round_state, raw_payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", values[begin:begin + self.batch_size])
+        return len(values)
+
+    def record_collection(self, events_found=0, events_processed=0, options_saved=0, errors_count=0,
+                          duration_ms=None, metadata=None):
+        with self._write_lock, self._write_connection() as conn:
+            conn.execute("INSERT INTO collection_stats (events_found, events_processed, options_saved, "
+                         "errors_count, collection_duration_ms, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                         (events_found, events_processed, options_saved, errors_count, duration_ms, metadata))
+
+    def last_saves(self, since=None):
+        sql = "SELECT event_id, MAX(collected_at) FROM twentyone_rounds WHERE collected_at IS NOT NULL"
+        params = ()
+        if since is not None:
+            sql += " AND collected_at >= ?"
+            params = (self._bound(since, False),)
+        rows = self._read_connection().execute(sql + " GROUP BY event_id", params).fetchall()
+        if not rows:
+            return {}
+        seconds = to_ns([collected_at for _, collected_at in rows]) / 1e9
+        return {str(event_id): float(value) for (event_id, _), value in zip(rows, seconds)}
+
+    def count(self):
+        return self._read_connection().execute("SELECT COUNT(*) FROM twentyone_rounds").fetchone()[0]
+
+    def describe(self):
+        return {'kind': self.kind, 'path': self.db_path}
+
+class SegmentedRoundStorage(RoundStorage):
+    """Historique en segments CSV journaliers (jour UTC de collected_at) décrits par un manifeste
+
+    `directory/AAAA-MM-JJ.csv` (sans en-tête, colonnes CSV_COLUMNS) et
+    `directory/manifest.json` (lignes et bornes de chaque segment) forment un
+    seul jeu de données logique. Les lectures ne touchent que les segments
+    utiles (les plus récents pour `latest`, ceux de la plage pour `between`)
+    et la rétention supprime des segments entiers, sans réécriture. Le
+    curseur de `read_since` est un offset en octets par segment.
+    """
+
+    kind = 'segments'
+
+    def __init__(self, directory='data/segments', retention_days=None):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._lock = threading.Lock()
+        self.ensure_exists()
+
+    def ensure_exists(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.manifest_path):
+            self._write_manifest({})
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f).get('segments', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, segments):
+        manifest = {'version': 1, 'columns': CSV_COLUMNS, 'segments': dict(sorted(segments.items()))}
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _segment(self, day):
+        return CsvRoundStorage(os.path.join(self.directory, f'{day}.csv'))
+
+    def days(self):
+        """Jours présents, du plus ancien au plus récent"""
+        return sorted(self._read_manifest())
+
+    @staticmethod
+    def _day(nanoseconds):
+        return _iso_ms(nanoseconds)[:10]
+
+    @staticmethod
+    def _sorted(frames):
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=CSV_COLUMNS)
+        frame = pd.concat(frames, ignore_index=True)
+        return frame.iloc[np.argsort(to_ns(frame['collected_at']), kind='stable')].reset_index(drop=True)
+
+    def read_since(self, cursor=None):
+        cursor = dict(cursor or {})
+        frames = []
+        for day in self.days():
+            frame, cursor[day] = self._segment(day).read_since(cursor.get(day, 0))
+            frames.append(frame)
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=CSV_COLUMNS), cursor
+        return pd.concat(frames, ignore_index=True), cursor
+
+    def latest(self, limit):
+        """Lit les segments du plus récent au plus ancien, jusqu'à `limit` lignes"""
+        frames, rows = [], 0
+        for day in reversed(self.days()):
+            if rows >= limit:
+                break
+            frame = self._segment(day).latest(limit)
+            frames.append(frame)
+            rows += len(frame)
+        return self._sorted(frames).iloc[-limit:].reset_index(drop=True) if limit > 0 else self._sorted([])
+
+    def by_event(self, event_id):
+        return self._sorted([self._segment(day).by_event(event_id) for day in self.days()])
+
+    def between(self, start=None, end=None):
+        first = None if start is None else self._day(start)
+        last = None if end is None else self._day(end)
+        days = [day for day in self.days()
+                if (first is None or day >= first) and (last is None or day <= last)]
+        return self._sorted([self._segment(day).between(start, end) for day in days])
+
+    def append_rows(self, rows):
+        """Répartit le lot par jour: un append par segment touché, puis le manifeste"""
+        if not rows:
+            return 0
+        nanoseconds = to_ns([row[2] for row in rows])
+        today = time.time_ns()
+        by_day = {}
+        for row, ns in zip(rows, nanoseconds):
+            # Horodatage illisible: rangé dans le segment du jour d'écriture
+            ns = today if ns == NAT else int(ns)
+            entry = by_day.setdefault(self._day(ns), [[], ns, ns])
+            entry[0].append(row)
+            entry[1], entry[2] = min(entry[1], ns), max(entry[2], ns)
+        with self._lock:
+            segments = self._read_manifest()
+            new_day = False
+            for day, (day_rows, first, last) in by_day.items():
+                self._segment(day).append_rows(day_rows)
+                segment = segments.get(day)
+                if segment is None:
+                    new_day = True
+                    segments[day] = {'file': f'{day}.csv', 'rows': len(day_rows),
+                                     'first_ns': first, 'last_ns': last}
+                else:
+                    segment['rows'] += len(day_rows)
+                    segment['first_ns'] = min(segment['first_ns'], first)
+                    segment['last_ns'] = max(segment['last_ns'], last)
+            if new_day and self.retention_days:
+                self._drop(segments, self._cutoff_day(self.retention_days))
+            self._write_manifest(segments)
+        return len(rows)
+
+    @staticmethod
+    def _cutoff_day(days_to_keep):
+        return (datetime.now(timezone.utc) - timedelta(days=days_to_keep)).strftime('%Y-%m-%d')
+
+    def _drop(self, segments, cutoff_day):
+        removed = 0
+        for day in [day for day in segments if day < cutoff_day]:
+            removed += segments.pop(day)['rows']
+            try:
+                os.remove(os.path.join(self.directory, f'{day}.csv'))
+            except OSError:
+                pass
+        return removed
+
+    def cleanup_old_data(self, days_to_keep=30):
+        """Rétention: supprime les segments de plus de `days_to_keep` jours; retourne les lignes retirées"""
+        with self._lock:
+            segments = self._read_manifest()
+            removed = self._drop(segments, self._cutoff_day(days_to_keep))
+            self._write_manifest(segments)
+        return removed
+
+    def last_saves(self, since=None):
+        first = None if since is None else self._day(since)
+        latest = {}
+        for day in self.days():
+            if first is None or day >= first:
+                for event_id, seconds in self._segment(day).last_saves(since).items():
+                    latest[event_id] = max(seconds, latest.get(event_id, seconds))
+        return latest
+
+    def count(self):
+        return sum(segment['rows'] for segment in self._read_manifest().values())
+
+    def describe(self):
+        return {'kind': self.kind, 'path': self.directory, 'segments': len(self.days())}
+
+def open_storage(url=None, csv_path='data/twentyone_rounds.csv'):
+    """Stockage désigné par `url` ou ROUND_STORAGE: 'sqlite:///data/rounds.db', 'csv:///chemin.csv',
+    'segments:///data/segments' (rétention ROUND_RETENTION_DAYS)
+
+    Sans configuration, le CSV du collecteur (`csv_path`).
+    """
+    url = url or os.environ.get('ROUND_STORAGE') or ''
+    if url.startswith('segments:///'):
+        retention = os.environ.get('ROUND_RETENTION_DAYS')
+        return SegmentedRoundStorage(url[len('segments:///'):], retention_days=int(retention) if retention else None)
+    if url.startswith('sqlite:///'):
+        return SqliteRoundStorage(url[len('sqlite:///'):])
+    if url.startswith('csv:///'):
+        return CsvRoundStorage(url[len('csv:///'):])
+    if url.endswith('.db') or url.endswith('.sqlite'):
+        return SqliteRoundStorage(url)
+    return CsvRoundStorage(url or csv_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import du CSV du collecteur dans un autre stockage")
+    parser.add_argument('--csv', default='data/twentyone_rounds.csv')
+    parser.add_argument('--to', dest='target', default='sqlite:///data/rounds.db',
+                        help="Stockage cible (sqlite:///data/rounds.db, segments:///data/segments)")
+    parser.add_argument('--retention-days', type=int, default=None,
+                        help="Après l'import, supprime les segments plus anciens")
+    args = parser.parse_args()
+
+    storage = open_storage(args.target)
+    total = storage.import_csv(args.csv)
+    print(f"Importé {total} lignes de {args.csv}")
+    if args.retention_days and isinstance(storage, SegmentedRoundStorage):
+        print(f"Rétention: {storage.cleanup_old_data(args.retention_days)} lignes supprimées")
+    print(f"{storage.count()} lignes dans {storage.describe()}")
+
+if __name__ == "__main__":
+    main()
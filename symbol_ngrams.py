@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from round_ring import SYMBOLS, SYMBOL_CODES
+
+NGRAM_FORMAT_VERSION = 1
+
+class SymbolNGramModel:
+    """Comptes n-grammes (ordres 0..max_order) du flux de symboles ♠ ♦ ♣, sur tout l'historique
+
+    Les comptes de tous les ordres sont dans un seul tableau int64: l'ordre j
+    occupe 3^j contextes × 3 symboles à partir de `_starts[j]`. Le contexte
+    d'ordre j est l'encodage en base 3 des j derniers symboles, tenu à jour
+    par décalage. Une mise à jour incrémente un compte par ordre (O(k)), une
+    prédiction remonte de l'ordre le plus long observé au moins `min_count`
+    fois vers les plus courts (O(k)).
+    """
+
+    def __init__(self, max_order=6, min_count=5):
+        self.max_order = max_order
+        self.min_count = min_count
+        self.alphabet = len(SYMBOLS)
+        sizes = [self.alphabet ** order * self.alphabet for order in range(max_order + 1)]
+        self._starts = [sum(sizes[:order]) for order in range(max_order + 1)]
+        self._powers = [self.alphabet ** order for order in range(max_order + 1)]
+        self._counts = np.zeros(sum(sizes), dtype=np.int64)
+        self._context = 0   # les max_order derniers symboles, en base 3
+        self._seen = 0      # nombre total de symboles
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._seen
+
+    def _context_of_order(self, order):
+        return self._context % self._powers[order]
+
+    def update(self, symbol):
+        """Ajoute un symbole (♠ ♦ ♣ ou code 0..2)"""
+        code = symbol if isinstance(symbol, (int, np.integer)) else SYMBOL_CODES.get(symbol, 2)
+        with self._lock:
+            # Seuls les ordres dont le contexte est complet sont comptés
+            counts, context = self._counts, self._context
+            for order in range(min(self._seen, self.max_order) + 1):
+                counts[self._starts[order] + context % self._powers[order] * self.alphabet + code] += 1
+            self._context = (context * self.alphabet + code) % self._powers[self.max_order]
+            self._seen += 1
+
+    def update_many(self, symbols):
+        """Ajoute une séquence de symboles en une passe vectorisée par ordre (amorçage)"""
+        codes = np.fromiter((symbol if isinstance(symbol, (int, np.integer)) else SYMBOL_CODES.get(symbol, 2)
+                             for symbol in symbols), dtype=np.int64)
+        if not len(codes):
+            return
+        with self._lock:
+            # Les symboles précédents (contexte courant) précèdent la nouvelle séquence
+            known = min(self._seen, self.max_order)
+            previous = [(self._context // self.alphabet ** m) % self.alphabet for m in range(known - 1, -1, -1)]
+            full = np.concatenate([np.asarray(previous, dtype=np.int64), codes])
+            positions = np.arange(known, len(full))
+            context = np.zeros(len(codes), dtype=np.int64)
+            for order in range(self.max_order + 1):
+                if order:
+                    # Ajoute le symbole situé `order` positions avant (poids 3^(order-1))
+                    valid = positions - order >= 0
+                    context[valid] += full[positions[valid] - order] * self.alphabet ** (order - 1)
+                complete = self._seen + np.arange(len(codes)) >= order
+                slots = self._starts[order] + context[complete] * self.alphabet + codes[complete]
+                self._counts += np.bincount(slots, minlength=len(self._counts))
+            for code in full[-self.max_order:] if self.max_order else []:
+                self._context = (self._context * self.alphabet + int(code)) % self._powers[self.max_order]
+            self._seen += len(codes)
+
+    def counts(self, order, context=None):
+        """Comptes des symboles suivants pour un contexte d'ordre `order` (courant par défaut)"""
+        with self._lock:
+            if context is None:
+                context = self._context_of_order(order)
+            start = self._starts[order] + context * self.alphabet
+            return self._counts[start:start + self.alphabet].copy()
+
+    def probabilities(self):
+        """(probabilités du prochain symbole, ordre utilisé) avec lissage de Laplace
+
+        L'ordre retenu est le plus long dont le contexte courant a au moins
+        `min_count` observations (ordre 0 = fréquences globales).
+        """
+        with self._lock:
+            for order in range(min(self._seen, self.max_order), -1, -1):
+                start = self._starts[order] + self._context_of_order(order) * self.alphabet
+                counts = self._counts[start:start + self.alphabet]
+                total = int(counts.sum())
+                if total >= self.min_count or order == 0:
+                    return (counts + 1) / (total + self.alphabet), order
+        return np.full(self.alphabet, 1.0 / self.alphabet), 0
+
+    def predict(self):
+        """Prédiction au format JSON: symbole le plus probable et probabilités par symbole"""
+        probabilities, order = self.probabilities()
+        best = int(np.argmax(probabilities))
+        return {
+            "symbol": SYMBOLS[best],
+            "probabilities": {symbol: float(p) for symbol, p in zip(SYMBOLS, probabilities)},
+            "order": order,
+            "observations": self._seen
+        }
+
+    def save(self, path):
+        """Point de contrôle atomique (fichier .npz)"""
+        with self._lock:
+            counts = self._counts.copy()
+            state = np.array([NGRAM_FORMAT_VERSION, self.max_order, self._context, self._seen], dtype=np.int64)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Fichier temporaire propre à cet appel: plusieurs workers gunicorn peuvent sauvegarder ensemble
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, counts=counts, state=state)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, min_count=5, max_order=None):
+        """Recharge un point de contrôle; ValueError si son ordre diffère de `max_order` (si donné)"""
+        with np.load(path) as checkpoint:
+            version, saved_order, context, seen = (int(value) for value in checkpoint['state'])
+            if version != NGRAM_FORMAT_VERSION:
+                raise ValueError(f"Version de point de contrôle n-grammes inconnue: {version}")
+            if max_order is not None and saved_order != max_order:
+                raise ValueError(f"Ordre du point de contrôle ({saved_order}) différent de l'ordre demandé ({max_order})")
+            max_order = saved_order
+            model = cls(max_order=max_order, min_count=min_count)
+            if checkpoint['counts'].shape != model._counts.shape:
+                raise ValueError("Point de contrôle n-grammes incohérent")
+            model._counts[:] = checkpoint['counts']
+        model._context, model._seen = context, seen
+        return model
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import zlib
+
+# Table des rounds Snake_win sans identifiant de table (jeu 236 de l'API v2)
+DEFAULT_TABLE = '236'
+
+def table_of_round(round_data):
+    """Table d'un round de l'API v2 (table_id s'il est fourni, sinon le jeu)"""
+    round_info = round_data.get('round', {})
+    table = round_info.get('table_id', round_info.get('game_id'))
+    return str(table) if table is not None else DEFAULT_TABLE
+
+def table_of_payload(raw_payload):
+    """Table d'un round stocké: table_id/game_id de l'événement de son raw_payload (comme
+    table_of_round), table par défaut si le payload n'en nomme pas"""
+    try:
+        event = json.loads(raw_payload).get('event') or {}
+        table = event.get('table_id', event.get('game_id'))
+    except (TypeError, ValueError, AttributeError):
+        return DEFAULT_TABLE
+    return str(table) if table is not None else DEFAULT_TABLE
+
+def table_of_event(event):
+    """Table d'un événement de l'API live: le nom de la ligue (champ 'L') désigne la table"""
+    return str(event.get('eventName') or 'Unknown Event')
+
+def shard_of(table, shard_count):
+    """Shard d'une table, stable d'un processus à l'autre (crc32, pas hash())"""
+    return zlib.crc32(str(table).encode('utf-8')) % shard_count
+
+class ShardAssignment:
+    """Tables traitées par ce processus: celles dont le shard vaut `index` parmi `count`"""
+
+    def __init__(self, count=1, index=0):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard {index} hors de [0, {count})")
+        self.count = count
+        self.index = index
+
+    @classmethod
+    def from_env(cls):
+        return cls(count=int(os.environ.get('TABLE_SHARDS', 1)),
+                   index=int(os.environ.get('TABLE_SHARD_INDEX', 0)))
+
+    def owns(self, table):
+        return self.count == 1 or shard_of(table, self.count) == self.index
+
+    def describe(self):
+        return {'shards': self.count, 'shard_index': self.index}
+
+class TableStates:
+    """États de prédiction par table, créés à la première donnée reçue pour la table
+
+    Chaque table a son propre état (historique, rounds courants, prédictions):
+    un round ne touche que l'état de sa table, le coût par round ne dépend
+    pas du nombre de tables.
+    """
+
+    def __init__(self, factory, assignment=None):
+        self._factory = factory
+        self.assignment = assignment or ShardAssignment()
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, table):
+        return table in self._states
+
+    def get(self, table):
+        """État de la table (créé si besoin)"""
+        state = self._states.get(table)
+        if state is None:
+            with self._lock:
+                state = self._states.get(table)
+                if state is None:
+                    state = self._states[table] = self._factory(table)
+        return state
+
+    def find(self, table):
+        return self._states.get(table)
+
+    def items(self):
+        """Copie de (table, état): sûre pendant les ajouts du thread de polling"""
+        with self._lock:
+            return list(self._states.items())
+
+    def tables(self):
+        return [table for table, _ in self.items()]
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+class ThreadSampler:
+    """Profileur par échantillonnage des threads de fond (pollers, prédiction)
+
+    Un thread daemon relève `hz` fois par seconde la pile des threads dont le
+    nom commence par un des `thread_prefixes` (sys._current_frames) et agrège
+    les piles en format replié (flamegraph.pl / speedscope), racine = nom du
+    thread. Aucun hook n'est posé sur les threads observés.
+    """
+
+    def __init__(self, thread_prefixes=('realtime-', 'snake-win-', 'model-watcher', 'ingest-'), hz=10,
+                 max_depth=64, max_stacks=5000):
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.hz = float(hz)
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.is_running = False
+        self._lock = threading.Lock()
+        self._stacks = defaultdict(int)
+        self._samples = 0
+        self._dropped = 0
+        self._started_at = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(hz=float(os.environ.get('THREAD_SAMPLER_HZ', 10)))
+
+    def _matches(self, name):
+        return name.startswith(self.thread_prefixes)
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _stack(self, thread_name, frame):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._frame_label(frame))
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ';'.join(reversed(labels))
+
+    def sample_once(self):
+        """Relève une pile par thread observé"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()
+                 if self._matches(thread.name)}
+        if not names:
+            return 0
+        frames = sys._current_frames()
+        stacks = [self._stack(names[ident], frame) for ident, frame in frames.items() if ident in names]
+        with self._lock:
+            for stack in stacks:
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += 1
+                else:
+                    self._dropped += 1
+            self._samples += 1
+        return len(stacks)
+
+    def _run(self):
+        period = 1.0 / self.hz
+        next_sample = time.monotonic()
+        while self.is_running:
+            try:
+                self.sample_once()
+            except Exception:
+                pass
+            next_sample += period
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+    def start(self):
+        if self.is_running or self.hz <= 0:
+            return None
+        self.is_running = True
+        self._started_at = time.time()
+        thread = threading.Thread(target=self._run, name='thread-sampler')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.is_running = False
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+            self._dropped = 0
+            self._started_at = time.time()
+
+    def collapsed(self, thread_prefix=None):
+        """Piles repliées `thread;fichier:fonction;... nombre_d_échantillons`"""
+        with self._lock:
+            items = sorted(self._stacks.items())
+        if thread_prefix:
+            items = [(stack, count) for stack, count in items if stack.startswith(thread_prefix)]
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def get_status(self):
+        with self._lock:
+            threads = sorted({stack.split(';', 1)[0] for stack in self._stacks})
+            return {
+                'is_running': self.is_running,
+                'hz': self.hz,
+                'samples': self._samples,
+                'distinct_stacks': len(self._stacks),
+                'dropped_samples': self._dropped,
+                'threads': threads,
+                'since': self._started_at
+            }
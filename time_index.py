@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import threading
+import time
+
+# Horodatage invalide (NaT): trié avant toutes les dates
+NAT = np.iinfo(np.int64).min
+
+def to_ns(values):
+    """Convertit des dates (chaînes ISO, datetime...) en int64 ns UTC, NaT → NAT"""
+    return pd.DatetimeIndex(
+        pd.to_datetime(pd.Series(values), errors='coerce', utc=True, format='ISO8601')
+    ).as_unit('ns').asi8
+
+def timestamp_ns(value):
+    """Borne de requête en ns UTC: date ISO (naïve = UTC), datetime ou epoch en secondes"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value * 1_000_000_000)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.as_unit('ns').value
+
+class TimeIndex:
+    """Index trié des horodatages (int64 ns) avec l'offset de chaque ligne
+
+    Les clés sont triées sur (horodatage, id, offset); `offsets` donne la
+    position de chaque ligne dans sa source (DataFrame, cache de features) et
+    départage les lignes de même horodatage et même id (options d'une même
+    sauvegarde): la clé complète est unique pour des offsets distincts. Les requêtes
+    par plage sont des recherches binaires; les ajouts en ordre chronologique
+    (cas du polling) étendent les tableaux sans retri.
+    """
+
+    def __init__(self, timestamps=None, ids=None, offsets=None):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._rows = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._offsets = np.empty(0, dtype=np.int64)
+        if timestamps is not None:
+            self.append(timestamps, ids, offsets)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def keys(self):
+        return self._keys[:self._size]
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def offsets(self):
+        return self._offsets[:self._size]
+
+    @property
+    def rows(self):
+        """Nombre de lignes indexées (prochain offset par défaut)"""
+        return self._rows
+
+    def _reserve(self, size):
+        if size <= len(self._keys):
+            return
+        capacity = max(size, 2 * len(self._keys), 1024)
+        for name in ('_keys', '_ids', '_offsets'):
+            grown = np.empty(capacity, dtype=np.int64)
+            grown[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, grown)
+
+    def append(self, timestamps, ids=None, offsets=None):
+        """Indexe de nouvelles lignes (offsets par défaut: à la suite des existants)"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        count = len(timestamps)
+        if count == 0:
+            return
+        with self._lock:
+            if offsets is None:
+                offsets = np.arange(self.rows, self.rows + count, dtype=np.int64)
+            offsets = np.asarray(offsets, dtype=np.int64)
+            self._rows = max(self._rows, int(offsets.max()) + 1)
+            ids = offsets if ids is None else np.asarray(ids, dtype=np.int64)
+
+            order = np.lexsort((offsets, ids, timestamps))
+            timestamps, ids, offsets = timestamps[order], ids[order], offsets[order]
+            last = self._size - 1
+            in_order = self._size == 0 or (timestamps[0], ids[0], offsets[0]) > (
+                self._keys[last], self._ids[last], self._offsets[last])
+            if in_order:
+                self._reserve(self._size + count)
+                end = self._size + count
+                self._keys[self._size:end] = timestamps
+                self._ids[self._size:end] = ids
+                self._offsets[self._size:end] = offsets
+                self._size = end
+                return
+
+            # Lignes en retard: fusion complète (rare)
+            keys = np.concatenate([self.keys, timestamps])
+            all_ids = np.concatenate([self.ids, ids])
+            all_offsets = np.concatenate([self.offsets, offsets])
+            order = np.lexsort((all_offsets, all_ids, keys))
+            self._keys, self._ids, self._offsets = keys[order], all_ids[order], all_offsets[order]
+            self._size = len(keys)
+
+    def snapshot(self):
+        """(clés, ids, offsets) cohérents entre eux, même pendant un ajout concurrent"""
+        with self._lock:
+            size = self._size
+            return self._keys[:size], self._ids[:size], self._offsets[:size]
+
+    @staticmethod
+    def _bounds(keys, start, end):
+        lo = 0 if start is None else int(np.searchsorted(keys, start, 'left'))
+        hi = len(keys) if end is None else int(np.searchsorted(keys, end, 'right'))
+        return lo, max(lo, hi)
+
+    def bounds(self, start=None, end=None):
+        """Positions [lo, hi) des lignes avec start <= horodatage <= end (ns, bornes optionnelles)"""
+        keys, _, _ = self.snapshot()
+        return self._bounds(keys, start, end)
+
+    @staticmethod
+    def _position(keys, ids, offsets, timestamp, row_id, offset=None):
+        left = int(np.searchsorted(keys, timestamp, 'left'))
+        right = int(np.searchsorted(keys, timestamp, 'right'))
+        first = left + int(np.searchsorted(ids[left:right], row_id, 'left'))
+        if offset is None:
+            return first
+        last = left + int(np.searchsorted(ids[left:right], row_id, 'right'))
+        return first + int(np.searchsorted(offsets[first:last], offset, 'left'))
+
+    def position(self, timestamp, row_id, offset=None):
+        """Nombre de lignes strictement avant la clé (timestamp, id[, offset])"""
+        keys, ids, offsets = self.snapshot()
+        return self._position(keys, ids, offsets, timestamp, row_id, offset)
+
+    def range(self, start=None, end=None):
+        """Offsets des lignes de la plage, en ordre chronologique"""
+        keys, _, offsets = self.snapshot()
+        lo, hi = self._bounds(keys, start, end)
+        return offsets[lo:hi]
+
+    def page(self, limit, start=None, end=None, before=None):
+        """Pagination keyset: les `limit` dernières lignes de la plage avant la clé `before`
+
+        Retourne (offsets en ordre chronologique, clé (timestamp, id, offset) de
+        la page plus ancienne ou None).
+        """
+        keys, ids, offsets = self.snapshot()
+        lo, hi = self._bounds(keys, start, end)
+        if before is not None:
+            hi = min(hi, self._position(keys, ids, offsets, *before))
+        first = max(lo, hi - limit)
+        if first >= hi:
+            return offsets[:0], None
+        next_key = (int(keys[first]), int(ids[first]), int(offsets[first])) if first > lo else None
+        return offsets[first:hi], next_key
+
+    def count(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return hi - lo
+
+    def last(self, seconds, now=None):
+        """Offsets des lignes des `seconds` dernières secondes (par rapport à `now`, epoch s)"""
+        now_ns = time.time_ns() if now is None else timestamp_ns(now)
+        return self.range(now_ns - int(seconds * 1_000_000_000), now_ns)
@@ -2,109 +2,208 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
+from sklearn.model_selection import train_test_split, TimeSeriesSplit
+from sklearn.metrics import classification_report, accuracy_score, f1_score
+from sklearn.utils.class_weight import compute_sample_weight
+from concurrent.futures import ProcessPoolExecutor
 import joblib
 import json
+import pickle
 from datetime import datetime
+import argparse
+import itertools
 import os
+import random
+import shutil
+import tempfile
+import time
+from feature_cache import FeatureCache
+from storage import open_storage
+from time_index import timestamp_ns
+from model_registry import FlatForest, FlatScaler, ModelRegistry
+from model_compaction import compact_forest, compaction_report
+from features import (
+    BASE_FEATURE_COLUMNS, FEATURE_VERSION, RESULT_MAP,
+    compute_sequential_features, extract_row_features
+)
+
+# Hyperparamètres par défaut de la forêt
+FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+    'class_weight': 'balanced'
+}
+
+# Espace de recherche des hyperparamètres
+SEARCH_SPACE = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [4, 6, 8, 10, 14, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 0.5, None]
+}
+
+def share_training_arrays(X, y, directory):
+    """Écrit X et y en .npy pour que les workers les mappent en mémoire"""
+    x_path = os.path.join(directory, 'X.npy')
+    y_path = os.path.join(directory, 'y.npy')
+    np.save(x_path, np.ascontiguousarray(X, dtype=np.float64))
+    np.save(y_path, np.ascontiguousarray(y, dtype=np.int64))
+    return x_path, y_path
+
+def _train_fold(x_path, y_path, fold, train_end, test_end, params):
+    """Entraîne et évalue un fold walk-forward dans un processus worker"""
+    start = time.perf_counter()
+    # Copie partagée: les pages du fichier sont mappées, pas copiées
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[:train_end])
+    X_test = scaler.transform(X[train_end:test_end])
+    y_train = np.asarray(y[:train_end])
+    y_test = np.asarray(y[train_end:test_end])
+    
+    model = RandomForestClassifier(**params)
+    fit_start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - fit_start
+    
+    y_pred = model.predict(X_test)
+    return {
+        'fold': fold,
+        'train_size': int(train_end),
+        'test_size': int(test_end - train_end),
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'f1_macro': float(f1_score(y_test, y_pred, average='macro', zero_division=0)),
+        'fit_time': fit_time,
+        'wall_time': time.perf_counter() - start
+    }
+
+def _evaluate_candidate(x_path, y_path, candidate_id, params, train_start, train_end, latency_repeats=200):
+    """Entraîne un candidat et mesure accuracy, temps d'entraînement et latence d'inférence unitaire"""
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[train_start:train_end])
+    X_test = scaler.transform(X[train_end:])
+    y_train = np.asarray(y[train_start:train_end])
+    y_test = np.asarray(y[train_end:])
+    
+    model = RandomForestClassifier(**dict(FOREST_PARAMS, **params, n_jobs=1))
+    fit_start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - fit_start
+    
+    y_pred = model.predict(X_test)
+    
+    # Latence d'une prédiction isolée, comme dans les prédicteurs (transform + predict_proba)
+    row = np.asarray(X[train_end:train_end + 1])
+    model.predict_proba(scaler.transform(row))
+    timings = []
+    for _ in range(latency_repeats):
+        start = time.perf_counter()
+        model.predict_proba(scaler.transform(row))
+        timings.append(time.perf_counter() - start)
+    
+    return {
+        'candidate': candidate_id,
+        'params': params,
+        'train_size': int(train_end - train_start),
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'f1_macro': float(f1_score(y_test, y_pred, average='macro', zero_division=0)),
+        'fit_time': fit_time,
+        'latency_us': float(np.median(timings) * 1e6),
+        'latency_p95_us': float(np.percentile(timings, 95) * 1e6),
+        'n_nodes': int(sum(tree.tree_.node_count for tree in model.estimators_))
+    }
+
+def full_model_path(model_path):
+    """Chemin de la forêt sklearn complète associée à un artefact compacté"""
+    root, ext = os.path.splitext(model_path)
+    return f'{root}.full{ext}'
+
+def pareto_frontier(results):
+    """Candidats non dominés: aucun autre n'est à la fois plus rapide et plus précis"""
+    frontier = []
+    best_accuracy = -1.0
+    for result in sorted(results, key=lambda r: (r['latency_us'], -r['accuracy'])):
+        if result['accuracy'] > best_accuracy:
+            frontier.append(result)
+            best_accuracy = result['accuracy']
+    return frontier
 
 class BaccaratModelTrainer:
-    def __init__(self, csv_path='data/twentyone_rounds.csv'):
-        self.csv_path = csv_path
+    def __init__(self, csv_path='data/twentyone_rounds.csv', storage=None):
+        self.storage = storage or open_storage(csv_path=csv_path)
+        # Chemin du CSV source du cache de features
+        self.csv_path = getattr(self.storage, 'csv_path', csv_path)
         self.data = None
         self.model = None
         self.scaler = None
         self.feature_columns = []
+        self.training_rows = 0
+        self.training_window = None
+        self.version = 0
+        self.data_hash = None
+        self.metrics = {}
+        self.compact_model = None
         
     def load_and_preprocess_data(self):
         print("Chargement des données...")
         try:
-            self.data = pd.read_csv(self.csv_path, header=None, 
-                                  names=['id', 'event_id', 'collected_at', 'option_type', 'odd', 'round_state', 'raw_payload'])
+            self.data = self.storage.read_all()
             print(f"Chargé {len(self.data)} enregistrements")
         except Exception as e:
-            print(f"Erreur chargement CSV: {e}")
+            print(f"Erreur chargement données: {e}")
             return False
             
         # Nettoyage et prétraitement
         processed = self.data.copy()
         
-        # Extraction des scores depuis round_state
-        def extract_features(row):
-            try:
-                # Gérer les différents types de données
-                round_state_str = str(row['round_state']) if pd.notna(row['round_state']) else '{}'
-                raw_payload_str = str(row['raw_payload']) if pd.notna(row['raw_payload']) else '{}'
-                
-                round_state = json.loads(round_state_str) if round_state_str else {}
-                raw_payload = json.loads(raw_payload_str) if raw_payload_str else {}
-                
-                features = {
-                    'player_score': round_state.get('playerScore', 0),
-                    'banker_score': round_state.get('bankerScore', 0),
-                    'round_number': round_state.get('roundNumber', 0),
-                    'is_live': 1 if round_state.get('isLive', False) else 0,
-                    'odd_value': float(row['odd']) if pd.notna(row['odd']) and str(row['odd']) != 'null' else 1.0
-                }
-                
-                # Features temporelles
-                timestamp = pd.to_datetime(row['collected_at'], errors='coerce')
-                if pd.notna(timestamp):
-                    features.update({
-                        'hour': timestamp.hour,
-                        'day_of_week': timestamp.dayofweek,
-                        'minute': timestamp.minute
-                    })
-                else:
-                    features.update({'hour': 0, 'day_of_week': 0, 'minute': 0})
-                
-                # Extraire les cotes depuis bettingOptions
-                betting_options = raw_payload.get('bettingOptions', [])
-                if isinstance(betting_options, list):
-                    odds_map = {}
-                    for option in betting_options:
-                        if isinstance(option, dict):
-                            odds_map[option.get('optionType', '')] = option.get('odd', 1.0)
-                    
-                    features.update({
-                        'player_win_odd': odds_map.get('Player Win', 1.0),
-                        'banker_win_odd': odds_map.get('Banker Win', 1.0),
-                        'tie_odd': odds_map.get('Tie', 1.0)
-                    })
-                else:
-                    features.update({
-                        'player_win_odd': 1.0,
-                        'banker_win_odd': 1.0,
-                        'tie_odd': 1.0
-                    })
-                
-                return features
-                
-            except Exception as e:
-                print(f"Erreur extraction features: {e}")
-                return {
-                    'player_score': 0, 'banker_score': 0, 'round_number': 0,
-                    'is_live': 0, 'odd_value': 1.0, 'hour': 0, 
-                    'day_of_week': 0, 'minute': 0,
-                    'player_win_odd': 1.0, 'banker_win_odd': 1.0, 'tie_odd': 1.0
-                }
-        
         # Appliquer l'extraction de features
-        features_df = processed.apply(extract_features, axis=1, result_type='expand')
+        features_df = processed.apply(extract_row_features, axis=1, result_type='expand')
         
         # Ajouter les features au dataframe
         processed = pd.concat([processed, features_df], axis=1)
         
         # Conversion du résultat en numérique
-        result_map = {'Player Win': 0, 'Banker Win': 1, 'Tie': 2, 'Player Pair': 3, 'Banker Pair': 4}
-        processed['target'] = processed['option_type'].map(result_map).fillna(-1)
+        processed['target'] = processed['option_type'].map(RESULT_MAP).fillna(-1)
         
         # Filtrer les résultats valides
         processed = processed[processed['target'] != -1]
         
         print(f"Données prétraitées: {len(processed)} enregistrements valides")
         self.processed_data = processed
+        self.training_rows = len(processed)
+        return True
+    
+    def load_cached_features(self, cache_dir='data/feature_cache', window_size=5, start=None, end=None):
+        """Charge les features depuis le cache persistant (seules les nouvelles lignes sont traitées)
+        
+        `start` / `end` (ns UTC) limitent l'entraînement à une fenêtre temporelle (backtesting).
+        Un modèle fenêtré n'a pas de `training_rows`: il ne peut pas être mis à jour par --incremental.
+        """
+        try:
+            cache = FeatureCache(self.csv_path, cache_dir)
+            self.processed_data = cache.load_frame(window_size=window_size, start=start, end=end)
+            manifest = cache.update()
+            self.data_hash = manifest['source_sha256']
+            if start is None and end is None:
+                # Nombre de lignes du cache (ordre du CSV), point de départ de --incremental
+                self.training_rows = manifest['rows']
+                self.training_window = None
+            else:
+                self.training_rows = 0
+                self.training_window = {'start': start, 'end': end}
+        except Exception as e:
+            print(f"Erreur cache features: {e}")
+            return False
+        print(f"Données prétraitées: {len(self.processed_data)} enregistrements valides (cache)")
         return True
     
     def create_sequential_features(self, window_size=5):
@@ -114,32 +213,10 @@ class BaccaratModelTrainer:
         data = self.processed_data.copy()
         data = data.sort_values('collected_at')
         
-        # Features de séquence pour chaque type de résultat
-        result_types = ['Player Win', 'Banker Win', 'Tie']
-        
-        for result_type in result_types:
-            # Créer une colonne binaire pour ce résultat
-            data[f'is_{result_type.replace(" ", "_")}'] = (data['option_type'] == result_type).astype(int)
-            
-            # Moyenne mobile sur la fenêtre
-            data[f'{result_type.replace(" ", "_")}_ma_{window_size}'] = (
-                data[f'is_{result_type.replace(" ", "_")}']
-                .rolling(window=window_size, min_periods=1)
-                .mean()
-            )
-        
-        # Compter les occurrences consécutives
-        for result_type in result_types:
-            col_name = f'consecutive_{result_type.replace(" ", "_")}'
-            data[col_name] = 0
-            count = 0
-            
-            for i in range(len(data)):
-                if data.iloc[i]['option_type'] == result_type:
-                    count += 1
-                else:
-                    count = 0
-                data.loc[data.index[i], col_name] = count
+        # Moyennes mobiles et occurrences consécutives pour chaque type de résultat
+        sequential = compute_sequential_features(data['option_type'].values, window_size)
+        for col, values in sequential.items():
+            data[col] = values
         
         self.processed_data = data
         print("Features séquentielles créées")
@@ -147,11 +224,7 @@ class BaccaratModelTrainer:
     def prepare_training_data(self):
         """Prépare les données pour l'entraînement"""
         # Colonnes de features
-        feature_cols = [
-            'player_score', 'banker_score', 'round_number', 'is_live', 'odd_value',
-            'hour', 'day_of_week', 'minute',
-            'player_win_odd', 'banker_win_odd', 'tie_odd'
-        ]
+        feature_cols = list(BASE_FEATURE_COLUMNS)
         
         # Ajouter les features séquentielles si elles existent
         sequential_cols = [col for col in self.processed_data.columns 
@@ -172,7 +245,7 @@ class BaccaratModelTrainer:
         
         return X, y
     
-    def train_model(self):
+    def train_model(self, params=None):
         """Entraîne le modèle de prédiction"""
         print("Préparation des données d'entraînement...")
         
@@ -190,22 +263,21 @@ class BaccaratModelTrainer:
         
         # Entraînement du modèle
         print("Entraînement du modèle...")
-        self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            class_weight='balanced'
-        )
+        self.model = RandomForestClassifier(**dict(FOREST_PARAMS, **(params or {}), n_jobs=-1))
         
         self.model.fit(X_train_scaled, y_train)
+        self.version += 1
+        # Prédiction d'une seule ligne: le parallélisme ne fait qu'ajouter du surcoût
+        self.model.n_jobs = 1
         
         # Évaluation
         y_pred = self.model.predict(X_test_scaled)
         accuracy = accuracy_score(y_test, y_pred)
         
         print(f"Accuracy: {accuracy:.3f}")
+        self.metrics = {'accuracy': float(accuracy), 'test_size': int(len(y_test))}
+        self.X_test_scaled = X_test_scaled
+        self.y_test = y_test.values
         print("\nRapport de classification:")
         print(classification_report(y_test, y_pred, 
                                   target_names=['Player Win', 'Banker Win', 'Tie', 'Player Pair', 'Banker Pair']))
@@ -221,19 +293,334 @@ class BaccaratModelTrainer:
         
         return accuracy
     
+    def walk_forward_validation(self, n_splits=5, n_jobs=None):
+        """Validation walk-forward: chaque fold s'entraîne sur le passé et teste sur la suite"""
+        print("Validation walk-forward...")
+        
+        X, y = self.prepare_training_data()
+        
+        # Ordre chronologique strict, sans mélange
+        order = np.argsort(self.processed_data['collected_at'].astype(str).values, kind='stable')
+        X = X.values[order]
+        y = y.values[order]
+        
+        splits = [(train_idx[-1] + 1, test_idx[-1] + 1)
+                  for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X)]
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(splits))
+        
+        # Un seul arbre par processus à la fois: le parallélisme se fait entre folds
+        params = dict(FOREST_PARAMS, n_jobs=1)
+        shared_dir = tempfile.mkdtemp(prefix='walk_forward_')
+        start = time.perf_counter()
+        try:
+            x_path, y_path = share_training_arrays(X, y, shared_dir)
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    executor.submit(_train_fold, x_path, y_path, fold, train_end, test_end, params)
+                    for fold, (train_end, test_end) in enumerate(splits)
+                ]
+                folds = [future.result() for future in futures]
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+        total_wall_time = time.perf_counter() - start
+        
+        accuracies = [fold['accuracy'] for fold in folds]
+        report = {
+            'n_splits': len(splits),
+            'n_jobs': n_jobs,
+            'folds': folds,
+            'mean_accuracy': float(np.mean(accuracies)),
+            'std_accuracy': float(np.std(accuracies)),
+            'total_wall_time': total_wall_time,
+            'sequential_fit_time': float(sum(fold['wall_time'] for fold in folds))
+        }
+        
+        for fold in folds:
+            print(f"Fold {fold['fold']}: train={fold['train_size']} test={fold['test_size']} "
+                  f"accuracy={fold['accuracy']:.3f} f1={fold['f1_macro']:.3f} ({fold['wall_time']:.2f}s)")
+        print(f"Accuracy moyenne: {report['mean_accuracy']:.3f} (+/- {report['std_accuracy']:.3f})")
+        print(f"Temps total: {total_wall_time:.2f}s sur {n_jobs} processus "
+              f"(séquentiel: {report['sequential_fit_time']:.2f}s)")
+        
+        return report
+    
+    def search_hyperparameters(self, mode='random', n_candidates=20, n_jobs=None,
+                               test_size=0.2, halving_factor=3, seed=42):
+        """Recherche d'hyperparamètres (grid, random ou successive halving) en parallèle
+        
+        Chaque candidat est évalué sur les derniers `test_size` % des données
+        (ordre chronologique) avec accuracy, temps d'entraînement et latence unitaire.
+        """
+        print(f"Recherche d'hyperparamètres ({mode})...")
+        
+        X, y = self.prepare_training_data()
+        order = np.argsort(self.processed_data['collected_at'].astype(str).values, kind='stable')
+        X = X.values[order]
+        y = y.values[order]
+        train_end = int(len(X) * (1 - test_size))
+        
+        keys = list(SEARCH_SPACE)
+        grid = [dict(zip(keys, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+        if mode == 'grid':
+            candidates = grid
+        elif mode in ('random', 'halving'):
+            candidates = random.Random(seed).sample(grid, min(n_candidates, len(grid)))
+        else:
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        
+        n_jobs = n_jobs or os.cpu_count() or 1
+        shared_dir = tempfile.mkdtemp(prefix='hyperparameter_search_')
+        start = time.perf_counter()
+        results = []
+        try:
+            x_path, y_path = share_training_arrays(X, y, shared_dir)
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                if mode == 'halving':
+                    # Ressource = nombre de lignes d'entraînement les plus récentes
+                    n_rounds = max(1, int(np.ceil(np.log(len(candidates)) / np.log(halving_factor))))
+                    survivors = list(enumerate(candidates))
+                    for round_index in range(n_rounds + 1):
+                        n_samples = max(100, train_end // halving_factor ** (n_rounds - round_index))
+                        train_start = max(0, train_end - n_samples)
+                        futures = [
+                            executor.submit(_evaluate_candidate, x_path, y_path, candidate_id,
+                                            params, train_start, train_end)
+                            for candidate_id, params in survivors
+                        ]
+                        round_results = [future.result() for future in futures]
+                        for result in round_results:
+                            result['round'] = round_index
+                        results.extend(round_results)
+                        if len(survivors) == 1 or train_start == 0:
+                            break
+                        round_results.sort(key=lambda r: r['accuracy'], reverse=True)
+                        keep = max(1, len(survivors) // halving_factor)
+                        survivors = [(r['candidate'], r['params']) for r in round_results[:keep]]
+                    # Seul le dernier tour (données complètes) est comparable
+                    last_round = max(r['round'] for r in results)
+                    final_results = [r for r in results if r['round'] == last_round]
+                else:
+                    futures = [
+                        executor.submit(_evaluate_candidate, x_path, y_path, candidate_id,
+                                        params, 0, train_end)
+                        for candidate_id, params in enumerate(candidates)
+                    ]
+                    results = [future.result() for future in futures]
+                    final_results = results
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+        
+        frontier = pareto_frontier(final_results)
+        report = {
+            'mode': mode,
+            'n_jobs': n_jobs,
+            'n_evaluations': len(results),
+            'total_wall_time': time.perf_counter() - start,
+            'results': results,
+            'frontier': frontier,
+            'best_accuracy': max(final_results, key=lambda r: r['accuracy'])
+        }
+        
+        print("\nFrontière latence/accuracy:")
+        for result in frontier:
+            print(f"  accuracy={result['accuracy']:.3f} latence={result['latency_us']:.0f}µs "
+                  f"fit={result['fit_time']:.2f}s {result['params']}")
+        print(f"{len(results)} évaluations en {report['total_wall_time']:.2f}s sur {n_jobs} processus")
+        
+        return report
+    
+    def compact(self, leaf_tolerance=1.0 / 255, duplicate_tolerance=0.0):
+        """Compacte la forêt entraînée et affiche l'impact sur taille, accuracy et latence
+        
+        Le modèle sklearn complet reste disponible (self.model) pour les mises à jour
+        incrémentales; save_model publie la version compacte.
+        """
+        print("Compaction du modèle...")
+        original = FlatForest.from_sklearn(self.model)
+        self.compact_model = compact_forest(original, X_ref=self.X_test_scaled,
+                                            leaf_tolerance=leaf_tolerance,
+                                            duplicate_tolerance=duplicate_tolerance)
+        report = compaction_report(original, self.compact_model, self.X_test_scaled, self.y_test)
+        
+        # Taille et temps de chargement de l'artefact pickle (ce que lit load_trained_model)
+        for key, model in (('original', self.model), ('compact', self.compact_model)):
+            payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+            start = time.perf_counter()
+            pickle.loads(payload)
+            report[f'{key}_pickle_bytes'] = len(payload)
+            report[f'{key}_load_time'] = time.perf_counter() - start
+        
+        print(f"Arbres: {report['trees'][0]} -> {report['trees'][1]}, "
+              f"noeuds: {report['nodes'][0]} -> {report['nodes'][1]}")
+        print(f"Artefact: {report['original_pickle_bytes'] / 1024:.0f} Ko -> "
+              f"{report['compact_pickle_bytes'] / 1024:.0f} Ko, chargement "
+              f"{report['original_load_time'] * 1000:.1f}ms -> {report['compact_load_time'] * 1000:.1f}ms")
+        print(f"Accuracy: {report['accuracy'][0]:.4f} -> {report['accuracy'][1]:.4f} "
+              f"(delta {report['accuracy_delta']:+.4f}, accord {report['prediction_agreement']:.4f})")
+        print(f"Latence unitaire: {report['latency_us'][0]:.0f}µs -> {report['latency_us'][1]:.0f}µs")
+        
+        self.metrics['compaction'] = report
+        return report
+    
+    def update_model(self, model_path='models/baccarat_model.pkl', cache_dir='data/feature_cache',
+                     trees_per_update=10, max_estimators=None, min_new_rows=50, window_size=5,
+                     registry_dir=None, duplicate_tolerance=0.0):
+        """Met à jour le modèle avec les seuls rounds ingérés depuis la dernière version
+        
+        De nouveaux arbres sont ajoutés par warm start sur les nouvelles lignes
+        (le scaler est conservé pour que les anciens arbres restent valides).
+        Avec `max_estimators`, les arbres les plus anciens sont retirés.
+        """
+        # Les mises à jour partent de la forêt sklearn complète, pas de l'artefact compacté
+        full_path = full_model_path(model_path)
+        if not os.path.exists(full_path):
+            full_path = None
+        elif not self._full_model_matches(full_path, model_path):
+            print(f"{full_path} ne correspond pas à {model_path} (version/training_rows): ignoré")
+            full_path = None
+        if not self.load_model(full_path or model_path):
+            return None
+        if not isinstance(self.model, RandomForestClassifier):
+            print("Modèle compacté sans forêt complète: un entraînement complet est nécessaire")
+            return None
+        if self.training_window:
+            print(f"Modèle entraîné sur une fenêtre temporelle {self.training_window}: "
+                  "un entraînement complet est nécessaire")
+            return None
+        if not self.training_rows:
+            print("Modèle sans 'training_rows': un entraînement complet est nécessaire")
+            return None
+        
+        cache = FeatureCache(self.csv_path, cache_dir)
+        manifest = cache.update()
+        total_rows = manifest['rows']
+        new_rows = total_rows - self.training_rows
+        if new_rows < min_new_rows:
+            print(f"{new_rows} nouveaux rounds (minimum {min_new_rows}): pas de mise à jour")
+            return None
+        
+        batch = cache.frame_for_rows(self.training_rows, total_rows, window_size)
+        is_anchor = np.zeros(len(batch), dtype=bool)
+        
+        # Le warm start exige les mêmes classes: une ligne d'ancrage par classe absente
+        missing = [c for c in self.model.classes_ if c not in set(batch['target'])]
+        anchors = []
+        for target in missing:
+            index = cache.last_row_of_class(int(target), self.training_rows)
+            if index >= 0:
+                anchors.append(cache.frame_for_rows(index, index + 1, window_size))
+        if anchors:
+            batch = pd.concat([batch] + anchors, ignore_index=True)
+            is_anchor = np.concatenate([is_anchor, np.ones(len(anchors), dtype=bool)])
+        if set(batch['target']) != set(self.model.classes_):
+            print("Classes manquantes dans l'historique: pas de mise à jour")
+            return None
+        
+        # Même imputation qu'à l'entraînement (moyennes des colonnes): ce sont les moyennes du scaler
+        means = pd.Series(self.scaler.mean_, index=self.feature_columns)
+        X_new = self.scaler.transform(batch[self.feature_columns].fillna(means).values)
+        y_new = batch['target'].values
+        
+        # Pondération équilibrée calculée sur les vraies nouvelles lignes;
+        # les ancrages ne servent qu'à fixer les classes
+        sample_weight = compute_sample_weight('balanced', y_new)
+        sample_weight[is_anchor] = sample_weight[~is_anchor].min() * 1e-3
+        
+        start = time.perf_counter()
+        n_before = len(self.model.estimators_)
+        self.model.set_params(warm_start=True, class_weight=None, n_jobs=-1,
+                              n_estimators=n_before + trees_per_update)
+        self.model.fit(X_new, y_new, sample_weight=sample_weight)
+        self.model.set_params(warm_start=False, class_weight='balanced', n_jobs=1)
+        
+        if max_estimators and len(self.model.estimators_) > max_estimators:
+            self.model.estimators_ = self.model.estimators_[-max_estimators:]
+            self.model.n_estimators = max_estimators
+        
+        self.training_rows = total_rows
+        self.data_hash = manifest['source_sha256']
+        self.version += 1
+        if full_path:
+            # Les nouveaux rounds servent de référence pour mesurer l'impact de la compaction
+            self.X_test_scaled, self.y_test = X_new[~is_anchor], y_new[~is_anchor]
+            self.compact(duplicate_tolerance=duplicate_tolerance)
+        self.save_model(model_path)
+        if registry_dir:
+            self.publish_model(registry_dir)
+        
+        update_time = time.perf_counter() - start
+        print(f"Modèle v{self.version}: +{trees_per_update} arbres sur {new_rows} nouveaux rounds "
+              f"({len(self.model.estimators_)} arbres, {update_time:.2f}s)")
+        return {
+            'version': self.version,
+            'new_rows': new_rows,
+            'n_estimators': len(self.model.estimators_),
+            'update_time': update_time
+        }
+    
     def save_model(self, model_path='models/baccarat_model.pkl'):
         """Sauvegarde le modèle entraîné"""
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         
-        model_data = {
-            'model': self.model,
-            'scaler': self.scaler,
+        full_path = full_model_path(model_path)
+        if self.compact_model is not None:
+            # Forêt complète conservée à part pour les mises à jour incrémentales
+            self._dump_artifact(self._model_data(self.model, self.scaler), full_path)
+            model_data = self._model_data(self.compact_model, FlatScaler.from_sklearn(self.scaler))
+        else:
+            model_data = self._model_data(self.model, self.scaler)
+            # Une forêt complète d'un entraînement compacté précédent ne correspond plus
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        
+        self._dump_artifact(model_data, model_path)
+        print(f"Modèle sauvegardé dans {model_path}")
+    
+    @staticmethod
+    def _full_model_matches(full_path, model_path):
+        """La forêt complète vient-elle du même entraînement que l'artefact publié?"""
+        try:
+            full, published = joblib.load(full_path), joblib.load(model_path)
+        except Exception:
+            return False
+        return all(full.get(key) == published.get(key) for key in ('version', 'training_rows'))
+    
+    def _model_data(self, model, scaler):
+        return {
+            'model': model,
+            'scaler': scaler,
             'feature_columns': self.feature_columns,
-            'training_date': datetime.now().isoformat()
+            'training_date': datetime.now().isoformat(),
+            'training_rows': self.training_rows,
+            'training_window': self.training_window,
+            'version': self.version,
+            'feature_version': FEATURE_VERSION,
+            'training_data_hash': self.data_hash,
+            'metrics': self.metrics
         }
-        
-        joblib.dump(model_data, model_path)
-        print(f"Modèle sauvegardé dans {model_path}")
+    
+    def _dump_artifact(self, model_data, model_path):
+        # Écriture atomique: les lecteurs voient l'ancienne ou la nouvelle version, jamais un fichier partiel
+        tmp_path = model_path + '.tmp'
+        joblib.dump(model_data, tmp_path)
+        os.replace(tmp_path, model_path)
+    
+    def publish_model(self, registry_dir='models/registry'):
+        """Publie le modèle courant comme nouvelle version du registre mappable"""
+        registry = ModelRegistry(registry_dir)
+        model = self.compact_model if self.compact_model is not None else self.model
+        version = registry.publish(model, self.scaler, self.feature_columns, {
+            'training_date': datetime.now().isoformat(),
+            'training_rows': self.training_rows,
+            'trainer_version': self.version,
+            'feature_version': FEATURE_VERSION,
+            'training_data_hash': self.data_hash,
+            'metrics': self.metrics
+        })
+        latency = registry.metadata(version)['latency_profile']
+        print(f"Modèle publié dans {registry_dir} (version {version}, "
+              f"latence p50 {latency['p50_us']:.0f}µs)")
+        return version
     
     def load_model(self, model_path='models/baccarat_model.pkl'):
         """Charge un modèle entraîné"""
@@ -242,6 +629,11 @@ class BaccaratModelTrainer:
             self.model = model_data['model']
             self.scaler = model_data['scaler']
             self.feature_columns = model_data['feature_columns']
+            self.training_rows = model_data.get('training_rows', 0)
+            self.training_window = model_data.get('training_window')
+            self.version = model_data.get('version', 0)
+            self.data_hash = model_data.get('training_data_hash')
+            self.metrics = model_data.get('metrics', {})
             print(f"Modèle chargé depuis {model_path}")
             print(f"Date d'entraînement: {model_data['training_date']}")
             return True
@@ -277,20 +669,92 @@ class BaccaratModelTrainer:
         }
 
 def main():
-    trainer = BaccaratModelTrainer()
+    parser = argparse.ArgumentParser(description="Entraînement du modèle Baccarat")
+    parser.add_argument('--csv', default='data/twentyone_rounds.csv')
+    parser.add_argument('--storage', default=None,
+                        help="Stockage des rounds (ex. sqlite:///data/rounds.db), sinon ROUND_STORAGE ou --csv")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Recalcule toutes les features sans utiliser le cache persistant")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Ajoute des arbres entraînés sur les seuls nouveaux rounds au modèle existant")
+    parser.add_argument('--trees-per-update', type=int, default=10)
+    parser.add_argument('--max-estimators', type=int, default=None)
+    parser.add_argument('--registry', default=None,
+                        help="Publie aussi le modèle dans ce registre versionné (ex: models/registry)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Compacte la forêt (élagage, dédoublonnage, quantification) avant publication")
+    parser.add_argument('--duplicate-tolerance', type=float, default=0.0,
+                        help="Avec --compact: écart maximal de prédiction pour fusionner deux arbres quasi identiques")
+    parser.add_argument('--walk-forward', action='store_true',
+                        help="Validation walk-forward parallèle avant l'entraînement final")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Nombre de processus (défaut: nombre de coeurs)")
+    parser.add_argument('--search', choices=['grid', 'random', 'halving'],
+                        help="Recherche d'hyperparamètres avant l'entraînement final")
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--latency-budget-us', type=float, default=None,
+                        help="Entraîne le candidat le plus précis sous ce budget de latence")
+    parser.add_argument('--search-output', default=None,
+                        help="Fichier JSON où écrire le rapport de recherche")
+    parser.add_argument('--from', dest='start', default=None,
+                        help="Début de la fenêtre d'entraînement (ISO 8601, avec le cache)")
+    parser.add_argument('--to', dest='end', default=None,
+                        help="Fin de la fenêtre d'entraînement (ISO 8601, avec le cache)")
+    args = parser.parse_args()
+    
+    trainer = BaccaratModelTrainer(csv_path=args.csv, storage=open_storage(args.storage, csv_path=args.csv))
+    # Le cache de features et les mises à jour incrémentales se construisent depuis le CSV
+    csv_source = trainer.storage.kind == 'csv'
     
-    # Charger et prétraiter les données
-    if not trainer.load_and_preprocess_data():
+    if args.incremental:
+        if not csv_source:
+            print("Mise à jour incrémentale disponible uniquement avec le stockage CSV")
+            return
+        trainer.update_model(trees_per_update=args.trees_per_update,
+                             max_estimators=args.max_estimators, registry_dir=args.registry,
+                             duplicate_tolerance=args.duplicate_tolerance)
         return
     
-    # Créer les features séquentielles
-    trainer.create_sequential_features(window_size=5)
+    if args.no_cache or not csv_source:
+        # Charger et prétraiter les données
+        if not trainer.load_and_preprocess_data():
+            return
+        
+        # Créer les features séquentielles
+        trainer.create_sequential_features(window_size=5)
+    elif not trainer.load_cached_features(window_size=5, start=timestamp_ns(args.start),
+                                          end=timestamp_ns(args.end)):
+        return
+    
+    if args.walk_forward:
+        trainer.walk_forward_validation(n_splits=args.folds, n_jobs=args.jobs)
+    
+    params = None
+    if args.search:
+        report = trainer.search_hyperparameters(mode=args.search, n_candidates=args.candidates,
+                                                n_jobs=args.jobs)
+        if args.search_output:
+            with open(args.search_output, 'w') as f:
+                json.dump(report, f, indent=2)
+        if args.latency_budget_us is not None:
+            eligible = [r for r in report['frontier'] if r['latency_us'] <= args.latency_budget_us]
+            if eligible:
+                params = eligible[-1]['params']
+                print(f"Candidat retenu: {params}")
+            else:
+                print("Aucun candidat sous le budget de latence, paramètres par défaut")
     
     # Entraîner le modèle
-    accuracy = trainer.train_model()
+    accuracy = trainer.train_model(params=params)
+    
+    if args.compact:
+        trainer.compact(duplicate_tolerance=args.duplicate_tolerance)
     
     # Sauvegarder le modèle
     trainer.save_model()
+    if args.registry:
+        trainer.publish_model(args.registry)
     
     print(f"\nEntraînement terminé! Accuracy: {accuracy:.3f}")
 